@@ -1,26 +1,12 @@
 """Some functions for interacting with the RDS."""
 
-from os import environ as ENV
 from datetime import datetime, timedelta
 
 
 from psycopg2.extensions import connection, cursor
-from psycopg2.extras import RealDictCursor
-from psycopg2 import connect
-from dotenv import load_dotenv
 import pandas as pd
 
-
-def create_connection() -> connection:
-    """Creates a connection to the RDS with postgres."""
-
-    load_dotenv()
-    conn = connect(dbname=ENV["DB_NAME"], user=ENV["DB_USER"],
-                   host=ENV["DB_HOST"], password=ENV["DB_PASSWORD"],
-                   port=ENV["DB_PORT"],
-                   cursor_factory=RealDictCursor)
-
-    return conn
+from db_pool import get_connection
 
 
 def get_cursor(conn: connection) -> cursor:
@@ -52,7 +38,7 @@ def get_avg_polarity_by_topic_and_source_yesterday() -> pd.DataFrame:
         ORDER BY t.topic_name, s.source_name;
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with get_cursor(conn) as cur:
             cur.execute(query, (yesterday,))
             data = cur.fetchall()
@@ -68,7 +54,7 @@ def get_daily_subscribers() -> list[str]:
         FROM subscriber
         WHERE daily = TRUE
     """
-    with create_connection() as conn:
+    with get_connection() as conn:
         with get_cursor(conn) as cur:
             cur.execute(query)
             data = cur.fetchall()
@@ -91,7 +77,7 @@ def get_yesterday_links_and_titles() -> list[str]:
         WHERE a.date_published = %s 
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with get_cursor(conn) as cur:
             cur.execute(query, (yesterday,))
             data = cur.fetchall()
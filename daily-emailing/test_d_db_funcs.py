@@ -11,14 +11,14 @@ from d_db_funcs import get_avg_polarity_by_topic_and_source_yesterday, get_daily
 class TestGetAvgPolarityByTopicAndSourceYesterday:
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_correct_cursor_call_and_empty_dataframe(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_correct_cursor_call_and_empty_dataframe(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_get_yesterday_date.return_value = '2024-01-01'
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -41,13 +41,13 @@ class TestGetAvgPolarityByTopicAndSourceYesterday:
         assert len(result.index) == 0
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_output(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_output(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         sample_data = [('Politics', 'Source A', 0.5),
@@ -63,13 +63,13 @@ class TestGetAvgPolarityByTopicAndSourceYesterday:
 class TestGetDailySubscribers:
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_correct_cursor_call_and_empty_data(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_correct_cursor_call_and_empty_data(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -86,12 +86,12 @@ class TestGetDailySubscribers:
         assert len(result) == 0
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
-    def test_with_data(self, mock_create_conn, mock_get_cursor):
+    @patch('d_db_funcs.get_connection')
+    def test_with_data(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         sample_data = [{'subscriber_email': 'user1@example.com'},
@@ -104,12 +104,12 @@ class TestGetDailySubscribers:
         assert result == expected_result
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
-    def test_no_data(self, mock_create_conn, mock_get_cursor):
+    @patch('d_db_funcs.get_connection')
+    def test_no_data(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -122,14 +122,14 @@ class TestGetDailySubscribers:
 class TestGetYesterdayLinks:
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_correct_cursor_call_and_empty_data(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_correct_cursor_call_and_empty_data(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_get_yesterday_date.return_value = '2024-01-01'
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -148,13 +148,13 @@ class TestGetYesterdayLinks:
         assert len(result) == 0
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_with_data(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_with_data(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         sample_data = [{'article_url': 'http://example.com/article1', 'article_title': 'article1', 'topic_name': 'topic1'},
@@ -169,13 +169,13 @@ class TestGetYesterdayLinks:
         assert result == expected_result
 
     @patch('d_db_funcs.get_cursor')
-    @patch('d_db_funcs.create_connection')
+    @patch('d_db_funcs.get_connection')
     @patch('d_db_funcs.get_yesterday_date')
-    def test_no_data(self, mock_get_yesterday_date, mock_create_conn, mock_get_cursor):
+    def test_no_data(self, mock_get_yesterday_date, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
         mock_cursor.fetchall.return_value = []
 
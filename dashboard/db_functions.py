@@ -2,33 +2,17 @@
 
 """Some functions for interacting with the RDS."""
 
-from os import environ as ENV
-
-from psycopg2.extras import RealDictCursor
-from psycopg2 import connect
-from psycopg2.extensions import connection
-from dotenv import load_dotenv
 import pandas as pd
 import streamlit as st
 
+from db_pool import get_connection
 from verify_identity import check_and_verify_email
 
 
-def create_connection() -> connection:
-    """Creates a connection to the RDS with postgres."""
-    load_dotenv()
-    conn = connect(dbname=ENV["DB_NAME"], user=ENV["DB_USER"],
-                   host=ENV["DB_HOST"], password=ENV["DB_PASSWORD"],
-                   port=ENV["DB_PORT"],
-                   cursor_factory=RealDictCursor)
-
-    return conn
-
-
 @st.cache_data
 def get_topic_names() -> list[str]:
     """Returns a list of topic names."""
-    with create_connection() as conn:
+    with get_connection() as conn:
         query = """SELECT topic_name FROM topic;"""
         with conn.cursor() as cur:
             cur.execute(query)
@@ -40,7 +24,7 @@ def get_topic_names() -> list[str]:
 @st.cache_data
 def get_topic_dict() -> dict:
     """Returns a dictionary of topic name to its id."""
-    with create_connection() as conn:
+    with get_connection() as conn:
         query = """SELECT * FROM topic;"""
         with conn.cursor() as cur:
             cur.execute(query)
@@ -52,7 +36,7 @@ def get_scores_topic(topic_name: str) -> dict:
     """Returns a dictionary containing the polarity scores for a given topic """
 
     topic_name = topic_name.strip().title()
-    with create_connection() as conn:
+    with get_connection() as conn:
         select_data = """
         SELECT t.topic_name, s.source_name, a.content_polarity_score, a.title_polarity_score, a.date_published 
         FROM article a
@@ -81,7 +65,7 @@ def get_average_score_per_source_for_a_topic(topic_id):
         GROUP BY s.source_name
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (topic_id, ))
             data = cur.fetchall()
@@ -101,7 +85,7 @@ def get_title_and_content_data_for_a_topic(topic_id):
         WHERE ata.topic_id = %s 
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (topic_id,))
             data = cur.fetchall()
@@ -115,7 +99,7 @@ def get_subscriber_emails() -> list[str]:
     query = """
         SELECT subscriber_email from subscriber;
     """
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query)
             data = cur.fetchall()
@@ -133,7 +117,7 @@ def updates_subscriber(first_name: str, surname: str, email: str, daily: bool, w
             daily = %s,
             weekly = %s
             WHERE subscriber_email = %s"""
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (first_name, surname, daily, weekly, email))
         conn.commit()
@@ -146,7 +130,7 @@ def add_new_subscriber(first_name: str, surname: str, email: str, daily: bool, w
             INSERT INTO subscriber 
             (subscriber_email, subscriber_first_name, subscriber_surname, daily, weekly)
             VALUES (%s, %s, %s, %s, %s)"""
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (email, first_name, surname, daily, weekly))
         conn.commit()
@@ -157,7 +141,7 @@ def remove_subscription(email: str):
     query = """
             DELETE FROM subscriber
             WHERE subscriber_email = %s"""
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query, (email, ))
         conn.commit()
@@ -179,7 +163,7 @@ def get_avg_polarity_all_topics():
         ORDER BY t.topic_name, s.source_name;
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(query)
             data = cur.fetchall()
@@ -192,7 +176,7 @@ def get_all_article_content():
     """Returns all article content from the database, along with their
     topics."""
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         query = """
         SELECT article.article_id, article.article_content, source.source_name, article.date_published, 
                topic.topic_name
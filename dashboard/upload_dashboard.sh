@@ -19,7 +19,7 @@ ssh -i "$KEY_PATH" $EC2_USER@$EC2_HOST << EOF
     fi
 EOF
 
-scp -i "$KEY_PATH" d_graphs.py 1_Home.py verify_identity.py db_functions.py dataframe_functions.py streamlit_components.py requirements.txt $EC2_USER@$EC2_HOST:$DASHBOARD_DIR/
+scp -i "$KEY_PATH" d_graphs.py 1_Home.py verify_identity.py db_pool.py db_functions.py dataframe_functions.py streamlit_components.py requirements.txt $EC2_USER@$EC2_HOST:$DASHBOARD_DIR/
 scp -i "$KEY_PATH" -r pages/ $EC2_USER@$EC2_HOST:$DASHBOARD_DIR/
 
 ssh -i "$KEY_PATH" $EC2_USER@$EC2_HOST << EOF
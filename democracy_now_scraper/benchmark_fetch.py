@@ -0,0 +1,73 @@
+# pylint: disable=wrong-import-order
+
+"""
+Benchmarks the sliding-window fetcher against the previous approach of
+fetching fixed chunks of 50 links one after another with grequests.
+
+A local gevent server stands in for the website: most pages answer quickly
+but a few are slow, which is what leaves each chunk waiting on its slowest
+request. Run with `python3 benchmark_fetch.py [n_links]`.
+"""
+
+import grequests
+
+import random
+import sys
+import time
+
+import gevent
+from gevent.pywsgi import WSGIServer
+
+from extract_dn import chunk_links
+from fetcher import fetch_all, CONCURRENCY, PER_HOST
+
+FAST_LATENCY = 0.02
+SLOW_LATENCY = 1.0
+SLOW_SHARE = 0.02
+
+
+def stand_in_app(environ, start_response):
+    """Answers after a short delay, or occasionally a long one."""
+
+    slow = random.Random(environ["PATH_INFO"]).random() < SLOW_SHARE
+    gevent.sleep(SLOW_LATENCY if slow else FAST_LATENCY)
+    start_response("200 OK", [("Content-Type", "text/html")])
+    return [b"<html><body>" + b"x" * 20000 + b"</body></html>"]
+
+
+def fetch_in_chunks(links: list[str]) -> list:
+    """The previous fetch_article_responses: chunks of 50, one chunk at a time."""
+
+    responses = []
+    for chunk in chunk_links(links, 50):
+        article_requests = (grequests.get(x, timeout=30) for x in chunk)
+        responses.extend(grequests.map(article_requests))
+    return responses
+
+
+def time_fetch(name: str, fetch, links: list[str]) -> None:
+    """Prints the wall time and throughput of one fetch strategy."""
+
+    start = time.perf_counter()
+    responses = fetch(links)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in responses if r is not None and r.status_code == 200)
+    print(f"{name:<40} {elapsed:6.2f}s  {len(links) / elapsed:7.1f} req/s  "
+          f"({ok}/{len(links)} ok)")
+
+
+if __name__ == "__main__":
+    n_links = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    server = WSGIServer(("127.0.0.1", 0), stand_in_app, log=None)
+    server.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    test_links = [f"{base}/2024/10/{i % 28 + 1}/story-{i}" for i in range(n_links)]
+
+    print(f"{n_links} links, {SLOW_SHARE:.0%} answering in {SLOW_LATENCY}s, "
+          f"the rest in {FAST_LATENCY}s")
+    time_fetch("chunks of 50 (grequests)", fetch_in_chunks, test_links)
+    time_fetch(f"sliding window {CONCURRENCY}/{PER_HOST} per host", fetch_all,
+               test_links)
+
+    server.stop()
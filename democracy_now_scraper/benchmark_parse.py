@@ -0,0 +1,58 @@
+"""
+Benchmarks parsing Democracy Now! article pages with the previous full
+html.parser tree against lxml, with and without the article filter.
+
+Pass a directory of saved article pages (`.html` files) to time them; without
+one, a synthetic page shaped like an article is used.
+Run with `python3 benchmark_parse.py [pages_dir] [repeats]`.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from extract_dn import ARTICLE_FILTER
+
+SYNTHETIC_PAGE = ("<html><head>" + "<script>var x = 1;</script>" * 40
+                  + "</head><body>"
+                  + "<nav><ul>" + "<li><a href='/topic'>Topic</a></li>" * 300
+                  + "</ul></nav>"
+                  + "<div class='container-fluid' id='story_content'><h1>Title</h1>"
+                  + "<span class='date'>October 07, 2024</span></div>"
+                  + "<div class='story_summary'><p>Summary.</p></div>"
+                  + "<div id='transcript'>" + "<p>Transcript line.</p>" * 400
+                  + "</div>"
+                  + "<aside>" + "<div class='related'><a href='/x'>Related</a></div>" * 200
+                  + "</aside><footer>" + "<p>Footer.</p>" * 50
+                  + "</footer></body></html>").encode()
+
+STRATEGIES = {
+    "html.parser, full tree": lambda page: BeautifulSoup(page, "html.parser"),
+    "lxml, full tree": lambda page: BeautifulSoup(page, "lxml"),
+    "lxml, article filter": lambda page: BeautifulSoup(
+        page, "lxml", parse_only=ARTICLE_FILTER),
+}
+
+
+def load_pages(pages_dir: str) -> list[bytes]:
+    """Returns the saved pages in a directory, or the synthetic page."""
+
+    if pages_dir:
+        return [path.read_bytes() for path in sorted(Path(pages_dir).glob("*.html"))]
+    return [SYNTHETIC_PAGE]
+
+
+if __name__ == "__main__":
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    print(f"{len(pages)} page(s), {repeats} repeats")
+    for name, parse in STRATEGIES.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for page in pages:
+                parse(page)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<25} {elapsed * 1000 / (repeats * len(pages)):7.2f} ms/page")
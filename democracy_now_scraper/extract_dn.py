@@ -1,15 +1,34 @@
 """A file to webscrape article information from Democracy Now! A-Z Topics page."""
 
-from datetime import datetime, timedelta
+import random
+import re
+from collections.abc import Iterable, Iterator
+from itertools import chain
+from datetime import datetime, date, time, timedelta
+from os import environ as ENV
 
-import grequests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
+from fetcher import fetch_all, fetch_iter
+from parsing import make_soup, TargetFilter
 
-def fetch_response_html(response) -> BeautifulSoup:
-    """Return html content of response"""
+ARTICLE_FILTER = TargetFilter(ids=["story_content", "transcript"],
+                              classes=["story_summary", "headline", "headline_summary"])
+TOPIC_LINK_FILTER = SoupStrainer(
+    "a", attrs={"data-ga-action": "Topic: Story Headline"})
+TOPIC_LIST_TTL = timedelta(hours=int(ENV.get("TOPIC_LIST_TTL_HOURS", 24)))
+DORMANT_RECHECK = timedelta(
+    hours=int(ENV.get("DORMANT_TOPIC_RECHECK_HOURS", 24)))
+LINK_DATE_PATTERN = re.compile(r"https?://[^/]+/(\d{4})/(\d{1,2})/(\d{1,2})(?:/|$)")
 
-    return BeautifulSoup(response.content, "html.parser")
+
+def fetch_response_html(response, parse_only=None) -> BeautifulSoup:
+    """
+    Return html content of response, optionally only
+    the parts matched by parse_only.
+    """
+
+    return make_soup(response.content, parse_only)
 
 
 def chunk_links(links: list[str], chunk_size: int) -> list[list[str]]:
@@ -20,18 +39,11 @@ def chunk_links(links: list[str], chunk_size: int) -> list[list[str]]:
 
 def fetch_article_responses(links: list[str]) -> list:
     """
-    Fetches article responses asynchronously using 
-    grequests in increments of 50.
+    Fetches article responses concurrently through a sliding window,
+    returning them in the same order as the links.
     """
 
-    responses = []
-    link_chunks = chunk_links(links, 50)
-
-    for chunk in link_chunks:
-        article_requests = (grequests.get(x, timeout=30) for x in chunk)
-        responses.extend(grequests.map(article_requests))
-
-    return responses
+    return fetch_all(links)
 
 
 def get_article_title(soup: BeautifulSoup) -> str:
@@ -86,17 +98,17 @@ def get_headline_contents(soup: BeautifulSoup) -> str:
         return None
 
 
-def reformat_date(date: str) -> str:
+def reformat_date(date_text: str) -> str:
     """
     Change from American date to standard YYYY-MM-DD.
     Expecting data in "October 07, 2024" or "Oct 07, 2024".
     """
 
     try:
-        date_obj = datetime.strptime(date, "%B %d, %Y")
+        date_obj = datetime.strptime(date_text, "%B %d, %Y")
     except ValueError:
         try:
-            date_obj = datetime.strptime(date, "%b %d, %Y")
+            date_obj = datetime.strptime(date_text, "%b %d, %Y")
         except ValueError:
             return None
 
@@ -109,8 +121,8 @@ def get_article_date(soup: BeautifulSoup) -> str:
     try:
         article_tag = soup.find(
             "div", class_="container-fluid", id="story_content")
-        date = article_tag.find("span", class_="date")
-        return reformat_date(date.get_text(strip=True))
+        date_tag = article_tag.find("span", class_="date")
+        return reformat_date(date_tag.get_text(strip=True))
 
     except AttributeError:
         return None
@@ -121,8 +133,8 @@ def get_headline_date(soup: BeautifulSoup) -> str:
 
     try:
         first_headline = soup.find("article", class_="headline")
-        date = first_headline.find("span", class_="date")
-        return reformat_date(date.get_text(strip=True))
+        date_tag = first_headline.find("span", class_="date")
+        return reformat_date(date_tag.get_text(strip=True))
 
     except AttributeError:
         return None
@@ -134,21 +146,21 @@ def scrape_article(response) -> dict:
     from Democracy Now article page.
     """
 
-    soup = fetch_response_html(response)
+    soup = fetch_response_html(response, ARTICLE_FILTER)
     if '/headlines/' in response.url:
         title = get_headline_title(soup)
         content = get_headline_contents(soup)
-        date = get_headline_date(soup)
+        published = get_headline_date(soup)
     else:
         title = get_article_title(soup)
         content = get_article_contents(soup)
-        date = get_article_date(soup)
+        published = get_article_date(soup)
 
-    if any(x is None for x in (title, content, date)):
+    if any(x is None for x in (title, content, published)):
         return f"Failed to fetch content from {response.url}"
 
     return {"title": title, "content": content,
-            "link": response.url, "published": date}
+            "link": response.url, "published": published}
 
 
 def get_all_topic_links() -> list[str]:
@@ -182,7 +194,7 @@ def get_all_topic_links() -> list[str]:
 def get_all_links_from_topic(topic_response) -> list[str]:
     """Return links for a given topic page on Democracy Now."""
 
-    soup = fetch_response_html(topic_response)
+    soup = fetch_response_html(topic_response, TOPIC_LINK_FILTER)
     articles = soup.find_all(
         "a", attrs={"data-ga-action": "Topic: Story Headline"})
     article_links = [
@@ -190,27 +202,192 @@ def get_all_links_from_topic(topic_response) -> list[str]:
     return article_links
 
 
-def get_all_links_from_all_topics() -> list[str]:
-    """Scrape through all news from every DN topic"""
+def iter_article_responses(links: list[str]) -> Iterator:
+    """
+    Fetches responses concurrently through a sliding window, yielding
+    each in the order of the links as soon as it has arrived.
+    """
+
+    return fetch_iter(links)
+
+
+def get_all_links_from_all_topics() -> Iterator[str]:
+    """Scrape through all news from every DN topic, yielding the
+    links of each topic page as it arrives"""
 
     topic_links = get_all_topic_links()
     print(f"Found {len(topic_links)} topic links")
-    if not topic_links:
-        return []
 
-    responses = fetch_article_responses(topic_links)
-    all_article_links = []
-    for i, response in enumerate(responses):
+    responses = iter_article_responses(topic_links)
+    for link, response in zip(topic_links, responses):
+        if response is None:
+            print(f"Could not connect to link: {link}")
+        else:
+            yield from get_all_links_from_topic(response)
+
+
+def get_link_date(link: str) -> date:
+    """
+    Return the date in a link of the format 'https://www.democracynow.org/YYYY/M/D/...',
+    or None if it has no date.
+    """
+
+    match = LINK_DATE_PATTERN.match(link)
+    if match is None:
+        return None
+
+    try:
+        return date(int(match[1]), int(match[2]), int(match[3]))
+    except ValueError:
+        return None
+
+
+def get_earliest_date(days_old: int, now: datetime = None) -> date:
+    """
+    Return the earliest link date that is within days_old of now,
+    i.e. whose midnight is not before now - days_old.
+    """
+
+    cutoff = (now or datetime.now()) - timedelta(days=days_old)
+    if cutoff.time() == time.min:
+        return cutoff.date()
+    return cutoff.date() + timedelta(days=1)
+
+
+def iter_recent_links(links: Iterable[str], earliest: date,
+                      exclude: set[str] = frozenset()) -> Iterator[str]:
+    """
+    Yield each link dated on or after earliest once, in the order given,
+    skipping any in exclude. Links without a date are old.
+    """
+
+    yielded = set()
+    for link in links:
+        if link in yielded or link in exclude:
+            continue
+        link_date = get_link_date(link)
+        if link_date is not None and link_date >= earliest:
+            yielded.add(link)
+            yield link
+
+
+def get_recent_links_from_topic(topic_response, earliest: date) -> tuple[list[str], str]:
+    """
+    Return the story links of a topic page dated on or after earliest, and
+    the date of the newest story. Topic pages list the newest stories first,
+    so reading stops at the first older story.
+    """
+
+    recent_links = []
+    newest = None
+    for link in get_all_links_from_topic(topic_response):
+        link_date = get_link_date(link)
+        if newest is None and link_date is not None:
+            newest = link_date.isoformat()
+        if link_date is None or link_date < earliest:
+            break
+        recent_links.append(link)
+
+    return recent_links, newest
+
+
+def get_cached_topic_links(crawl_state: dict, now: datetime) -> list[str]:
+    """
+    Return the topic links, reusing the list in crawl_state until it expires.
+    If the list cannot be fetched again, the expired one is used this run.
+    """
+
+    cached = crawl_state.get("topic_list")
+    if cached and now - datetime.fromisoformat(cached["fetched_at"]) < TOPIC_LIST_TTL:
+        return cached["links"]
+
+    topic_links = get_all_topic_links()
+    if topic_links:
+        crawl_state["topic_list"] = {"fetched_at": now.isoformat(),
+                                     "links": topic_links}
+    elif cached:
+        print("Could not fetch the topic list, using the expired one")
+        return cached["links"]
+    return topic_links
+
+
+def topic_is_due(topic_state: dict, earliest: date, now: datetime) -> bool:
+    """
+    Return whether a topic page should be fetched this run. Topics with a
+    story dated on or after earliest are always fetched; dormant topics
+    only once their recheck time has passed.
+    """
+
+    if not topic_state:
+        return True
+    if topic_state.get("newest") and date.fromisoformat(topic_state["newest"]) >= earliest:
+        return True
+
+    return now >= datetime.fromisoformat(topic_state["next_check"])
+
+
+def build_topic_headers(topic_state: dict) -> dict:
+    """Returns the If-None-Match/If-Modified-Since headers for a previously fetched topic."""
+
+    headers = {}
+    if topic_state.get("etag"):
+        headers["If-None-Match"] = topic_state["etag"]
+    if topic_state.get("last_modified"):
+        headers["If-Modified-Since"] = topic_state["last_modified"]
+
+    return headers
+
+
+def get_new_links_from_topics(days_old: int, crawl_state: dict) -> Iterator[str]:
+    """
+    Scrape the story links within days_old from the topic pages that may
+    have changed since the last run, yielding them as each page arrives
+    and recording what was seen in crawl_state.
+    """
+
+    now = datetime.now()
+    earliest = get_earliest_date(days_old, now)
+    topic_links = get_cached_topic_links(crawl_state, now)
+    topic_states = {link: crawl_state.get("topics", {}).get(link, {})
+                    for link in topic_links}
+    # No topic links means the topic list could not be fetched, not that every
+    # topic was removed, so the saved topics are only pruned against a real list
+    if topic_links:
+        crawl_state["topics"] = topic_states
+
+    due_links = [link for link in topic_links
+                 if topic_is_due(topic_states[link], earliest, now)]
+    print(f"{len(due_links)} of {len(topic_links)} topic pages are due")
+    responses = fetch_iter(
+        due_links, [build_topic_headers(topic_states[link]) for link in due_links])
+
+    unchanged = 0
+    for link, response in zip(due_links, responses):
         if response is None:
-            print(f"Could not connect to link: {topic_links[i]}")
+            print(f"Could not connect to link: {link}")
+            continue
+
+        topic_state = topic_states[link]
+        if response.status_code == 304:
+            unchanged += 1
         else:
-            all_article_links.extend(get_all_links_from_topic(response))
+            recent_links, newest = get_recent_links_from_topic(
+                response, earliest)
+            topic_state.update({"etag": response.headers.get("ETag"),
+                                "last_modified": response.headers.get("Last-Modified"),
+                                "newest": newest})
+            yield from recent_links
+
+        # Spread the dormant topics' rechecks so they do not all fall due together
+        topic_state["next_check"] = (
+            now + DORMANT_RECHECK * random.uniform(0.5, 1)).isoformat()
 
-    return all_article_links
+    print(f"{unchanged} topic pages were unchanged since the last run")
 
 
-def parse_all_links(all_links: list[str]) -> list[dict]:
-    """Parses the contents of links listed."""
+def parse_all_links(all_links: list[str], failed_links: list[str] = None) -> list[dict]:
+    """Parses the contents of links listed, adding any link that could not
+    be fetched or parsed to failed_links if it is given."""
 
     articles = []
     responses = fetch_article_responses(all_links)
@@ -224,40 +401,50 @@ def parse_all_links(all_links: list[str]) -> list[dict]:
                 print(article_info)
             else:
                 articles.append(article_info)
+                continue
+        if failed_links is not None:
+            failed_links.append(all_links[i])
     return articles
 
 
 def link_is_old(link: str, time_diff: int) -> bool:
     """
-    Filter out link that are more than 1 week old.
+    Filter out link that are more than time_diff days old.
     Expects links in the format 'https://www.democracynow.org/YYYY/M/D/...'.
     """
 
-    one_week_ago = datetime.now() - timedelta(days=time_diff)
+    link_date = get_link_date(link)
+    # very old links do not have date in the url and should be classified as old
+    return link_date is None or link_date < get_earliest_date(time_diff)
 
-    try:
-        date_str = '/'.join(link.split('/')[3:6])
-        link_date = datetime.strptime(date_str, "%Y/%m/%d")
-        if link_date >= one_week_ago:
-            return False
 
-    except ValueError:
-        # very old links do not have date in the url and should be classified as old
-        return True
+def scrape_democracy_now(days_old: int, seen_urls: set[str] = None,
+                         crawl_state: dict = None) -> list[dict]:
+    """Scrape the democracy now pages to obtain all stories,
+    skipping any already stored in the database (seen_urls).
+    Given a crawl_state, only the topic pages that may have changed are crawled,
+    and stories that failed last run are retried, since their topic pages
+    may not be fetched again. Links are filtered by date as the topic pages arrive."""
 
-    return True
+    if seen_urls is None:
+        seen_urls = set()
 
-
-def scrape_democracy_now(days_old: int) -> list[dict]:
-    """Scrape the democracy now pages to obtain all stories"""
-
-    all_links = get_all_links_from_all_topics()
-    print(f"Retreived {len(all_links)} article links")
-    all_valid_links = [
-        x for x in all_links if not link_is_old(x, days_old)]
-    print(
-        f"{len(all_valid_links)} article links are within {days_old} days old")
-    results = parse_all_links(all_valid_links)
+    if crawl_state is None:
+        all_links = get_all_links_from_all_topics()
+    else:
+        all_links = chain(crawl_state.get("retry_links", []),
+                          get_new_links_from_topics(days_old, crawl_state))
+
+    new_links = list(iter_recent_links(
+        all_links, get_earliest_date(days_old), seen_urls))
+    print(f"{len(new_links)} article links are within {days_old} days old "
+          "and not already stored")
+    if crawl_state is None:
+        results = parse_all_links(new_links)
+    else:
+        crawl_state["retry_links"] = []
+        results = parse_all_links(new_links, crawl_state["retry_links"])
+        print(f"{len(crawl_state['retry_links'])} failed articles will be retried next run")
     print(f"Extracted title and content from {len(results)} articles")
     return results
 
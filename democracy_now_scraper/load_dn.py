@@ -1,23 +1,69 @@
 """Function to upload DataFrame object as CSV to S3 bucket."""
 
+import gzip
+import json
 from os import environ as ENV
-from io import StringIO
 
 import pandas as pd
 import boto3
+from botocore.exceptions import ClientError
 
+from handoff import serialise_articles
 
-def upload_dataframe_to_s3(df: pd.DataFrame, object_name: str) -> None:
-    """Upload the DataFrame as a CSV file to an S3 bucket."""
+SEEN_URLS_KEY = "seen_article_urls.txt.gz"
+CRAWL_STATE_KEY = "democracy_now_crawl_state.json"
+
+
+def get_s3_client():
+    """Returns a boto3 S3 client."""
 
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
+    return boto3.client(service_name="s3",
+                        aws_access_key_id=ENV["AWS_ACCESS_KEY_BOUDICCA"],
+                        aws_secret_access_key=ENV["AWS_ACCESS_SECRET_KEY_BOUDICCA"])
+
+
+def upload_dataframe_to_s3(df: pd.DataFrame, object_name: str) -> None:
+    """Upload the DataFrame to an S3 bucket in the handoff format
+    (CSV unless HANDOFF_FORMAT says otherwise)."""
 
     s3_bucket = ENV['S3_BUCKET_NAME']
-    s3_client = boto3.client(service_name="s3",
-                             aws_access_key_id=ENV["AWS_ACCESS_KEY_BOUDICCA"],
-                             aws_secret_access_key=ENV["AWS_ACCESS_SECRET_KEY_BOUDICCA"])
+    s3_client = get_s3_client()
     s3_client.put_object(Bucket=s3_bucket, Key=object_name,
-                         Body=csv_buffer.getvalue())
+                         Body=serialise_articles(df))
 
     print(f"Uploaded DataFrame to s3://{s3_bucket}/{object_name}")
+
+
+def load_seen_urls() -> set[str]:
+    """Returns the URLs of articles already stored in the database,
+    as published to S3 by the analyser after each load."""
+
+    try:
+        response = get_s3_client().get_object(Bucket=ENV['S3_BUCKET_NAME'],
+                                              Key=SEEN_URLS_KEY)
+        return set(gzip.decompress(response["Body"].read()).decode("utf-8").splitlines())
+
+    except (ClientError, OSError) as e:
+        print(f"No seen-URL ledger, fetching every article: {e}")
+        return set()
+
+
+def load_crawl_state() -> dict:
+    """Returns the topic list and per-topic state saved by the previous run,
+    or an empty state if there is none."""
+
+    try:
+        response = get_s3_client().get_object(Bucket=ENV['S3_BUCKET_NAME'],
+                                              Key=CRAWL_STATE_KEY)
+        return json.loads(response["Body"].read())
+
+    except (ClientError, json.JSONDecodeError) as e:
+        print(f"No saved crawl state, crawling every topic: {e}")
+        return {}
+
+
+def save_crawl_state(crawl_state: dict) -> None:
+    """Saves the topic list and per-topic state for the next run."""
+
+    get_s3_client().put_object(Bucket=ENV['S3_BUCKET_NAME'], Key=CRAWL_STATE_KEY,
+                               Body=json.dumps(crawl_state))
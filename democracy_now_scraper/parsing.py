@@ -0,0 +1,54 @@
+# pylint: disable=R0801
+
+"""
+Builds BeautifulSoup trees for the scrapers with a pluggable parser backend.
+
+The tree builder is lxml (C-backed) by default, falling back to Python's
+html.parser when lxml is not installed; set HTML_PARSER to choose another.
+Passing a filter as parse_only limits the tree to the parts the scraper reads.
+"""
+
+from os import environ as ENV
+
+from bs4 import BeautifulSoup, FeatureNotFound
+from bs4.filter import ElementFilter
+
+HTML_PARSER = ENV.get("HTML_PARSER", "lxml")
+FALLBACK_PARSER = "html.parser"
+
+
+class TargetFilter(ElementFilter):
+    """Only builds the subtrees of tags with one of the given ids or classes."""
+
+    def __init__(self, ids: list[str] = None, classes: list[str] = None):
+        super().__init__()
+        self.ids = set(ids or [])
+        self.classes = set(classes or [])
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        """Keeps a top-level tag if its id or any of its classes is targeted."""
+
+        if not attrs:
+            return False
+        if attrs.get("id") in self.ids:
+            return True
+
+        tag_classes = attrs.get("class") or []
+        if isinstance(tag_classes, str):
+            tag_classes = tag_classes.split()
+        return not self.classes.isdisjoint(tag_classes)
+
+    def allow_string_creation(self, string: str) -> bool:
+        """Drops text that is outside every targeted tag."""
+
+        return False
+
+
+def make_soup(markup, parse_only: ElementFilter = None) -> BeautifulSoup:
+    """Returns the parsed markup, using the fallback parser if the configured
+    one is not installed."""
+
+    try:
+        return BeautifulSoup(markup, HTML_PARSER, parse_only=parse_only)
+    except FeatureNotFound:
+        return BeautifulSoup(markup, FALLBACK_PARSER, parse_only=parse_only)
@@ -6,7 +6,8 @@ from dotenv import load_dotenv
 
 from extract_dn import scrape_democracy_now
 from transform_dn import convert_to_dataframe
-from load_dn import upload_dataframe_to_s3
+from handoff import article_data_suffix, partition_key
+from load_dn import upload_dataframe_to_s3, load_seen_urls, load_crawl_state, save_crawl_state
 
 
 def lambda_handler(event: dict, context: dict) -> dict:  # pylint: disable=W0613
@@ -15,8 +16,11 @@ def lambda_handler(event: dict, context: dict) -> dict:  # pylint: disable=W0613
     try:
         load_dotenv()
 
-        results = scrape_democracy_now(days_old=3)
+        crawl_state = load_crawl_state()
+        results = scrape_democracy_now(days_old=3, seen_urls=load_seen_urls(),
+                                       crawl_state=crawl_state)
         if not results:
+            save_crawl_state(crawl_state)
             print("No article data found")
             return {
                 "statusCode": 404,
@@ -32,8 +36,10 @@ def lambda_handler(event: dict, context: dict) -> dict:  # pylint: disable=W0613
             }
 
         current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        s3_filename = f"{current_time}_democracy_now_article_data.csv"
+        s3_filename = partition_key(
+            f"{current_time}_democracy_now{article_data_suffix()}")
         upload_dataframe_to_s3(df, s3_filename)
+        save_crawl_state(crawl_state)
 
         return {
             "statusCode": 200,
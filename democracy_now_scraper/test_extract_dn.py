@@ -1,7 +1,7 @@
 # pylint: skip-file
 
 from unittest.mock import patch, MagicMock, Mock
-from datetime import datetime
+from datetime import datetime, date, timedelta
 
 import pytest
 from bs4 import BeautifulSoup
@@ -23,6 +23,13 @@ from extract_dn import (
     get_all_links_from_all_topics,
     parse_all_links,
     link_is_old,
+    get_link_date,
+    get_recent_links_from_topic,
+    get_cached_topic_links,
+    topic_is_due,
+    get_new_links_from_topics,
+    get_earliest_date,
+    iter_recent_links,
     scrape_democracy_now
 )
 
@@ -36,6 +43,51 @@ def test_fetch_response_html():
     assert isinstance(result, BeautifulSoup)
 
 
+def test_scrape_article_only_parses_targets():
+    """The article filter keeps every part the extractors read."""
+
+    mock_response = Mock()
+    mock_response.url = 'https://www.democracynow.org/2024/10/7/story'
+    mock_response.content = """
+        <html><head><script>var x = 1;</script></head><body>
+        <nav><a href="/">Home</a></nav>
+        <div class="container-fluid" id="story_content">
+            <h1>Story Title</h1><span class="date">October 07, 2024</span>
+        </div>
+        <div class="story_summary"><p>Summary.</p></div>
+        <div class="mobile_anchor_target" id="transcript"><p>Transcript.</p></div>
+        <footer><p>Footer.</p></footer>
+        </body></html>"""
+
+    assert scrape_article(mock_response) == {
+        "title": "Story Title",
+        "content": "Summary.\nTranscript.",
+        "link": 'https://www.democracynow.org/2024/10/7/story',
+        "published": "2024-10-07"
+    }
+
+
+def test_scrape_headline_only_parses_targets():
+    """The article filter keeps every part the headline extractors read."""
+
+    mock_response = Mock()
+    mock_response.url = 'https://www.democracynow.org/2024/10/7/headlines/story'
+    mock_response.content = """
+        <html><body><nav><h1>Site</h1></nav>
+        <article class="headline">
+            <h1>Headline Title</h1><span class="date">Oct 07, 2024</span>
+            <div class="headline_summary"><p>Headline text.</p></div>
+        </article>
+        </body></html>"""
+
+    assert scrape_article(mock_response) == {
+        "title": "Headline Title",
+        "content": "Headline text.",
+        "link": 'https://www.democracynow.org/2024/10/7/headlines/story',
+        "published": "2024-10-07"
+    }
+
+
 @pytest.mark.parametrize("links, chunk_size, expected", [(["link1", "link2", "link3"], 2, [["link1", "link2"], ["link3"]]),
                                                          (["link1"], 1,
                                                           [["link1"]]),
@@ -49,17 +101,17 @@ def test_chunk_links(links, chunk_size, expected):
     assert result == expected
 
 
-@patch('grequests.map')
-def test_fetch_article_responses(mock_map):
+@patch('extract_dn.fetch_all')
+def test_fetch_article_responses(mock_fetch_all):
 
     mock_response = MagicMock()
 
-    mock_map.return_value = [mock_response]
+    mock_fetch_all.return_value = [mock_response]
 
     result = fetch_article_responses(["https://test.com"])
     assert len(result) == 1
     assert result[0] == mock_response
-    mock_map.assert_called_once()
+    mock_fetch_all.assert_called_once_with(["https://test.com"])
 
 
 class TestArticleFunctions:
@@ -347,22 +399,22 @@ def test_get_all_links_from_topic(mock_fetch_response_html):
 class TestGetAllLinksFromAllTopics:
 
     @patch('extract_dn.get_all_links_from_topic')
-    @patch('extract_dn.fetch_article_responses')
+    @patch('extract_dn.iter_article_responses')
     @patch('extract_dn.get_all_topic_links')
-    def test_get_all_links_from_all_topics(self, mock_get_all_topic_links, mock_fetch_article_responses, mock_get_all_links_from_topic):
+    def test_get_all_links_from_all_topics(self, mock_get_all_topic_links, mock_iter_article_responses, mock_get_all_links_from_topic):
         topic_links = ["https://www.democracynow.org/topic/1",
                        "https://www.democracynow.org/topic/2"]
         mock_response_1 = Mock()
         mock_response_2 = Mock()
 
         mock_get_all_topic_links.return_value = topic_links
-        mock_fetch_article_responses.return_value = [mock_response_1,
-                                                     mock_response_2]
+        mock_iter_article_responses.return_value = iter([mock_response_1,
+                                                         mock_response_2])
         mock_get_all_links_from_topic.side_effect = [["https://www.democracynow.org/article1",
                                                       "https://www.democracynow.org/article2"],
                                                      ["https://www.democracynow.org/article3"]]
 
-        result = get_all_links_from_all_topics()
+        result = list(get_all_links_from_all_topics())
         expected = ["https://www.democracynow.org/article1",
                     "https://www.democracynow.org/article2",
                     "https://www.democracynow.org/article3"]
@@ -372,7 +424,7 @@ class TestGetAllLinksFromAllTopics:
     def test_get_all_links_from_all_topics_fail(self, mock_get_all_topic_links):
         mock_get_all_topic_links.return_value = []
 
-        result = get_all_links_from_all_topics()
+        result = list(get_all_links_from_all_topics())
         expected = []
         assert result == expected
 
@@ -406,9 +458,11 @@ class TestParseAllLinks:
 
         mock_fetch_article_responses.return_value = [None, None]
 
-        result = parse_all_links(all_links)
+        failed_links = []
+        result = parse_all_links(all_links, failed_links)
         expected = []
         assert result == expected
+        assert failed_links == all_links
 
 
 class TestLinkIsOld:
@@ -433,27 +487,275 @@ class TestLinkIsOld:
 
 
 @patch('extract_dn.parse_all_links')
-@patch('extract_dn.link_is_old')
+@patch('extract_dn.get_earliest_date')
 @patch('extract_dn.get_all_links_from_all_topics')
-def test_scrape_democracy_now(mock_get_all_links, mock_link_is_old, mock_parse_all_links):
+def test_scrape_democracy_now(mock_get_all_links, mock_get_earliest_date, mock_parse_all_links):
     # Setup mock return values
-    mock_get_all_links.return_value = ["https://www.democracynow.org/2024/10/1/story",
-                                       "https://www.democracynow.org/2023/9/25/story",
-                                       "https://www.democracynow.org/invalid/date"]
-
-    mock_link_is_old.side_effect = [False, True, True]
+    mock_get_all_links.return_value = iter(["https://www.democracynow.org/2024/10/1/story",
+                                            "https://www.democracynow.org/2023/9/25/story",
+                                            "https://www.democracynow.org/invalid/date",
+                                            "https://www.democracynow.org/2024/10/1/story"])
+    mock_get_earliest_date.return_value = date(2024, 9, 24)
     mock_parse_all_links.return_value = [{"title": "Story 1", "content": "Content 1"},
                                          {"title": "Story 2", "content": "Content 2"},]
 
     result = scrape_democracy_now(7)
 
     mock_get_all_links.assert_called_once()
-    mock_link_is_old.assert_any_call(
-        "https://www.democracynow.org/2024/10/1/story", 7)
-    mock_link_is_old.assert_any_call(
-        "https://www.democracynow.org/invalid/date", 7)
-    mock_parse_all_links.assert_called_once()
+    mock_get_earliest_date.assert_called_once_with(7)
+    mock_parse_all_links.assert_called_once_with(
+        ["https://www.democracynow.org/2024/10/1/story"])
 
     assert len(result) == 2
     assert result == [{"title": "Story 1", "content": "Content 1"},
                       {"title": "Story 2", "content": "Content 2"},]
+
+
+@patch('extract_dn.parse_all_links')
+@patch('extract_dn.get_earliest_date', return_value=date(2024, 9, 24))
+@patch('extract_dn.get_all_links_from_all_topics')
+def test_scrape_democracy_now_skips_seen_urls(mock_get_all_links, mock_get_earliest_date, mock_parse_all_links):
+    mock_get_all_links.return_value = iter(["https://www.democracynow.org/2024/10/1/stored",
+                                            "https://www.democracynow.org/2024/10/1/new"])
+    mock_parse_all_links.return_value = []
+
+    scrape_democracy_now(7, {"https://www.democracynow.org/2024/10/1/stored"})
+
+    mock_parse_all_links.assert_called_once_with(
+        ["https://www.democracynow.org/2024/10/1/new"])
+
+
+@patch('extract_dn.parse_all_links')
+@patch('extract_dn.get_new_links_from_topics')
+@patch('extract_dn.get_all_links_from_all_topics')
+def test_scrape_democracy_now_incremental(mock_get_all_links, mock_get_new_links, mock_parse_all_links):
+    mock_get_new_links.return_value = iter([
+        "https://www.democracynow.org/2024/10/1/story"])
+    mock_parse_all_links.return_value = []
+    crawl_state = {}
+
+    with patch('extract_dn.get_earliest_date', return_value=date(2024, 9, 30)):
+        scrape_democracy_now(3, crawl_state=crawl_state)
+
+    mock_get_all_links.assert_not_called()
+    mock_get_new_links.assert_called_once_with(3, crawl_state)
+    mock_parse_all_links.assert_called_once_with(
+        ["https://www.democracynow.org/2024/10/1/story"], [])
+
+
+@patch('extract_dn.get_new_links_from_topics')
+@patch('extract_dn.fetch_article_responses')
+def test_scrape_democracy_now_retries_failed_stories(mock_fetch, mock_get_new_links):
+    failed = "https://www.democracynow.org/2024/10/1/failed"
+    mock_get_new_links.side_effect = lambda days_old, crawl_state: iter([failed])
+    mock_fetch.return_value = [None]
+    crawl_state = {}
+
+    with patch('extract_dn.get_earliest_date', return_value=date(2024, 9, 30)):
+        scrape_democracy_now(3, crawl_state=crawl_state)
+        assert crawl_state["retry_links"] == [failed]
+
+        # The topic page is unchanged next run, so the story only comes from the retry list
+        mock_get_new_links.side_effect = lambda days_old, crawl_state: iter([])
+        scrape_democracy_now(3, crawl_state=crawl_state)
+
+    assert mock_fetch.call_args.args[0] == [failed]
+    assert crawl_state["retry_links"] == [failed]
+
+
+@patch('extract_dn.get_new_links_from_topics', return_value=iter([]))
+@patch('extract_dn.parse_all_links', return_value=[])
+def test_scrape_democracy_now_drops_old_and_stored_retries(mock_parse_all_links, mock_get_new_links):
+    crawl_state = {"retry_links": ["https://www.democracynow.org/2024/9/1/old",
+                                   "https://www.democracynow.org/2024/10/1/stored",
+                                   "https://www.democracynow.org/2024/10/1/retry"]}
+
+    with patch('extract_dn.get_earliest_date', return_value=date(2024, 9, 30)):
+        scrape_democracy_now(3, {"https://www.democracynow.org/2024/10/1/stored"},
+                             crawl_state=crawl_state)
+
+    assert mock_parse_all_links.call_args.args[0] == [
+        "https://www.democracynow.org/2024/10/1/retry"]
+
+
+@pytest.mark.parametrize("link, expected", [
+    ("https://www.democracynow.org/2024/10/7/story", date(2024, 10, 7)),
+    ("https://www.democracynow.org/2024/01/17/headlines/story", date(2024, 1, 17)),
+    ("https://www.democracynow.org/2024/10/7", date(2024, 10, 7)),
+    ("https://www.democracynow.org/2024/2/30/story", None),
+    ("https://www.democracynow.org/2024/10/7story", None),
+    ("https://www.democracynow.org/topics/story", None)])
+def test_get_link_date(link, expected):
+    assert get_link_date(link) == expected
+
+
+@pytest.mark.parametrize("now, expected", [
+    (datetime(2024, 10, 7, 12), date(2024, 10, 5)),
+    (datetime(2024, 10, 7), date(2024, 10, 4))])
+def test_get_earliest_date(now, expected):
+    assert get_earliest_date(3, now) == expected
+
+
+def test_iter_recent_links_dedupes_in_order():
+    links = ["https://www.democracynow.org/2024/10/7/b",
+             "https://www.democracynow.org/2024/10/1/old",
+             "https://www.democracynow.org/2024/10/6/a",
+             "https://www.democracynow.org/2024/10/7/b",
+             "https://www.democracynow.org/2024/10/6/stored",
+             "https://www.democracynow.org/topics/undated"]
+
+    result = iter_recent_links(iter(links), date(2024, 10, 5),
+                               {"https://www.democracynow.org/2024/10/6/stored"})
+
+    assert list(result) == ["https://www.democracynow.org/2024/10/7/b",
+                            "https://www.democracynow.org/2024/10/6/a"]
+
+
+@pytest.mark.parametrize("link", [
+    "https://www.democracynow.org/2024/10/7/story",
+    "https://www.democracynow.org/2024/10/4/story",
+    "https://www.democracynow.org/2024/10/3/story",
+    "https://www.democracynow.org/2019/1/1/story",
+    "https://www.democracynow.org/shows/story"])
+@pytest.mark.parametrize("now", [datetime(2024, 10, 7, 12), datetime(2024, 10, 7)])
+def test_iter_recent_links_matches_strptime_comparison(link, now):
+    """Same result as parsing each link with strptime and comparing it with now - 3 days."""
+    try:
+        expected = datetime.strptime('/'.join(link.split('/')[3:6]),
+                                     "%Y/%m/%d") >= now - timedelta(days=3)
+    except ValueError:
+        expected = False
+
+    assert bool(list(iter_recent_links([link], get_earliest_date(3, now)))) == expected
+
+
+@patch('extract_dn.get_all_links_from_topic')
+def test_get_recent_links_from_topic_stops_at_old_story(mock_get_all_links_from_topic):
+    mock_get_all_links_from_topic.return_value = [
+        "https://www.democracynow.org/2024/10/7/new",
+        "https://www.democracynow.org/2024/10/6/newer",
+        "https://www.democracynow.org/2024/9/1/old",
+        "https://www.democracynow.org/2024/10/6/pinned"]
+
+    links, newest = get_recent_links_from_topic(Mock(), date(2024, 10, 5))
+
+    assert links == ["https://www.democracynow.org/2024/10/7/new",
+                     "https://www.democracynow.org/2024/10/6/newer"]
+    assert newest == "2024-10-07"
+
+
+@patch('extract_dn.get_all_links_from_topic')
+def test_get_recent_links_from_dormant_topic(mock_get_all_links_from_topic):
+    mock_get_all_links_from_topic.return_value = [
+        "https://www.democracynow.org/2023/1/2/old"]
+
+    assert get_recent_links_from_topic(Mock(), date(2024, 10, 5)) == (
+        [], "2023-01-02")
+
+
+class TestGetCachedTopicLinks:
+
+    @patch('extract_dn.get_all_topic_links')
+    def test_reuses_fresh_topic_list(self, mock_get_all_topic_links):
+        crawl_state = {"topic_list": {"fetched_at": "2024-10-07T10:00:00",
+                                      "links": ["https://www.democracynow.org/topics/a"]}}
+
+        result = get_cached_topic_links(crawl_state, datetime(2024, 10, 7, 12))
+
+        assert result == ["https://www.democracynow.org/topics/a"]
+        mock_get_all_topic_links.assert_not_called()
+
+    @patch('extract_dn.get_all_topic_links')
+    def test_refreshes_expired_topic_list(self, mock_get_all_topic_links):
+        mock_get_all_topic_links.return_value = [
+            "https://www.democracynow.org/topics/b"]
+        crawl_state = {"topic_list": {"fetched_at": "2024-10-01T10:00:00",
+                                      "links": ["https://www.democracynow.org/topics/a"]}}
+
+        result = get_cached_topic_links(crawl_state, datetime(2024, 10, 7, 12))
+
+        assert result == ["https://www.democracynow.org/topics/b"]
+        assert crawl_state["topic_list"] == {
+            "fetched_at": "2024-10-07T12:00:00",
+            "links": ["https://www.democracynow.org/topics/b"]}
+
+
+    @patch('extract_dn.get_all_topic_links')
+    def test_keeps_expired_topic_list_when_fetch_fails(self, mock_get_all_topic_links):
+        mock_get_all_topic_links.return_value = []
+        topic_list = {"fetched_at": "2024-10-01T10:00:00",
+                      "links": ["https://www.democracynow.org/topics/a"]}
+        crawl_state = {"topic_list": dict(topic_list)}
+
+        result = get_cached_topic_links(crawl_state, datetime(2024, 10, 7, 12))
+
+        assert result == ["https://www.democracynow.org/topics/a"]
+        assert crawl_state["topic_list"] == topic_list
+
+@pytest.mark.parametrize("topic_state, expected", [
+    ({}, True),
+    ({"newest": "2024-10-06", "next_check": "2024-10-08T00:00:00"}, True),
+    ({"newest": "2024-01-01", "next_check": "2024-10-08T00:00:00"}, False),
+    ({"newest": "2024-01-01", "next_check": "2024-10-07T00:00:00"}, True),
+    ({"newest": None, "next_check": "2024-10-08T00:00:00"}, False)])
+def test_topic_is_due(topic_state, expected):
+    assert topic_is_due(topic_state, date(2024, 10, 5),
+                        datetime(2024, 10, 7, 12)) == expected
+
+
+class TestGetNewLinksFromTopics:
+
+    TOPICS = ["https://www.democracynow.org/topics/active",
+              "https://www.democracynow.org/topics/dormant",
+              "https://www.democracynow.org/topics/unchanged"]
+
+    def crawl_state(self):
+        return {"topic_list": {"fetched_at": datetime.now().isoformat(), "links": self.TOPICS},
+                "topics": {
+                    self.TOPICS[0]: {"newest": "2000-01-01", "next_check": "2000-01-01T00:00:00"},
+                    self.TOPICS[1]: {"newest": "2000-01-01", "next_check": "2999-01-01T00:00:00"},
+                    self.TOPICS[2]: {"newest": "2999-01-01", "next_check": "2000-01-01T00:00:00",
+                                     "etag": '"abc"'},
+                    "https://www.democracynow.org/topics/removed": {}}}
+
+    @patch('extract_dn.get_recent_links_from_topic')
+    @patch('extract_dn.fetch_iter')
+    def test_fetches_only_due_topics(self, mock_fetch_iter, mock_get_recent_links):
+        changed = Mock(status_code=200, headers={"ETag": '"new"'})
+        mock_fetch_iter.return_value = iter([changed, Mock(status_code=304)])
+        mock_get_recent_links.return_value = (
+            ["https://www.democracynow.org/2999/1/1/story"], "2999-01-01")
+        crawl_state = self.crawl_state()
+
+        result = list(get_new_links_from_topics(3, crawl_state))
+
+        assert result == ["https://www.democracynow.org/2999/1/1/story"]
+        mock_fetch_iter.assert_called_once_with(
+            [self.TOPICS[0], self.TOPICS[2]], [{}, {"If-None-Match": '"abc"'}])
+        mock_get_recent_links.assert_called_once()
+        assert set(crawl_state["topics"]) == set(self.TOPICS)
+        assert crawl_state["topics"][self.TOPICS[0]]["newest"] == "2999-01-01"
+        assert crawl_state["topics"][self.TOPICS[0]]["etag"] == '"new"'
+        assert crawl_state["topics"][self.TOPICS[1]]["next_check"] == "2999-01-01T00:00:00"
+        assert crawl_state["topics"][self.TOPICS[2]]["next_check"] > datetime.now().isoformat()
+
+    @patch('extract_dn.fetch_iter')
+    def test_skips_unreachable_topics(self, mock_fetch_iter):
+        mock_fetch_iter.return_value = iter([None, None])
+        crawl_state = self.crawl_state()
+
+        assert list(get_new_links_from_topics(3, crawl_state)) == []
+        assert crawl_state["topics"][self.TOPICS[0]]["next_check"] == "2000-01-01T00:00:00"
+
+    @patch('extract_dn.get_all_topic_links')
+    @patch('extract_dn.fetch_iter')
+    def test_keeps_topic_state_when_topic_list_fails(self, mock_fetch_iter,
+                                                     mock_get_all_topic_links):
+        mock_get_all_topic_links.return_value = []
+        mock_fetch_iter.return_value = iter([])
+        crawl_state = self.crawl_state()
+        del crawl_state["topic_list"]
+        topics = {link: dict(state) for link, state in crawl_state["topics"].items()}
+
+        assert list(get_new_links_from_topics(3, crawl_state)) == []
+        assert crawl_state["topics"] == topics
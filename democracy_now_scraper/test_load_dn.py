@@ -0,0 +1,71 @@
+# pylint: skip-file
+
+import gzip
+from unittest.mock import patch, MagicMock
+
+from botocore.exceptions import ClientError
+
+import pandas as pd
+
+from load_dn import upload_dataframe_to_s3, load_seen_urls, SEEN_URLS_KEY, load_crawl_state, save_crawl_state, CRAWL_STATE_KEY
+
+
+@patch('load_dn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_dn.get_s3_client')
+def test_load_seen_urls(mock_get_s3_client):
+    mock_client = mock_get_s3_client.return_value
+    mock_client.get_object.return_value = {"Body": MagicMock(read=MagicMock(
+        return_value=gzip.compress(b"https://a.org\nhttps://b.org")))}
+
+    assert load_seen_urls() == {"https://a.org", "https://b.org"}
+    mock_client.get_object.assert_called_once_with(Bucket='test-bucket',
+                                                   Key=SEEN_URLS_KEY)
+
+
+@patch('load_dn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_dn.get_s3_client')
+def test_load_seen_urls_missing(mock_get_s3_client):
+    mock_get_s3_client.return_value.get_object.side_effect = ClientError(
+        {"Error": {"Code": "NoSuchKey"}}, "GetObject")
+
+    assert load_seen_urls() == set()
+
+
+@patch('load_dn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_dn.get_s3_client')
+def test_crawl_state_round_trip(mock_get_s3_client):
+    mock_client = mock_get_s3_client.return_value
+    crawl_state = {"topics": {"https://www.democracynow.org/topics/a": {
+        "newest": "2024-10-07"}}}
+
+    save_crawl_state(crawl_state)
+    body = mock_client.put_object.call_args.kwargs["Body"]
+    mock_client.get_object.return_value = {"Body": MagicMock(
+        read=MagicMock(return_value=body))}
+
+    assert load_crawl_state() == crawl_state
+    mock_client.put_object.assert_called_once_with(Bucket='test-bucket',
+                                                   Key=CRAWL_STATE_KEY, Body=body)
+
+
+@patch('load_dn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_dn.get_s3_client')
+def test_load_crawl_state_missing(mock_get_s3_client):
+    mock_get_s3_client.return_value.get_object.side_effect = ClientError(
+        {"Error": {"Code": "NoSuchKey"}}, "GetObject")
+
+    assert load_crawl_state() == {}
+
+
+@patch('handoff.ENV', {})
+@patch('load_dn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_dn.get_s3_client')
+def test_upload_dataframe_to_s3_csv(mock_get_s3_client):
+    df = pd.DataFrame({"title": ["T"], "content": ["C"], "link": ["L"],
+                       "published": ["2024-10-07"], "source_name": ["Democracy Now!"]})
+
+    upload_dataframe_to_s3(df, "x_article_data.csv")
+
+    mock_get_s3_client.return_value.put_object.assert_called_once_with(
+        Bucket='test-bucket', Key="x_article_data.csv",
+        Body=b"title,content,link,published,source_name\nT,C,L,2024-10-07,Democracy Now!\n")
@@ -0,0 +1,44 @@
+# pylint: skip-file
+
+from unittest.mock import patch
+
+import pytest
+
+from parsing import make_soup, TargetFilter
+
+PAGE = """
+<html><body>
+<nav class="menu"><a href="/">Home</a></nav>
+<div class="container-fluid" id="story_content"><h1>Title</h1></div>
+loose text
+<div class="story_summary extra"><p>Summary</p></div>
+<footer><p>Footer</p></footer>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser", ["lxml", "html.parser"])
+def test_target_filter_keeps_only_targets(parser):
+    target = TargetFilter(ids=["story_content"], classes=["story_summary"])
+
+    with patch('parsing.HTML_PARSER', parser):
+        soup = make_soup(PAGE, target)
+
+    assert soup.find("div", id="story_content").h1.get_text() == "Title"
+    assert soup.find("div", class_="story_summary").get_text() == "Summary"
+    assert soup.find("nav") is None
+    assert soup.find("footer") is None
+    assert "loose text" not in soup.get_text()
+
+
+@patch('parsing.HTML_PARSER', "not-installed")
+def test_make_soup_falls_back_to_html_parser():
+    soup = make_soup(PAGE)
+
+    assert soup.find("footer").get_text() == "Footer"
+
+
+def test_make_soup_without_filter_keeps_everything():
+    soup = make_soup(PAGE)
+
+    assert soup.find("nav") is not None
+    assert "loose text" in soup.get_text()
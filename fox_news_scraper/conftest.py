@@ -58,14 +58,35 @@ def mock_parse_article_content():
 
 
 @pytest.fixture
-def mock_grequests():
-    """Fixture to mock grequests.get and grequests.map."""
-    with patch('extract_fn.grequests.get') as mock_get:
-        with patch('extract_fn.grequests.map') as mock_map:
-            yield mock_get, mock_map
+def mock_fetch_all():
+    """Fixture to mock the concurrent fetcher."""
+    with patch('extract_fn.fetch_all') as mock:
+        yield mock
 
 
 @pytest.fixture
 def mock_parse_feed_entries():
     with patch('extract_fn.parse_feed_entries') as mock:
         yield mock
+
+
+@pytest.fixture
+def mock_parse_article_entries():
+    with patch('extract_fn.parse_article_entries') as mock:
+        yield mock
+
+
+@pytest.fixture
+def rss_feed_xml():
+    """Fixture to build RSS feed XML from (link, [categories]) pairs."""
+
+    def build(items):
+        entries = "".join(
+            f"<item><title>{link}</title><link>{link}</link>"
+            f"<pubDate>Wed, 16 Oct 2024 10:00:00 -0400</pubDate>"
+            + "".join(f"<category>{c}</category>" for c in categories)
+            + "</item>"
+            for link, categories in items)
+        return f"<rss version='2.0'><channel>{entries}</channel></rss>".encode()
+
+    return build
@@ -4,6 +4,11 @@ import grequests
 import feedparser
 from bs4 import BeautifulSoup
 
+from fetcher import fetch_all
+from parsing import make_soup, TargetFilter
+
+ARTICLE_BODY_FILTER = TargetFilter(classes=["article-body"])
+
 
 def fetch_rss_feed(feed_url: str) -> feedparser.FeedParserDict:
     """Fetches and parsers the RSS feed from the provided URL."""
@@ -32,7 +37,7 @@ def find_article_body(bs: BeautifulSoup):
 def parse_article_content(response) -> str:
     """Parses the article content from the HTML response."""
 
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = make_soup(response.content, ARTICLE_BODY_FILTER)
     soup = remove_hyperlink_ads(soup)
     article_body = find_article_body(soup)
 
@@ -58,52 +63,139 @@ def get_article_content(article_url: str) -> str:
         return f"Failed to fetch full content from {article_url}: {e}"
 
 
-def parse_feed_entries(feed: feedparser.FeedParserDict) -> list[dict]:
-    """Parses the entries of a feed and extracts relevant fields."""
+def index_feed_entries(feeds: list[feedparser.FeedParserDict]) -> dict[str, dict]:
+    """Returns the entries of every feed keyed by link, merging the category
+    tags of stories that appear in more than one feed."""
+
+    index = {}
+    for feed in feeds:
+        for entry in feed.entries:
+            categories = [tag.get("term") for tag in entry.get("tags", [])
+                          if tag.get("term")]
+            if entry.link in index:
+                known = index[entry.link]["categories"]
+                known.extend(c for c in categories if c not in known)
+            else:
+                index[entry.link] = {
+                    "title": entry.title,
+                    "link": entry.link,
+                    "published": entry.published,
+                    "categories": categories
+                }
+
+    return index
+
+
+def parse_article_entries(entries: list[dict]) -> list[dict]:
+    """Fetches and parses the full content of each indexed article entry."""
 
     source_name = "Fox News"
-    entries = []
-    article_requests = (grequests.get(entry.link) for entry in feed.entries)
-    responses = grequests.map(article_requests)
+    articles = []
+    responses = fetch_all([entry["link"] for entry in entries])
 
-    for entry, response in zip(feed.entries, responses):
+    for entry, response in zip(entries, responses):
         if response and response.status_code == 200:
             content = parse_article_content(response)
         else:
             content = f"Couldn't connect to article, status_code: {
                 response.status_code if response else "No response."}"
 
-        entries.append({
-            "title": entry.title,
+        articles.append({
+            "title": entry["title"],
             "content": content,
-            "link": entry.link,
-            "published": entry.published,
-            "source_name": source_name
+            "link": entry["link"],
+            "published": entry["published"],
+            "source_name": source_name,
+            "categories": entry["categories"]
         })
 
-    return entries
+    return articles
+
+
+def parse_feed_entries(feed: feedparser.FeedParserDict) -> list[dict]:
+    """Parses the entries of a feed and extracts relevant fields."""
+
+    return parse_article_entries(list(index_feed_entries([feed]).values()))
 
 
-def fetch_from_multiple_feeds(feed_urls: list[str]) -> list[dict]:
-    """Fetches and parses entries from multiple RSS feeds."""
+def build_conditional_headers(feed_state: dict, feed_url: str) -> dict:
+    """Returns the If-None-Match/If-Modified-Since headers for a previously fetched feed."""
 
-    async_list = []
-    for url in feed_urls:
-        action_item = grequests.get(url)
-        async_list.append(action_item)
+    saved = feed_state.get(feed_url, {})
+    headers = {}
+    if saved.get("etag"):
+        headers["If-None-Match"] = saved["etag"]
+    if saved.get("last_modified"):
+        headers["If-Modified-Since"] = saved["last_modified"]
 
-    responses = grequests.map(async_list)
+    return headers
 
-    all_entries = []
-    for response in responses:
+
+def update_feed_state(feed_state: dict, feed_url: str, response, entry_count: int) -> None:
+    """Records the validators, size and entry count of a freshly downloaded feed."""
+
+    feed_state[feed_url] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "content_length": len(response.content),
+        "entry_count": entry_count
+    }
+
+
+def count_conditional_savings(feed_urls: list[str], responses: list,
+                              feed_state: dict) -> dict:
+    """Returns the feeds, article requests and bytes saved by 304 responses."""
+
+    savings = {"feeds": 0, "requests": 0, "bytes": 0}
+    for url, response in zip(feed_urls, responses):
+        if response is not None and response.status_code == 304:
+            saved = feed_state.get(url, {})
+            savings["feeds"] += 1
+            savings["requests"] += saved.get("entry_count", 0)
+            savings["bytes"] += saved.get("content_length", 0)
+
+    return savings
+
+
+def fetch_from_multiple_feeds(feed_urls: list[str], feed_state: dict = None,
+                              seen_urls: set[str] = None) -> list[dict]:
+    """Fetches and parses entries from multiple RSS feeds.
+    Feeds unchanged since the last run (as recorded in feed_state) are skipped,
+    an article listed in several feeds is only fetched once and articles
+    already in the database (seen_urls) are not fetched at all."""
+
+    if feed_state is None:
+        feed_state = {}
+    if seen_urls is None:
+        seen_urls = set()
+
+    responses = fetch_all(feed_urls, headers=[build_conditional_headers(feed_state, url)
+                                              for url in feed_urls])
+    savings = count_conditional_savings(feed_urls, responses, feed_state)
+
+    feeds = []
+    for url, response in zip(feed_urls, responses):
+        if response is not None and response.status_code == 304:
+            continue
         if response and response.status_code == 200:
             feed = feedparser.parse(response.content)
-            entries = parse_feed_entries(feed)
-            all_entries.extend(entries)
+            feeds.append(feed)
+            update_feed_state(feed_state, url, response, len(feed.entries))
         else:
             print(f'Failed to fetch feed from {response.url if response else "No URL"}, '
                   'status_code: {response.status_code if response else "No response"}')
 
+    print(f"{savings['feeds']} feeds unchanged, saved {savings['requests']} "
+          f"article requests and {savings['bytes']} bytes")
+
+    index = index_feed_entries(feeds)
+    new_entries = [entry for link, entry in index.items()
+                   if link not in seen_urls]
+    print(f"Found {len(index)} unique articles across "
+          f"{sum(len(feed.entries) for feed in feeds)} feed entries, "
+          f"{len(new_entries)} not already stored")
+    all_entries = parse_article_entries(new_entries)
+
     return all_entries
 
 
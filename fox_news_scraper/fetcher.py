@@ -0,0 +1,109 @@
+# pylint: disable=R0801, wrong-import-order
+
+"""
+Bounded-concurrency HTTP fetching shared by the scrapers.
+
+Requests share one keep-alive session and run through a sliding window of
+at most `concurrency` requests, with at most `per_host` in flight to any one
+host. Each request has a timeout and is retried with jittered exponential
+backoff. Responses come back in the same order as the URLs.
+"""
+
+import grequests  # pylint: disable=unused-import  # Monkey-patches sockets for gevent
+
+import random
+from collections import defaultdict
+from collections.abc import Iterator
+from functools import partial
+from urllib.parse import urlsplit
+
+import gevent
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
+import requests
+from requests.adapters import HTTPAdapter
+
+CONCURRENCY = 50
+PER_HOST = 32
+TIMEOUT = 30
+RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """Returns a session that keeps up to pool_size connections alive per host."""
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def backoff_delay(attempt: int) -> float:
+    """Returns a full-jitter exponential backoff delay for a retry attempt."""
+
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def fetch_url(session: requests.Session, url: str, headers: dict,  # pylint: disable=R0913
+              host_limits: dict, *, timeout: float = TIMEOUT,
+              retries: int = RETRIES) -> requests.Response:
+    """
+    Returns the response for a URL, retrying connection errors and
+    retryable status codes. Returns None if no attempt connected.
+    """
+
+    response = None
+    for attempt in range(retries + 1):
+        if attempt:
+            gevent.sleep(backoff_delay(attempt - 1))
+
+        with host_limits[urlsplit(url).netloc]:
+            try:
+                response = session.get(url, headers=headers, timeout=timeout)
+            except requests.RequestException as e:
+                print(f"Request to {url} failed: {e}")
+                continue
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            return response
+
+    return response
+
+
+def fetch_iter(urls: list[str], headers: list[dict] = None, *,  # pylint: disable=R0913
+               concurrency: int = CONCURRENCY, per_host: int = PER_HOST,
+               timeout: float = TIMEOUT, retries: int = RETRIES) -> Iterator:
+    """
+    Fetches every URL through a sliding window of concurrent requests,
+    yielding the responses (None where a request failed) in the order of
+    urls as soon as each has arrived.
+    """
+
+    if headers is None:
+        headers = [None] * len(urls)
+
+    session = create_session(per_host)
+    host_limits = defaultdict(lambda: BoundedSemaphore(per_host))
+    fetch = partial(fetch_url, session, host_limits=host_limits,
+                    timeout=timeout, retries=retries)
+
+    try:
+        yield from Pool(concurrency).imap(fetch, urls, headers)
+    finally:
+        session.close()
+
+
+def fetch_all(urls: list[str], headers: list[dict] = None, *,  # pylint: disable=R0913
+              concurrency: int = CONCURRENCY, per_host: int = PER_HOST,
+              timeout: float = TIMEOUT, retries: int = RETRIES) -> list:
+    """
+    Fetches every URL through a sliding window of concurrent requests.
+    Returns the responses (None where a request failed) in the order of urls.
+    """
+
+    return list(fetch_iter(urls, headers, concurrency=concurrency, per_host=per_host,
+                           timeout=timeout, retries=retries))
@@ -7,14 +7,61 @@ into a CSV and load it into the S3 bucket.
 
 import grequests  # This must be here to avoid file version errors
 
+import gzip
+import json
 from os import environ as ENV
 from datetime import datetime
-from io import StringIO
 
 import pandas as pd
 import boto3
+from botocore.exceptions import ClientError
 
 from extract_fn import fetch_from_multiple_feeds
+from handoff import serialise_articles, article_data_suffix, partition_key
+
+FEED_STATE_KEY = "fox_news_feed_state.json"
+SEEN_URLS_KEY = "seen_article_urls.txt.gz"
+
+
+def get_s3_client():
+    """Returns a boto3 S3 client."""
+
+    return boto3.client(service_name="s3",
+                        aws_access_key_id=ENV["AWS_ACCESS_KEY_BOUDICCA"],
+                        aws_secret_access_key=ENV["AWS_ACCESS_SECRET_KEY_BOUDICCA"])
+
+
+def load_feed_state(s3_client, bucket_name: str) -> dict:
+    """Returns the ETag/Last-Modified state saved by the previous run,
+    or an empty state if there is none."""
+
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=FEED_STATE_KEY)
+        return json.loads(response["Body"].read())
+
+    except (ClientError, json.JSONDecodeError) as e:
+        print(f"No saved feed state, fetching all feeds in full: {e}")
+        return {}
+
+
+def save_feed_state(s3_client, bucket_name: str, feed_state: dict) -> None:
+    """Saves the ETag/Last-Modified state of each feed for the next run."""
+
+    s3_client.put_object(Bucket=bucket_name, Key=FEED_STATE_KEY,
+                         Body=json.dumps(feed_state))
+
+
+def load_seen_urls(s3_client, bucket_name: str) -> set[str]:
+    """Returns the URLs of articles already stored in the database,
+    as published to S3 by the analyser after each load."""
+
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=SEEN_URLS_KEY)
+        return set(gzip.decompress(response["Body"].read()).decode("utf-8").splitlines())
+
+    except (ClientError, OSError) as e:
+        print(f"No seen-URL ledger, fetching every article: {e}")
+        return set()
 
 
 def combine_entries_to_dataframe(entries: list[dict]) -> pd.DataFrame:
@@ -24,36 +71,43 @@ def combine_entries_to_dataframe(entries: list[dict]) -> pd.DataFrame:
     return df
 
 
-def upload_dataframe_to_s3(df: pd.DataFrame, bucket_name: str, s3_filename: str):
-    """Uploads the DataDrame as a CSV to an S3 bucket using in-memory storage
-    (i.e. StringIO)."""
-
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
+def upload_dataframe_to_s3(df: pd.DataFrame, bucket_name: str, s3_filename: str) -> bool:
+    """Uploads the DataDrame to an S3 bucket in the handoff format (CSV unless
+    HANDOFF_FORMAT says otherwise). Returns whether the upload succeeded."""
 
-    s3_client = boto3.client(service_name="s3",
-                             aws_access_key_id=ENV["AWS_ACCESS_KEY_BOUDICCA"],
-                             aws_secret_access_key=ENV["AWS_ACCESS_SECRET_KEY_BOUDICCA"])
+    s3_client = get_s3_client()
     try:
         s3_client.put_object(
             Bucket=bucket_name,
             Key=s3_filename,
-            Body=csv_buffer.getvalue()
+            Body=serialise_articles(df)
         )
         print(f"File uploaded to S3 bucket '{bucket_name}' as '{s3_filename}'")
+        return True
 
     except Exception as e:  # pylint: disable=W0718
         print(f"Failed to upload file to S3: {e}")
+        return False
 
 
 def process_rss_feeds_and_upload(feed_urls: list[str]):
-    """Combines the fetching, cleaning, combining, and uploading of RSS data."""
+    """Combines the fetching, cleaning, combining, and uploading of RSS data.
+    The feed state is only saved once the articles are safely in S3."""
 
-    entries = fetch_from_multiple_feeds(feed_urls)
+    bucket_name = ENV["S3_BUCKET_NAME"]
+    s3_client = get_s3_client()
+    feed_state = load_feed_state(s3_client, bucket_name)
+    seen_urls = load_seen_urls(s3_client, bucket_name)
+
+    entries = fetch_from_multiple_feeds(feed_urls, feed_state, seen_urls)
+    if not entries:
+        print("No feeds have changed since the last run.")
+        save_feed_state(s3_client, bucket_name, feed_state)
+        return
 
     df = combine_entries_to_dataframe(entries)
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
-    bucket_name = ENV["S3_BUCKET_NAME"]
-    s3_filename = f"{current_time}_fox_news_article_data.csv"
-    upload_dataframe_to_s3(df, bucket_name, s3_filename)
+    s3_filename = partition_key(f"{current_time}_fox_news{article_data_suffix()}")
+    if upload_dataframe_to_s3(df, bucket_name, s3_filename):
+        save_feed_state(s3_client, bucket_name, feed_state)
@@ -7,7 +7,8 @@ from unittest import TestCase
 
 import pytest
 from bs4 import BeautifulSoup
-from extract_fn import fetch_rss_feed, get_article_content, remove_hyperlink_ads, parse_article_content, parse_feed_entries, fetch_from_multiple_feeds
+from extract_fn import fetch_rss_feed, get_article_content, remove_hyperlink_ads, parse_article_content, parse_feed_entries, fetch_from_multiple_feeds, index_feed_entries, build_conditional_headers, update_feed_state, count_conditional_savings, ARTICLE_BODY_FILTER
+from parsing import make_soup
 
 
 @pytest.mark.parametrize("fake_url", [
@@ -91,10 +92,29 @@ class TestParseArticleContent(TestCase):
         <p>This is the article content.</p>
         </div>"""
 
-        mock_soup = BeautifulSoup(mock_response.content, "html.parser")
+        mock_soup = make_soup(mock_response.content, ARTICLE_BODY_FILTER)
         parse_article_content(mock_response)
         mock_remove_hyperlink_ads.assert_called_once_with(mock_soup)
 
+    def test_only_parses_article_body(self):
+        """Tests that markup outside the article body is not parsed"""
+
+        mock_response = MagicMock()
+        mock_response.content = """
+        <html><body>
+        <nav><a href="/">Home</a></nav>
+        <div class="page-content">
+        <div class="article-body">
+        <p>This is the article content.</p>
+        <p><a href="/ad"><strong>CLICK HERE</strong></a></p>
+        </div>
+        </div>
+        <footer><p>Footer text.</p></footer>
+        </body></html>"""
+
+        result = parse_article_content(mock_response)
+        self.assertEqual(result, "This is the article content.")
+
     @patch('extract_fn.find_article_body')
     @patch('extract_fn.remove_hyperlink_ads')
     def test_article_body_not_found(self, mock_remove_hyperlink_ads, mock_find_article_body):
@@ -165,12 +185,10 @@ class TestGetArticleContent:
 
 class TestParseFeedEntries:
 
-    def test_successful_entries(self, mock_feed, mock_grequests, mock_parse_article_content):
+    def test_successful_entries(self, mock_feed, mock_fetch_all, mock_parse_article_content):
         """Test when all entries are fetched and parsed successfully."""
 
-        mock_get, mock_map = mock_grequests
-
-        mock_map.return_value = [
+        mock_fetch_all.return_value = [
             MagicMock(status_code=200),
             MagicMock(status_code=200)
         ]
@@ -186,25 +204,25 @@ class TestParseFeedEntries:
                 "content": "Content for article 1",
                 "link": "http://example.com/article1",
                 "published": "2024-10-10",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             },
             {
                 "title": "Article 2",
                 "content": "Content for article 2",
                 "link": "http://example.com/article2",
                 "published": "2024-10-11",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             }
         ]
 
         assert result == expected
 
-    def test_non_200_status_code(self, mock_feed, mock_grequests, mock_parse_article_content):
+    def test_non_200_status_code(self, mock_feed, mock_fetch_all, mock_parse_article_content):
         """Test when one of the entries returns a non-200 status code."""
 
-        mock_get, mock_map = mock_grequests
-
-        mock_map.return_value = [
+        mock_fetch_all.return_value = [
             MagicMock(status_code=200),
             MagicMock(status_code=404)
         ]
@@ -219,25 +237,25 @@ class TestParseFeedEntries:
                 "content": "Content for article 1",
                 "link": "http://example.com/article1",
                 "published": "2024-10-10",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             },
             {
                 "title": "Article 2",
                 "content": "Couldn't connect to article, status_code: 404",
                 "link": "http://example.com/article2",
                 "published": "2024-10-11",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             }
         ]
 
         assert result == expected
 
-    def test_no_response(self, mock_feed, mock_grequests, mock_parse_article_content):
+    def test_no_response(self, mock_feed, mock_fetch_all, mock_parse_article_content):
         """Test when no response is returned for an entry."""
 
-        mock_get, mock_map = mock_grequests
-
-        mock_map.return_value = [
+        mock_fetch_all.return_value = [
             MagicMock(status_code=200),
             None
         ]
@@ -252,14 +270,16 @@ class TestParseFeedEntries:
                 "content": "Content for article 1",
                 "link": "http://example.com/article1",
                 "published": "2024-10-10",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             },
             {
                 "title": "Article 2",
                 "content": "Couldn't connect to article, status_code: No response.",
                 "link": "http://example.com/article2",
                 "published": "2024-10-11",
-                "source_name": "Fox News"
+                "source_name": "Fox News",
+                "categories": []
             }
         ]
 
@@ -268,70 +288,180 @@ class TestParseFeedEntries:
 
 class TestFetchFromMultipleFeeds:
 
-    def test_fetch_from_multiple_feeds_success(self, mock_grequests, mock_parse_feed_entries):
+    def test_fetch_from_multiple_feeds_success(self, mock_fetch_all, mock_parse_article_entries, rss_feed_xml):
         """Test fetching from multiple feeds successfully."""
 
-        _, mock_map = mock_grequests
-
         feed_urls = ["http://example.com/feed1", "http://example.com/feed2"]
 
-        mock_response_1 = MagicMock(status_code=200, content=b"<xml>...</xml>")
-        mock_response_2 = MagicMock(status_code=200, content=b"<xml>...</xml>")
-
-        mock_map.return_value = [mock_response_1, mock_response_2]
+        mock_response_1 = MagicMock(status_code=200, content=rss_feed_xml(
+            [("http://example.com/entry1", ["politics"])]))
+        mock_response_2 = MagicMock(status_code=200, content=rss_feed_xml(
+            [("http://example.com/entry2", ["world"])]))
 
-        mock_parse_feed_entries.side_effect = [
-            [{"title": "Entry 1", "content": "Content 1", "link": "http://example.com/entry1",
-                "published": "2024-10-10", "source_name": "Source 1"}],
-            [{"title": "Entry 2", "content": "Content 2", "link": "http://example.com/entry2",
-                "published": "2024-10-11", "source_name": "Source 2"}]
-        ]
+        mock_fetch_all.return_value = [mock_response_1, mock_response_2]
+        mock_parse_article_entries.side_effect = lambda entries: entries
 
         result = fetch_from_multiple_feeds(feed_urls)
 
-        # Expected output
-        expected = [
-            {"title": "Entry 1", "content": "Content 1", "link": "http://example.com/entry1",
-                "published": "2024-10-10", "source_name": "Source 1"},
-            {"title": "Entry 2", "content": "Content 2", "link": "http://example.com/entry2",
-                "published": "2024-10-11", "source_name": "Source 2"}
+        assert [entry["link"] for entry in result] == [
+            "http://example.com/entry1", "http://example.com/entry2"]
+        mock_parse_article_entries.assert_called_once()
+
+    def test_fetch_from_multiple_feeds_deduplicates(self, mock_fetch_all, mock_parse_article_entries, rss_feed_xml):
+        """Test that a story in several feeds is only fetched once, with merged categories."""
+
+        feed_urls = ["http://example.com/latest", "http://example.com/politics",
+                     "http://example.com/opinion"]
+
+        mock_fetch_all.return_value = [
+            MagicMock(status_code=200, content=rss_feed_xml(
+                [("http://example.com/story", ["latest"]),
+                 ("http://example.com/other", [])])),
+            MagicMock(status_code=200, content=rss_feed_xml(
+                [("http://example.com/story", ["politics", "latest"])])),
+            MagicMock(status_code=200, content=rss_feed_xml(
+                [("http://example.com/story", ["opinion"])]))
         ]
+        mock_parse_article_entries.side_effect = lambda entries: entries
 
-        assert result == expected
+        result = fetch_from_multiple_feeds(feed_urls)
 
-    def test_fetch_from_multiple_feeds_failure(self, mock_grequests, mock_parse_feed_entries):
-        """Test handling failures when fetching from feeds."""
+        entries = mock_parse_article_entries.call_args[0][0]
+        assert [entry["link"] for entry in entries] == [
+            "http://example.com/story", "http://example.com/other"]
+        assert result[0]["categories"] == ["latest", "politics", "opinion"]
 
-        _, mock_map = mock_grequests
+    def test_fetch_from_multiple_feeds_failure(self, mock_fetch_all, mock_parse_article_entries, rss_feed_xml):
+        """Test handling failures when fetching from feeds."""
 
         feed_urls = ["http://example.com/feed1", "http://example.com/feed2"]
 
-        mock_response_1 = MagicMock(status_code=200, content=b"<xml>...</xml>")
-        mock_response_2 = MagicMock(status_code=404, content=b"<xml>...</xml>")
-
-        mock_map.return_value = [mock_response_1, mock_response_2]
+        mock_response_1 = MagicMock(status_code=200, content=rss_feed_xml(
+            [("http://example.com/entry1", [])]))
+        mock_response_2 = MagicMock(status_code=404, content=rss_feed_xml(
+            [("http://example.com/entry2", [])]))
 
-        mock_parse_feed_entries.return_value = [{"title": "Entry 1", "content": "Content 1",
-                                                 "link": "http://example.com/entry1", "published": "2024-10-10", "source_name": "Source 1"}]
+        mock_fetch_all.return_value = [mock_response_1, mock_response_2]
+        mock_parse_article_entries.side_effect = lambda entries: entries
 
         result = fetch_from_multiple_feeds(feed_urls)
 
-        expected = [
-            {"title": "Entry 1", "content": "Content 1", "link": "http://example.com/entry1",
-                "published": "2024-10-10", "source_name": "Source 1"}
-        ]
+        assert [entry["link"] for entry in result] == [
+            "http://example.com/entry1"]
 
-        assert result == expected
-
-    def test_fetch_from_multiple_feeds_no_responses(self, mock_grequests):
+    def test_fetch_from_multiple_feeds_no_responses(self, mock_fetch_all):
         """Test when no responses are returned."""
 
-        _, mock_map = mock_grequests
-
         feed_urls = ["http://example.com/feed1", "http://example.com/feed2"]
 
-        mock_map.return_value = [None, None]
+        mock_fetch_all.side_effect = [[None, None], []]
 
         result = fetch_from_multiple_feeds(feed_urls)
         expected = []
         assert result == expected
+
+    def test_fetch_from_multiple_feeds_not_modified(self, mock_fetch_all, mock_parse_article_entries, rss_feed_xml):
+        """Test that feeds answering 304 are not parsed."""
+
+        feed_urls = ["http://example.com/feed1", "http://example.com/feed2"]
+        feed_state = {"http://example.com/feed1": {
+            "etag": '"abc"', "content_length": 5000, "entry_count": 20}}
+
+        mock_response_1 = MagicMock(status_code=304)
+        mock_response_2 = MagicMock(status_code=200, content=rss_feed_xml(
+            [("http://example.com/entry2", [])]), headers={"ETag": '"def"'})
+
+        mock_fetch_all.return_value = [mock_response_1, mock_response_2]
+        mock_parse_article_entries.side_effect = lambda entries: entries
+
+        result = fetch_from_multiple_feeds(feed_urls, feed_state)
+
+        assert [entry["link"] for entry in result] == [
+            "http://example.com/entry2"]
+        assert mock_fetch_all.call_args_list[0].kwargs["headers"] == [
+            {"If-None-Match": '"abc"'}, {}]
+        assert feed_state["http://example.com/feed2"]["etag"] == '"def"'
+        assert feed_state["http://example.com/feed2"]["entry_count"] == 1
+
+    def test_fetch_from_multiple_feeds_skips_seen_urls(self, mock_fetch_all, mock_parse_article_entries, rss_feed_xml):
+        """Test that articles already stored are never fetched."""
+
+        mock_fetch_all.return_value = [MagicMock(status_code=200, content=rss_feed_xml(
+            [("http://example.com/old", []), ("http://example.com/new", [])]))]
+        mock_parse_article_entries.side_effect = lambda entries: entries
+
+        result = fetch_from_multiple_feeds(["http://example.com/feed"], {},
+                                           {"http://example.com/old"})
+
+        assert [entry["link"] for entry in result] == ["http://example.com/new"]
+
+
+def test_index_feed_entries_merges_categories():
+    """Entries are keyed by link and their categories merged in feed order."""
+
+    feed_1 = MagicMock(entries=[{"title": "Story", "link": "http://example.com/story",
+                                 "published": "2024-10-10", "tags": [{"term": "latest"}]}])
+    feed_2 = MagicMock(entries=[{"title": "Story", "link": "http://example.com/story",
+                                 "published": "2024-10-10",
+                                 "tags": [{"term": "politics"}, {"term": "latest"}]}])
+    for feed in (feed_1, feed_2):
+        feed.entries = [MagicMock(**entry, get=entry.get) for entry in feed.entries]
+
+    result = index_feed_entries([feed_1, feed_2])
+
+    assert result == {"http://example.com/story": {
+        "title": "Story",
+        "link": "http://example.com/story",
+        "published": "2024-10-10",
+        "categories": ["latest", "politics"]
+    }}
+
+
+class TestConditionalGet:
+
+    def test_build_conditional_headers(self):
+        """Both validators are sent when known."""
+
+        feed_state = {"http://example.com/feed": {
+            "etag": '"abc"', "last_modified": "Wed, 16 Oct 2024 10:00:00 GMT"}}
+
+        assert build_conditional_headers(feed_state, "http://example.com/feed") == {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Wed, 16 Oct 2024 10:00:00 GMT"
+        }
+
+    def test_build_conditional_headers_unknown_feed(self):
+        """No headers are sent for a feed that has never been fetched."""
+
+        assert build_conditional_headers({}, "http://example.com/feed") == {}
+
+    def test_update_feed_state(self):
+        """The validators, size and entry count are recorded."""
+
+        feed_state = {}
+        response = MagicMock(content=b"12345", headers={
+            "ETag": '"abc"', "Last-Modified": "Wed, 16 Oct 2024 10:00:00 GMT"})
+
+        update_feed_state(feed_state, "http://example.com/feed", response, 3)
+
+        assert feed_state == {"http://example.com/feed": {
+            "etag": '"abc"',
+            "last_modified": "Wed, 16 Oct 2024 10:00:00 GMT",
+            "content_length": 5,
+            "entry_count": 3
+        }}
+
+    def test_count_conditional_savings(self):
+        """Only 304 responses count towards the savings."""
+
+        feed_urls = ["http://example.com/feed1", "http://example.com/feed2",
+                     "http://example.com/feed3"]
+        feed_state = {
+            "http://example.com/feed1": {"content_length": 100, "entry_count": 4},
+            "http://example.com/feed2": {"content_length": 200, "entry_count": 6}
+        }
+        responses = [MagicMock(status_code=304),
+                     MagicMock(status_code=200), None]
+
+        assert count_conditional_savings(feed_urls, responses, feed_state) == {
+            "feeds": 1, "requests": 4, "bytes": 100}
@@ -0,0 +1,106 @@
+# pylint: skip-file
+
+from unittest.mock import patch
+
+import gevent
+from gevent.pywsgi import WSGIServer
+import pytest
+
+from fetcher import fetch_all, fetch_iter, backoff_delay, BACKOFF_CAP
+
+
+class StandInApp:
+    """WSGI app serving /ok/<n>, /slow/<n> and /flaky/<n>, recording concurrency."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.hits = {}
+
+    def __call__(self, environ, start_response):
+        path = environ["PATH_INFO"]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.hits[path] = self.hits.get(path, 0) + 1
+
+        if path.startswith("/slow/"):
+            gevent.sleep(0.05)
+        self.active -= 1
+
+        if path.startswith("/flaky/") and self.hits[path] == 1:
+            start_response("503 Service Unavailable", [])
+            return [b"busy"]
+        start_response("200 OK", [])
+        return [path.encode()]
+
+
+@pytest.fixture
+def stand_in_server():
+    app = StandInApp()
+    server = WSGIServer(("127.0.0.1", 0), app, log=None)
+    server.start()
+    yield app, f"http://127.0.0.1:{server.server_port}"
+    server.stop()
+
+
+def test_fetch_all_keeps_input_order(stand_in_server):
+    _, base = stand_in_server
+    urls = [f"{base}/slow/{i}" if i % 2 else f"{base}/ok/{i}"
+            for i in range(10)]
+
+    responses = fetch_all(urls, concurrency=5)
+
+    assert [r.text for r in responses] == [url[len(base):] for url in urls]
+
+
+def test_fetch_iter_yields_before_all_have_arrived(stand_in_server):
+    server, base = stand_in_server
+    urls = [f"{base}/ok/0"] + [f"{base}/slow/{i}" for i in range(1, 4)]
+
+    responses = fetch_iter(urls, concurrency=1)
+    first = next(responses)
+
+    assert first.text == "/ok/0"
+    assert sum(server.hits.values()) < len(urls)
+    assert [r.text for r in responses] == [url[len(base):] for url in urls[1:]]
+
+
+def test_fetch_all_caps_requests_per_host(stand_in_server):
+    server, base = stand_in_server
+
+    fetch_all([f"{base}/slow/{i}" for i in range(12)],
+              concurrency=10, per_host=3)
+
+    assert server.max_active <= 3
+
+
+@patch('fetcher.backoff_delay', return_value=0)
+def test_fetch_all_retries_retryable_status(mock_backoff, stand_in_server):
+    server, base = stand_in_server
+
+    responses = fetch_all([f"{base}/flaky/1"])
+
+    assert responses[0].status_code == 200
+    assert server.hits["/flaky/1"] == 2
+
+
+@patch('fetcher.backoff_delay', return_value=0)
+def test_fetch_all_returns_none_when_unreachable(mock_backoff):
+    responses = fetch_all(["http://127.0.0.1:9/unreachable"],
+                          timeout=1, retries=1)
+
+    assert responses == [None]
+
+
+def test_fetch_all_sends_headers(stand_in_server):
+    _, base = stand_in_server
+
+    with patch('fetcher.requests.Session.get', autospec=True) as mock_get:
+        fetch_all([f"{base}/ok/1"], headers=[{"If-None-Match": '"abc"'}])
+
+    assert mock_get.call_args.kwargs["headers"] == {"If-None-Match": '"abc"'}
+
+
+@pytest.mark.parametrize("attempt", [0, 1, 5, 20])
+def test_backoff_delay_is_capped(attempt):
+    assert 0 <= backoff_delay(attempt) <= BACKOFF_CAP
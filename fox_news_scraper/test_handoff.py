@@ -0,0 +1,102 @@
+# pylint: skip-file
+
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from datetime import datetime, timezone, timedelta
+
+from handoff import (serialise_articles, read_articles, article_data_suffix,
+                     partition_key, ARTICLE_SCHEMA)
+
+ARTICLES = pd.DataFrame({
+    "title": ["Title 1", "Title, with a comma"],
+    "content": ["Line one\nline two", "123"],
+    "link": ["https://a.org/1", "https://a.org/2"],
+    "published": ["2024-10-07", "Mon, 07 Oct 2024 12:00:00 -0400"],
+    "source_name": ["Fox News", "Fox News"]
+})
+
+
+@pytest.mark.parametrize("handoff_format", ["csv", "parquet"])
+def test_round_trip(handoff_format):
+    body = serialise_articles(ARTICLES, handoff_format)
+    object_name = "2024-10-07" + article_data_suffix(handoff_format)
+
+    result = read_articles(BytesIO(body), object_name)
+
+    assert set(ARTICLES.columns) <= set(result.columns)
+    assert result["title"].tolist() == ARTICLES["title"].tolist()
+    assert result["published"].tolist() == ARTICLES["published"].tolist()
+
+
+def test_parquet_keeps_declared_types():
+    body = serialise_articles(ARTICLES, "parquet")
+
+    result = read_articles(BytesIO(body), "batch_article_data.parquet")
+
+    assert result["content"].tolist() == ["Line one\nline two", "123"]
+
+
+def test_parquet_keeps_categories():
+    articles = ARTICLES.assign(categories=[["politics", "us"], []])
+
+    result = read_articles(BytesIO(serialise_articles(articles, "parquet")),
+                           "batch_article_data.parquet")
+
+    assert [list(c) for c in result["categories"]] == [["politics", "us"], []]
+
+
+def test_parquet_without_categories_reads_null():
+    result = read_articles(BytesIO(serialise_articles(ARTICLES, "parquet")),
+                           "batch_article_data.parquet")
+
+    assert result["categories"].isna().all()
+
+
+def test_parquet_reads_batches_from_before_categories():
+    buffer = BytesIO()
+    pq.write_table(pa.Table.from_pandas(ARTICLES, preserve_index=False), buffer)
+
+    result = read_articles(BytesIO(buffer.getvalue()), "batch_article_data.parquet")
+
+    assert list(result.columns) == ARTICLE_SCHEMA.names
+    assert result["categories"].isna().all()
+    assert result["title"].tolist() == ARTICLES["title"].tolist()
+
+
+def test_parquet_only_writes_declared_columns():
+    articles = ARTICLES.assign(extra=[1, 2])
+
+    result = read_articles(BytesIO(serialise_articles(articles, "parquet")),
+                           "batch_article_data.parquet")
+
+    assert list(result.columns) == ARTICLE_SCHEMA.names
+
+
+@patch('handoff.ENV', {})
+def test_defaults_to_csv():
+    assert article_data_suffix() == "_article_data.csv"
+    assert serialise_articles(ARTICLES).startswith(b"title,content")
+
+
+@patch('handoff.ENV', {"HANDOFF_FORMAT": "parquet"})
+def test_format_from_env():
+    assert article_data_suffix() == "_article_data.parquet"
+    assert serialise_articles(ARTICLES).startswith(b"PAR1")
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        article_data_suffix("xml")
+
+
+def test_partition_key_is_utc():
+    moment = datetime(2024, 10, 7, 1, 30, tzinfo=timezone(timedelta(hours=2)))
+
+    assert partition_key("a_article_data.csv", moment) == \
+        "2024/10/06/23/a_article_data.csv"
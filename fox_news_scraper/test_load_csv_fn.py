@@ -3,37 +3,57 @@
 """Tests for load_csv_fn"""
 
 from datetime import datetime
+import gzip
+
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
 
-from load_csv_fn import combine_entries_to_dataframe, process_rss_feeds_and_upload
+from botocore.exceptions import ClientError
+
+from load_csv_fn import (combine_entries_to_dataframe, process_rss_feeds_and_upload,
+                         upload_dataframe_to_s3,
+                         load_feed_state, save_feed_state, load_seen_urls,
+                         FEED_STATE_KEY, SEEN_URLS_KEY)
 
 
+@patch('load_csv_fn.load_seen_urls')
+@patch('load_csv_fn.save_feed_state')
+@patch('load_csv_fn.load_feed_state')
+@patch('load_csv_fn.get_s3_client')
 @patch('load_csv_fn.upload_dataframe_to_s3')
 @patch('load_csv_fn.combine_entries_to_dataframe')
 @patch('load_csv_fn.fetch_from_multiple_feeds')
 @patch('load_csv_fn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+@patch('load_csv_fn.partition_key', lambda name: f"2024/10/11/12/{name}")
 @patch('load_csv_fn.datetime')
-def test_process_rss_feeds_and_upload(mock_datetime, mock_fetch, mock_combine, mock_upload):
+def test_process_rss_feeds_and_upload(mock_datetime, mock_fetch, mock_combine, mock_upload,
+                                      mock_client, mock_load_state, mock_save_state,
+                                      mock_load_seen):
     """Mocks the test process RSS feed process"""
     mock_datetime.now.return_value.strftime.return_value = "2024-10-11_12-00-00"
     entries = {'col1': [1, 2], 'col2': [3, 4]}
     mock_fetch.return_value = entries
     mock_combine.return_value = pd.DataFrame(entries)
+    mock_load_state.return_value = {"feed": {"etag": "abc"}}
+    mock_upload.return_value = True
+    mock_load_seen.return_value = {"http://example.com/old"}
 
     feed_urls = ["http://example.com/feed1", "http://example.com/feed2"]
 
     process_rss_feeds_and_upload(feed_urls)
 
-    mock_fetch.assert_called_once_with(feed_urls)
+    mock_fetch.assert_called_once_with(
+        feed_urls, {"feed": {"etag": "abc"}}, {"http://example.com/old"})
+    mock_save_state.assert_called_once_with(
+        mock_client.return_value, "test-bucket", {"feed": {"etag": "abc"}})
 
     mock_combine.assert_called_once_with(entries)
 
     args, kwargs = mock_upload.call_args
     pd.testing.assert_frame_equal(args[0],  pd.DataFrame(entries))
     assert args[1] == "test-bucket"
-    assert args[2] == "2024-10-11_12-00-00_fox_news_article_data.csv"
+    assert args[2] == "2024/10/11/12/2024-10-11_12-00-00_fox_news_article_data.csv"
 
 
 @pytest.mark.parametrize("entries", [
@@ -46,3 +66,106 @@ def test_combine_entries_into_df(entries):
     expected_cols = entries[0].keys()
     assert set(combine_entries_to_dataframe(
         entries).columns) == set(expected_cols)
+
+
+@patch('load_csv_fn.load_seen_urls', MagicMock(return_value=set()))
+@patch('load_csv_fn.save_feed_state')
+@patch('load_csv_fn.load_feed_state')
+@patch('load_csv_fn.get_s3_client')
+@patch('load_csv_fn.upload_dataframe_to_s3')
+@patch('load_csv_fn.fetch_from_multiple_feeds')
+@patch('load_csv_fn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+def test_process_rss_feeds_failed_upload_keeps_state(mock_fetch, mock_upload, mock_client,
+                                                     mock_load_state, mock_save_state):
+    """The feed state must not be saved if the articles never reached S3."""
+    mock_fetch.return_value = [{"title": "Article 1"}]
+    mock_load_state.return_value = {}
+    mock_upload.return_value = False
+
+    process_rss_feeds_and_upload(["http://example.com/feed1"])
+
+    mock_save_state.assert_not_called()
+
+
+@patch('load_csv_fn.load_seen_urls', MagicMock(return_value=set()))
+@patch('load_csv_fn.save_feed_state')
+@patch('load_csv_fn.load_feed_state')
+@patch('load_csv_fn.get_s3_client')
+@patch('load_csv_fn.upload_dataframe_to_s3')
+@patch('load_csv_fn.fetch_from_multiple_feeds')
+@patch('load_csv_fn.ENV', {'S3_BUCKET_NAME': 'test-bucket'})
+def test_process_rss_feeds_no_changes_skips_upload(mock_fetch, mock_upload, mock_client,
+                                                   mock_load_state, mock_save_state):
+    """Nothing is uploaded when every feed was unchanged."""
+    mock_fetch.return_value = []
+    mock_load_state.return_value = {}
+
+    process_rss_feeds_and_upload(["http://example.com/feed1"])
+
+    mock_upload.assert_not_called()
+    mock_save_state.assert_called_once()
+
+
+def test_load_feed_state():
+    """Returns the saved JSON state."""
+    mock_client = MagicMock()
+    mock_client.get_object.return_value = {
+        "Body": MagicMock(read=MagicMock(return_value=b'{"feed": {"etag": "abc"}}'))}
+
+    assert load_feed_state(mock_client, "test-bucket") == {
+        "feed": {"etag": "abc"}}
+    mock_client.get_object.assert_called_once_with(
+        Bucket="test-bucket", Key=FEED_STATE_KEY)
+
+
+def test_load_feed_state_missing():
+    """Returns an empty state when nothing has been saved yet."""
+    mock_client = MagicMock()
+    mock_client.get_object.side_effect = ClientError(
+        {"Error": {"Code": "NoSuchKey"}}, "GetObject")
+
+    assert load_feed_state(mock_client, "test-bucket") == {}
+
+
+def test_save_feed_state():
+    """Saves the state as JSON."""
+    mock_client = MagicMock()
+
+    save_feed_state(mock_client, "test-bucket", {"feed": {"etag": "abc"}})
+
+    mock_client.put_object.assert_called_once_with(
+        Bucket="test-bucket", Key=FEED_STATE_KEY, Body='{"feed": {"etag": "abc"}}')
+
+
+def test_load_seen_urls():
+    """Returns the URLs in the gzipped ledger."""
+    mock_client = MagicMock()
+    mock_client.get_object.return_value = {"Body": MagicMock(read=MagicMock(
+        return_value=gzip.compress(b"http://a.com\nhttp://b.com")))}
+
+    assert load_seen_urls(mock_client, "test-bucket") == {
+        "http://a.com", "http://b.com"}
+    mock_client.get_object.assert_called_once_with(
+        Bucket="test-bucket", Key=SEEN_URLS_KEY)
+
+
+def test_load_seen_urls_missing():
+    """Returns an empty set before the analyser has published a ledger."""
+    mock_client = MagicMock()
+    mock_client.get_object.side_effect = ClientError(
+        {"Error": {"Code": "NoSuchKey"}}, "GetObject")
+
+    assert load_seen_urls(mock_client, "test-bucket") == set()
+
+
+@patch('handoff.ENV', {"HANDOFF_FORMAT": "parquet"})
+@patch('load_csv_fn.get_s3_client')
+def test_upload_dataframe_to_s3_parquet(mock_client):
+    """The batch is written in the configured handoff format."""
+    df = pd.DataFrame({"title": ["T"], "content": ["C"], "link": ["L"],
+                       "published": ["P"], "source_name": ["Fox News"]})
+
+    assert upload_dataframe_to_s3(df, "test-bucket", "x_article_data.parquet")
+
+    body = mock_client.return_value.put_object.call_args.kwargs["Body"]
+    assert body.startswith(b"PAR1")
@@ -0,0 +1,75 @@
+"""
+Benchmarks extracting a backlog of batches from S3 one at a time (the
+previous loop, deleting each object as it went) against the thread pool
+download followed by a single batched delete.
+
+A moto stand-in plays S3, with a fixed delay added to every request to
+stand in for the round trip to the real bucket.
+Run with `python3 benchmark_extract.py [n_objects] [latency_seconds]`.
+"""
+
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+from extract_s3 import create_dataframe, delete_object, download_dataframes, delete_objects
+
+BUCKET_NAME = "benchmark-bucket"
+
+
+def add_latency(s3_client, latency: float):
+    """Delays every request the client sends by latency seconds,
+    returning the handler so it can be removed again."""
+
+    def delay(**kwargs):  # pylint: disable=unused-argument
+        time.sleep(latency)
+
+    s3_client.meta.events.register("before-send.s3", delay)
+    return delay
+
+
+def fill_bucket(s3_client, n_objects: int) -> list[str]:
+    """Uploads n_objects article batches, returning their names."""
+
+    names = [f"2024-10-07_{i:04}_article_data.csv" for i in range(n_objects)]
+    body = "title,content,link,published,source_name\n" + \
+        "Title,Content,https://a.org,2024-10-07,Fox News\n" * 50
+    for name in names:
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=name, Body=body)
+    return names
+
+
+def extract_one_at_a_time(s3_client, names: list[str]) -> None:
+    """The previous extract loop: download then delete, one object at a time."""
+
+    for name in names:
+        create_dataframe(s3_client, BUCKET_NAME, name)
+        delete_object(s3_client, BUCKET_NAME, name)
+
+
+def extract_concurrently(s3_client, names: list[str]) -> None:
+    """Thread pool downloads, then one batched delete."""
+
+    download_dataframes(s3_client, BUCKET_NAME, names)
+    delete_objects(s3_client, BUCKET_NAME, names)
+
+
+if __name__ == "__main__":
+    object_count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    request_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.03
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket=BUCKET_NAME)
+        print(f"{object_count} objects, {request_latency * 1000:.0f} ms per request")
+
+        for label, extract in [("one at a time", extract_one_at_a_time),
+                               ("thread pool + batched delete", extract_concurrently)]:
+            object_names = fill_bucket(s3, object_count)
+            handler = add_latency(s3, request_latency)
+            start = time.perf_counter()
+            extract(s3, object_names)
+            print(f"{label:<30} {time.perf_counter() - start:6.2f}s")
+            s3.meta.events.unregister("before-send.s3", handler)
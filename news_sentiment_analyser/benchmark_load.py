@@ -0,0 +1,86 @@
+"""
+Benchmarks inserting articles with execute_values against streaming them
+through COPY into a staging table and merging, at 1k, 10k and 100k rows.
+Prints the time and the peak Python memory of each.
+
+Needs a Postgres database in the DB_* environment variables. The articles
+go into a temporary `article` table, which hides the real one for this
+session only and is dropped when it ends.
+Run with `python3 benchmark_load.py [content_words]`.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from db_pool import create_connection
+from load_rds import (ARTICLE_COLUMNS, ARTICLE_INSERT_QUERY, ARTICLE_INSERT_TEMPLATE,
+                      VALUES_PAGE_SIZE, copy_into_articles)
+
+CREATE_ARTICLE_TABLE = """
+    CREATE TEMP TABLE article (
+        article_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        article_title VARCHAR(500) NOT NULL,
+        article_content TEXT NOT NULL,
+        title_polarity_score FLOAT NOT NULL,
+        content_polarity_score FLOAT NOT NULL,
+        source_id SMALLINT NOT NULL,
+        date_published DATE NOT NULL,
+        article_url VARCHAR(500) NOT NULL UNIQUE,
+        UNIQUE (article_title, source_id, date_published)
+    );
+"""
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+
+def make_articles(n_rows: int, content_words: int) -> pd.DataFrame:
+    """Returns n_rows articles with content_words words of content each."""
+
+    content = " ".join(["The senator said, \"we will vote\" on the bill."] * (content_words // 9))
+    return pd.DataFrame({
+        "title": [f"Headline number {i}" for i in range(n_rows)],
+        "content": [f"{content} {i}" for i in range(n_rows)],
+        "title_polarity_score": [0.1] * n_rows,
+        "content_polarity_score": [-0.2] * n_rows,
+        "source_id": [1 + i % 2 for i in range(n_rows)],
+        "published": ["2024-10-07"] * n_rows,
+        "link": [f"https://example.com/articles/{i}" for i in range(n_rows)]
+    })[ARTICLE_COLUMNS]
+
+
+def insert_values(cur, articles: pd.DataFrame) -> list:
+    """The execute_values path."""
+
+    params = [(position, *row) for position, row
+              in enumerate(articles.itertuples(index=False))]
+    return execute_values(cur, ARTICLE_INSERT_QUERY, params, template=ARTICLE_INSERT_TEMPLATE,
+                          page_size=VALUES_PAGE_SIZE, fetch=True)
+
+
+if __name__ == "__main__":
+    words = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+
+    with create_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_ARTICLE_TABLE)
+            conn.commit()
+
+            for n in ROW_COUNTS:
+                batch = make_articles(n, words)
+                for label, insert in [("execute_values", insert_values),
+                                      ("COPY + merge", copy_into_articles)]:
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    resolved = insert(cursor, batch)
+                    conn.commit()
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    print(f"{n:>7} rows  {label:<15} {elapsed:7.2f}s  "
+                          f"{peak / 2**20:7.1f} MiB peak  {len(resolved)} ids")
+                    cursor.execute("TRUNCATE article;")
+                    conn.commit()
+    conn.close()
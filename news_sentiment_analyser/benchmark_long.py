@@ -0,0 +1,60 @@
+"""
+Benchmarks scoring long synthetic transcripts with sia.polarity_scores
+against score_long, printing the worst latency per article and how many
+articles were given different scores. Run with `python3 benchmark_long.py [n_articles]`.
+"""
+
+import random
+import sys
+import time
+
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+from sentiment_analysis import score_long
+
+LENGTHS = [12_000, 20_000, 50_000]
+MODIFIERS = ["but", "not", "never", "very", "extremely", "least", "kind", "of"]
+
+
+def make_transcript(rng: random.Random, lexicon: list[str], n_words: int) -> str:
+    """Returns sentences of filler words with about 8% sentiment-laden words
+    and 2% negations, boosters and "but"."""
+
+    sentences, words = [], 0
+    while words < n_words:
+        sentence = [rng.choice(MODIFIERS) if roll < 0.02 else rng.choice(lexicon)
+                    if roll < 0.1 else f"w{rng.randrange(3000)}"
+                    for roll in (rng.random() for _ in range(rng.randint(6, 25)))]
+        sentences.append(" ".join(sentence) + rng.choice([".", ".", ".", ".", "?", "!"]))
+        words += len(sentence)
+    return " ".join(sentences)
+
+
+def time_scores(score, texts: list[str]) -> tuple[list[tuple], float]:
+    """Returns the scores of each text and the slowest time taken."""
+
+    scores, slowest = [], 0.0
+    for text in texts:
+        start = time.perf_counter()
+        scores.append(score(text))
+        slowest = max(slowest, time.perf_counter() - start)
+    return scores, slowest
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    analyser = SentimentIntensityAnalyzer()
+    lexicon_words = [w for w in analyser.lexicon if w.isalpha()]
+    random_words = random.Random(0)
+
+    print(f"{n} articles per length")
+    for length in LENGTHS:
+        transcripts = [make_transcript(random_words, lexicon_words, length) for _ in range(n)]
+        whole, whole_time = time_scores(
+            lambda text: tuple(analyser.polarity_scores(text).values()), transcripts)
+        per_word, per_word_time = time_scores(
+            lambda text: score_long(analyser, text), transcripts)
+
+        different = sum((w[2], w[0], w[1], w[3]) != p for w, p in zip(whole, per_word))
+        print(f"{length:>6} words  whole {whole_time * 1000:6.0f} ms  "
+              f"score_long {per_word_time * 1000:6.0f} ms  {different} scored differently")
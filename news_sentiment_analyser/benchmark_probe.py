@@ -0,0 +1,83 @@
+"""
+Benchmarks finding which articles of a batch are already stored: the
+previous full scan of every article title, matched in pandas, against
+the indexed probe that sends only the candidate keys.
+
+Needs a Postgres database in the DB_* environment variables. The seeded
+articles go into a temporary `article` table, which hides the real one for
+this session only and is dropped when it ends.
+Run with `python3 benchmark_probe.py [n_seeded] [n_candidates]`.
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+from database_functions import PRESENT_ARTICLES_QUERY
+from db_pool import create_connection
+
+SEED_ARTICLES = """
+    CREATE TEMP TABLE article (
+        article_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        article_title VARCHAR(500) NOT NULL,
+        source_id SMALLINT NOT NULL,
+        date_published DATE NOT NULL,
+        article_url VARCHAR(500) NOT NULL UNIQUE,
+        UNIQUE (article_title, source_id, date_published)
+    );
+    INSERT INTO article (article_title, source_id, date_published, article_url)
+    SELECT 'Seeded headline number ' || i, 1 + i % 2, DATE '2020-01-01' + i % 1500,
+           'https://example.com/articles/' || i
+    FROM generate_series(1, %s) AS i;
+    ANALYZE article;
+"""
+
+
+def make_candidates(n_seeded: int, n_candidates: int) -> pd.DataFrame:
+    """Returns a batch of articles, every other one already seeded."""
+
+    seeded = [i * n_seeded // n_candidates + 1 for i in range(n_candidates)]
+    ids = [i if n % 2 else n_seeded + n + 1 for n, i in enumerate(seeded)]
+    return pd.DataFrame({
+        "title": [f"Seeded headline number {i}" for i in ids],
+        "source_id": [1 + i % 2 for i in ids],
+        "published": [str(pd.Timestamp("2020-01-01") + pd.Timedelta(days=i % 1500))[:10]
+                      for i in ids],
+        "link": [f"https://example.com/articles/{i}" for i in ids]
+    })
+
+
+def scan_titles(cur, articles: pd.DataFrame) -> int:
+    """The previous check: fetch every title, then match in pandas."""
+
+    cur.execute("SELECT article_title FROM article;")
+    titles = [article['article_title'] for article in cur.fetchall()]
+    return int(articles['title'].isin(titles).sum())
+
+
+def probe_keys(cur, articles: pd.DataFrame) -> int:
+    """The indexed probe, sending only the candidate keys."""
+
+    cur.execute(PRESENT_ARTICLES_QUERY,
+                (list(articles['title']), [int(i) for i in articles['source_id']],
+                 list(articles['published']), list(articles['link'])))
+    return len(cur.fetchall())
+
+
+if __name__ == "__main__":
+    n_seed = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_candidate = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    with create_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(SEED_ARTICLES, (n_seed,))
+            candidates = make_candidates(n_seed, n_candidate)
+            print(f"{n_seed} stored articles, {n_candidate} candidates")
+
+            for label, check in [("full title scan", scan_titles),
+                                 ("indexed probe", probe_keys)]:
+                start = time.perf_counter()
+                present = check(cursor, candidates)
+                print(f"{label:<20} {time.perf_counter() - start:6.3f}s, {present} present")
+        conn.rollback()
@@ -0,0 +1,88 @@
+"""
+Benchmarks scoring the titles and content of synthetic articles with the
+previous per-row apply passes against the batch scorer, serially and, given
+more than one worker, across a process pool.
+Run with `python3 benchmark_sentiment.py [n_articles] [content_words] [workers]`.
+"""
+
+import random
+import sys
+import time
+
+import pandas as pd
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+from clean_content import clean_content
+from sentiment_analysis import score_columns
+
+WORDS = ["the", "president", "said", "good", "bad", "war", "peace", "vote",
+         "great", "terrible", "not", "very", "economy", "crisis", "hope",
+         "Fox News", "court", "ruling", "  ", "win", "lose", "protest"]
+
+
+def make_articles(n_articles: int, content_words: int) -> pd.DataFrame:
+    """Returns n_articles articles of random words."""
+
+    rng = random.Random(0)
+    return pd.DataFrame({
+        "title": [" ".join(rng.choices(WORDS, k=12)) for _ in range(n_articles)],
+        "content": [" ".join(rng.choices(WORDS, k=content_words))
+                    for _ in range(n_articles)]
+    })
+
+
+def previous_get_sentiments(sia, df: pd.DataFrame, text_col: str) -> pd.DataFrame:
+    """The previous get_sentiments: two applies, a copy and four more applies."""
+
+    df[text_col] = df[text_col].apply(clean_content)
+    sents = df[text_col].apply(sia.polarity_scores)
+    sentiments = df.copy()
+    sentiments["pos"] = sents.apply(lambda x: x['pos'])
+    sentiments["neg"] = sents.apply(lambda x: x['neg'])
+    sentiments["neut"] = sents.apply(lambda x: x['neu'])
+    sentiments["compound"] = sents.apply(lambda x: x['compound'])
+    return sentiments
+
+
+def previous_polarity_scores(sia, articles: pd.DataFrame) -> pd.DataFrame:
+    """The previous get_polarity_scores, one column after the other."""
+
+    for col in ["title", "content"]:
+        articles = previous_get_sentiments(sia, articles, col)
+        articles = articles.drop(columns=['pos', 'neg', 'neut'])
+        articles = articles.rename(columns={'compound': f'{col}_polarity_score'})
+    return articles
+
+
+def batch_polarity_scores(sia, articles: pd.DataFrame, workers: int = 1) -> pd.DataFrame:
+    """Titles and content scored as one batch."""
+
+    scores = score_columns(sia, articles, ["title", "content"], workers)
+    articles["title_polarity_score"] = scores["title"]["compound"]
+    articles["content_polarity_score"] = scores["content"]["compound"]
+    return articles
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    n_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    analyser = SentimentIntensityAnalyzer()
+
+    print(f"{n} articles of {words} words")
+    strategies = [("per-row apply", previous_polarity_scores),
+                  ("batch", batch_polarity_scores)]
+    if n_workers > 1:
+        strategies.append((f"{n_workers} processes", lambda sia, articles:
+                           batch_polarity_scores(sia, articles, n_workers)))
+
+    results = {}
+    for label, score in strategies:
+        frame = make_articles(n, words)
+        start = time.perf_counter()
+        results[label] = score(analyser, frame)
+        print(f"{label:<15} {time.perf_counter() - start:6.2f}s")
+
+    for label, result in results.items():
+        pd.testing.assert_series_equal(results["per-row apply"]["content_polarity_score"],
+                                       result["content_polarity_score"])
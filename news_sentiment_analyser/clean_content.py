@@ -1,10 +1,13 @@
 """Cleaning HTML content"""
 
 import re
+from functools import lru_cache
 
+import pandas as pd
 from bs4 import BeautifulSoup
 
 STOP_PHRASES = ["fox news", "democracy now", "democracy now!"]
+WHITESPACE = re.compile(r'\s+')
 
 
 def clean_html_tags(html_text: str) -> str:
@@ -21,18 +24,51 @@ def clean_html_tags(html_text: str) -> str:
 
 def clean_multiple_spaces(text: str) -> str:
     """Returns text multiple spaces removed"""
-    return re.sub(r'\s+', ' ', text)
+    return WHITESPACE.sub(' ', text)
+
+
+@lru_cache(maxsize=32)
+def compile_stop_phrases(phrases: tuple[str]) -> re.Pattern:
+    """Returns a case-insensitive pattern matching any of the phrases,
+    tried in the order given"""
+    return re.compile('|'.join(re.escape(phrase) for phrase in phrases), re.IGNORECASE)
 
 
 def remove_stop_phrases(text: str, phrases: list[str]) -> str:
     """Remove any matched stop phrases from the text, ignoring case"""
-    pattern = re.compile('|'.join(re.escape(phrase)
-                         for phrase in phrases), re.IGNORECASE)
-    return pattern.sub('', text)
+    return compile_stop_phrases(tuple(phrases)).sub('', text)
+
+
+def compile_cleaning_pattern(phrases: list[str]) -> re.Pattern:
+    """
+    Returns one pattern for both cleaning steps. Group 1 is a stop phrase,
+    with any run of whitespace allowed between its words, as it would be
+    after collapsing. Otherwise the match is whitespace to collapse: a run of
+    two or more, or a single character that is not a plain space. Single
+    spaces, most of the whitespace in a text, are not matched at all, and a
+    lookahead skips positions that cannot start a match.
+    """
+    stop_phrases = '|'.join(r'\s+'.join(re.escape(word) for word in phrase.split(' '))
+                            for phrase in phrases) or '(?!)'
+    first_chars = re.escape(''.join(sorted({phrase[0] for phrase in phrases})))
+    return re.compile(rf'(?=[{first_chars}\s])(?:({stop_phrases})|\s{{2,}}|[^\S ])',
+                      re.IGNORECASE)
+
+
+CLEANING_PATTERN = compile_cleaning_pattern(STOP_PHRASES)
+
+
+def replace_match(match: re.Match) -> str:
+    """Removes a stop phrase or collapses whitespace to one space."""
+    return '' if match.group(1) is not None else ' '
 
 
 def clean_content(content: str):
     """Cleans HTML content including removal of ads and handling the extra
-    whitespace."""
-    content = clean_multiple_spaces(content)
-    return remove_stop_phrases(content, STOP_PHRASES)
+    whitespace, in one scan of the text."""
+    return CLEANING_PATTERN.sub(replace_match, content)
+
+
+def clean_series(contents: pd.Series) -> pd.Series:
+    """Cleans every text in a series, as clean_content does."""
+    return contents.str.replace(CLEANING_PATTERN, replace_match, regex=True)
@@ -1,60 +1,120 @@
 """Functions that interact with the database"""
 
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from os import environ as ENV
 
-from psycopg2.extras import RealDictCursor
-from psycopg2 import connect
 from psycopg2.extensions import connection
-from dotenv import load_dotenv
 
+from db_pool import get_connection
+
+REFERENCE_TTL = float(ENV.get("REFERENCE_TTL", 0))
+TOPIC_QUERY = """SELECT topic_id, topic_name FROM topic;"""
+SOURCE_QUERY = """SELECT source_name, source_id FROM source;"""
+ADD_TOPIC_QUERY = """
+    INSERT INTO topic (topic_name) VALUES (%s)
+    ON CONFLICT (topic_name) DO UPDATE SET topic_name = EXCLUDED.topic_name
+    RETURNING topic_id;
+"""
+PRESENT_ARTICLES_QUERY = """
+    SELECT candidate.position - 1 AS position
+    FROM unnest(%s::text[], %s::smallint[], %s::text[], %s::text[])
+        WITH ORDINALITY AS candidate(title, source_id, published, url, position)
+    WHERE EXISTS (SELECT 1 FROM article
+                  WHERE article.article_title = candidate.title
+                  AND article.source_id = candidate.source_id
+                  AND article.date_published = candidate.published::date)
+    OR EXISTS (SELECT 1 FROM article WHERE article.article_url = candidate.url);
+"""
+
+
+@contextmanager
+def use_connection(conn: connection = None) -> Iterator[connection]:
+    """Yields conn, so several calls can share one connection and transaction.
+    Without one, borrows a pooled connection that is committed (or rolled back)
+    and returned to the pool afterwards."""
+    if conn is not None:
+        yield conn
+        return
+    with get_connection() as pooled_conn:
+        yield pooled_conn
+
+
+class ReferenceCache:
+    """The rows of small reference tables, read once and reused for ttl
+    seconds, or until invalidated if ttl is 0."""
+
+    def __init__(self, ttl: float = REFERENCE_TTL, clock: Callable = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.tables = {}
+
+    def get(self, table: str, read_table: Callable) -> list[dict]:
+        """Returns the cached rows of a table, reading them with read_table
+        if they are missing or older than the ttl."""
+        loaded_at, rows = self.tables.get(table, (None, None))
+        if rows is None or (self.ttl and self.clock() - loaded_at > self.ttl):
+            rows = read_table()
+            self.tables[table] = (self.clock(), rows)
+        return rows
+
+    def invalidate(self, table: str = None) -> None:
+        """Forgets the rows of a table, or of every table."""
+        if table is None:
+            self.tables.clear()
+        else:
+            self.tables.pop(table, None)
+
+
+REFERENCE_CACHE = ReferenceCache()
+
+
+def read_rows(query: str, conn: connection = None) -> list[dict]:
+    """Returns every row a query selects."""
+    with use_connection(conn) as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(query)
+            return cur.fetchall()
 
-def create_connection() -> connection:
-    """Creates a connection to the RDS with postgres."""
-    load_dotenv()
-    conn = connect(dbname=ENV["DB_NAME"], user=ENV["DB_USER"],
-                   host=ENV["DB_HOST"], password=ENV["DB_PASSWORD"],
-                   port=ENV["DB_PORT"],
-                   cursor_factory=RealDictCursor)
 
-    return conn
+def get_topic_rows(conn: connection = None) -> list[dict]:
+    """Returns the topic table, from the reference cache."""
+    return REFERENCE_CACHE.get("topic", lambda: read_rows(TOPIC_QUERY, conn))
 
 
-def get_topic_names() -> list[str]:
+def get_topic_names(conn: connection = None) -> list[str]:
     """Returns a list of topic names."""
-    with create_connection() as conn:
-        query = """SELECT topic_name FROM topic;"""
-        with conn.cursor() as cur:
-            cur.execute(query)
-            res = cur.fetchall()
-
-    return [topic['topic_name'] for topic in res]
+    return [topic['topic_name'] for topic in get_topic_rows(conn)]
 
 
-def get_topic_dict() -> dict:
+def get_topic_dict(conn: connection = None) -> dict:
     """Returns a dictionary of topic name to its id."""
-    with create_connection() as conn:
-        query = """SELECT * FROM topic;"""
-        with conn.cursor() as cur:
-            cur.execute(query)
-            res = cur.fetchall()
-    return {topic['topic_name']: topic['topic_id'] for topic in res}
+    return {topic['topic_name']: topic['topic_id'] for topic in get_topic_rows(conn)}
 
 
-def get_source_dict() -> dict:
-    """Returns a dictionary of source name  to its id."""
-    with create_connection() as conn:
-        query = """SELECT source_name, source_id FROM source;"""
-        with conn.cursor() as cur:
-            cur.execute(query)
-            res = cur.fetchall()
+def get_source_dict(conn: connection = None) -> dict:
+    """Returns a dictionary of source name  to its id, from the reference cache."""
+    res = REFERENCE_CACHE.get("source", lambda: read_rows(SOURCE_QUERY, conn))
     return {source['source_name']: source['source_id'] for source in res}
 
 
-def get_article_titles() -> list[str]:
+def add_topic(topic_name: str, conn: connection = None) -> int:
+    """Adds a topic, if it is new, and returns its id. The cached topic
+    table is invalidated so the next lookup sees the new topic."""
+    with use_connection(conn) as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(ADD_TOPIC_QUERY, (topic_name,))
+            topic_id = cur.fetchone()['topic_id']
+    REFERENCE_CACHE.invalidate("topic")
+    return topic_id
+
+
+def get_article_titles(conn: connection = None) -> list[str]:
     """Returns a list of article titles."""
-    with create_connection() as conn:
+    with use_connection(conn) as db_conn:
         query = """SELECT article_title FROM article;"""
-        with conn.cursor() as cur:
+        with db_conn.cursor() as cur:
             cur.execute(query)
             res = cur.fetchall()
     if res:
@@ -62,5 +122,31 @@ def get_article_titles() -> list[str]:
     return []
 
 
+def get_present_article_positions(keys: list[tuple],
+                                  conn: connection = None) -> set[int]:
+    """Returns the positions of the candidate (title, source_id, published, url)
+    keys that are already stored, matched on the unique (title, source, date)
+    or URL indexes. Only the candidates are sent, not the whole table."""
+    if not keys:
+        return set()
+    titles, source_ids, dates, urls = (list(column) for column in zip(*keys))
+    with use_connection(conn) as db_conn:
+        with db_conn.cursor() as cur:
+            cur.execute(PRESENT_ARTICLES_QUERY, (titles, source_ids, dates, urls))
+            res = cur.fetchall()
+    return {article['position'] for article in res}
+
+
+def get_article_urls(days: int, conn: connection = None) -> list[str]:
+    """Returns the URLs of the articles published in the last given number of days."""
+    with use_connection(conn) as db_conn:
+        query = """SELECT article_url FROM article
+                   WHERE date_published >= CURRENT_DATE - %s;"""
+        with db_conn.cursor() as cur:
+            cur.execute(query, (days,))
+            res = cur.fetchall()
+    return [article['article_url'] for article in res]
+
+
 if __name__ == "__main__":
     print(get_article_titles())
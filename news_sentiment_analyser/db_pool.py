@@ -0,0 +1,193 @@
+# pylint: disable=R0801
+
+"""
+A process-wide pool of connections to the RDS, shared by every query.
+
+The pool is created on first use and lives as long as the process, so
+later queries reuse an open connection instead of a new TCP and TLS
+handshake. get_connection() lends a connection out for a with block,
+waiting up to DB_POOL_TIMEOUT seconds if all DB_POOL_MAX are in use. The
+block's transaction is committed if it succeeds and rolled back if not, and
+the connection goes back to the pool, or is closed if it broke.
+pool_metrics() reports how the pool has been used.
+
+The RDS can drop idle connections (a restart, a failover or a NAT timeout),
+so connections use TCP keepalives, and one that has sat in the pool for
+DB_POOL_PING_AFTER seconds is checked with a SELECT 1 before it is lent
+out. A dead connection is closed and replaced once.
+"""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from os import environ as ENV
+from threading import BoundedSemaphore, Lock
+
+from dotenv import load_dotenv
+from psycopg2 import connect, extensions, InterfaceError, OperationalError
+from psycopg2.extensions import connection
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+_pool = None  # pylint: disable=invalid-name
+_pool_lock = Lock()
+
+
+def connection_settings() -> dict:
+    """Returns the arguments to connect to the RDS with, from the environment."""
+
+    load_dotenv()
+    return {"dbname": ENV["DB_NAME"], "user": ENV["DB_USER"],
+            "host": ENV["DB_HOST"], "password": ENV["DB_PASSWORD"],
+            "port": ENV["DB_PORT"], "cursor_factory": RealDictCursor,
+            "keepalives": 1, "keepalives_idle": 30,
+            "keepalives_interval": 10, "keepalives_count": 3}
+
+
+def pool_options() -> dict:
+    """Returns the pool's size, timeout and idle ping settings, from the environment."""
+
+    load_dotenv()
+    return {"min_connections": int(ENV.get("DB_POOL_MIN", 1)),
+            "max_connections": int(ENV.get("DB_POOL_MAX", 5)),
+            "timeout": float(ENV.get("DB_POOL_TIMEOUT", 30)),
+            "ping_after": float(ENV.get("DB_POOL_PING_AFTER", 60))}
+
+
+def create_connection() -> connection:
+    """Creates a connection to the RDS with postgres, outside the pool."""
+
+    return connect(**connection_settings())
+
+
+def ping(conn: connection) -> bool:
+    """Returns whether the server still answers on the connection."""
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except (OperationalError, InterfaceError):
+        return False
+
+
+class ConnectionPool:
+    """A thread-safe pool that waits for a free connection rather than
+    failing when every one is lent out, and counts how it is used."""
+
+    def __init__(self, min_connections: int, max_connections: int,
+                 timeout: float, ping_after: float = 60, **settings):
+        self.pool = ThreadedConnectionPool(min_connections, max_connections, **settings)
+        self.slots = BoundedSemaphore(max_connections)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.returned_at = {}
+        self.lock = Lock()
+        self.metrics = {"max_connections": max_connections, "checkouts": 0,
+                        "in_use": 0, "peak_in_use": 0, "wait_seconds": 0.0,
+                        "timeouts": 0, "discarded": 0}
+
+    def count(self, **changes) -> None:
+        """Adds to the metrics, keeping the peak number in use."""
+
+        with self.lock:
+            for name, change in changes.items():
+                self.metrics[name] += change
+            self.metrics["peak_in_use"] = max(self.metrics["peak_in_use"],
+                                              self.metrics["in_use"])
+
+    def checkout(self) -> extensions.connection:
+        """Takes a connection from the pool, replacing it once if it has died.
+        One idle for longer than ping_after is pinged first, as the server
+        may have dropped it meanwhile."""
+
+        conn = self.pool.getconn()
+        returned_at = self.returned_at.get(id(conn))
+        idle = returned_at is not None and time.monotonic() - returned_at >= self.ping_after
+        if not conn.closed and (not idle or ping(conn)):
+            return conn
+        self.returned_at.pop(id(conn), None)
+        self.pool.putconn(conn, close=True)
+        self.count(discarded=1)
+        return self.pool.getconn()
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        """Lends out a connection for the block, as one transaction."""
+
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            self.count(timeouts=1)
+            raise PoolError(f"No database connection free after {self.timeout}s")
+
+        try:
+            conn = self.checkout()
+        except Exception:
+            self.slots.release()
+            raise
+
+        self.count(checkouts=1, in_use=1, wait_seconds=time.perf_counter() - start)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            broken = bool(conn.closed)
+            if broken:
+                self.returned_at.pop(id(conn), None)
+            else:
+                self.returned_at[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=broken)
+            self.slots.release()
+            self.count(in_use=-1, discarded=int(broken))
+
+    def stats(self) -> dict:
+        """Returns a copy of the metrics."""
+
+        with self.lock:
+            return dict(self.metrics)
+
+    def close(self) -> None:
+        """Closes every connection in the pool."""
+
+        self.pool.closeall()
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the process's pool, creating it on first use
+    with the settings in the environment (or .env) at that time."""
+
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(**pool_options(), **connection_settings())
+    return _pool
+
+
+@contextmanager
+def get_connection() -> Iterator[connection]:
+    """Lends out a pooled connection for the block, committing it afterwards
+    (or rolling it back if the block fails)."""
+
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def pool_metrics() -> dict:
+    """Returns the pool's metrics, or an empty dict if it was never used."""
+
+    return _pool.stats() if _pool is not None else {}
+
+
+def close_pool() -> None:
+    """Closes the pool's connections, so the next query starts a new pool."""
+
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -1,34 +1,87 @@
 """Extracts the csv from s3 bucket and returns as dataframe."""
+import json
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from os import environ as ENV
 from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
 from boto3 import client
+from botocore.exceptions import ClientError
 import pandas as pd
 from dotenv import load_dotenv
 
+from handoff import read_articles, ARTICLE_DATA_SUFFIXES
+
+LOOKBACK = timedelta(hours=48)
+DOWNLOAD_WORKERS = 16
+DELETE_BATCH_SIZE = 1000
+CLAIM_PREFIX = "claims/"
+CLAIM_SUFFIX = ".claim"
+CLAIM_TIMEOUT = timedelta(hours=1)
+FAILED_PREFIX = "failed/"
+FAILED_SUFFIX = ".failed"
+MAX_LOAD_ATTEMPTS = int(ENV.get("MAX_LOAD_ATTEMPTS", 3))
+
+
+def get_s3_client() -> client:
+    """Returns a boto3 S3 client."""
+    load_dotenv()
+    return client(service_name="s3",
+                  aws_access_key_id=ENV["AWS_ACCESS_KEY"],
+                  aws_secret_access_key=ENV["AWS_SECRET_KEY"])
+
+
+def list_objects(s3_client: client, bucket_name: str, prefix: str = "",
+                 delimiter: str = None) -> Iterator[dict]:
+    """Yields every object under the prefix, following the pages of the listing.
+    With a delimiter, objects in deeper "folders" are left out."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    options = {"Bucket": bucket_name, "Prefix": prefix}
+    if delimiter:
+        options["Delimiter"] = delimiter
+    for page in paginator.paginate(**options):
+        yield from page.get("Contents", [])
+
+
+def get_day_prefixes(start: datetime, end: datetime) -> list[str]:
+    """Returns the yyyy/mm/dd/ prefixes of the days from start to end."""
+    days = (end.date() - start.date()).days
+    return [(start + timedelta(days=i)).strftime("%Y/%m/%d/") for i in range(days + 1)]
+
 
 def get_object_names(s3_client: client, bucket_name: str) -> list[str]:
-    """Returns a list of object names for a specific bucket, at a specific time."""
-    objects = s3_client.list_objects(Bucket=bucket_name)
+    """Returns a list of object names for a specific bucket, at a specific time.
+    Only the day partitions inside the lookback window are listed, along with
+    the top level of the bucket for batches written before partitioning."""
     now = datetime.now(timezone.utc)
-    one_hour_ago = now - timedelta(hours=48)
+    since = now - LOOKBACK
+
+    objects = list(list_objects(s3_client, bucket_name, delimiter="/"))
+    for prefix in get_day_prefixes(since, now):
+        objects.extend(list_objects(s3_client, bucket_name, prefix))
 
-    object_names = [o["Key"] for o in objects.get(
-        "Contents", []) if o["LastModified"] >= one_hour_ago and o["Key"].endswith(
-            "_article_data.csv")]
+    object_names = [o["Key"] for o in objects
+                    if o["LastModified"] >= since and o["Key"].endswith(
+                        tuple(ARTICLE_DATA_SUFFIXES.values()))]
     if len(object_names) == 0:
         raise ValueError("No csvs in S3 bucket to upload.")
     return object_names
 
 
 def create_dataframe(s3_client: client, bucket_name: str, file_name: str) -> pd.DataFrame:
-    """Returns the object as a dataframe."""
+    """Returns the object as a dataframe, read as Parquet or CSV by its suffix,
+    or None if it downloaded but could not be read."""
     current_bytes = BytesIO()
     s3_client.download_fileobj(
         Bucket=bucket_name, Key=file_name, Fileobj=current_bytes)
     current_bytes.seek(0)
-    current_df = pd.read_csv(current_bytes)
+    try:
+        current_df = read_articles(current_bytes, file_name)
+    except Exception as err:  # pylint: disable=W0718
+        print(f"Could not read {file_name}: {err}")
+        return None
 
     return current_df
 
@@ -40,25 +93,176 @@ def delete_object(s3_client: client, bucket_name: str, file_name: str) -> None:
     )
 
 
-def extract() -> pd.DataFrame:
-    """Extracts the most recent files and returns a dataframe."""
-    load_dotenv()
+def delete_objects(s3_client: client, bucket_name: str, file_names: list[str]) -> None:
+    """Deletes the files from the s3 bucket, up to 1000 per request."""
+    for i in range(0, len(file_names), DELETE_BATCH_SIZE):
+        batch = file_names[i:i + DELETE_BATCH_SIZE]
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={"Objects": [{"Key": name} for name in batch], "Quiet": True})
+        for error in response.get("Errors", []):
+            print(f"Could not delete {error['Key']}: {error.get('Message')}")
+
+
+def claim_name(file_name: str) -> str:
+    """Returns the key of the marker claiming the batch. It sits outside the
+    listed partitions and its suffix does not match the upload event rule."""
+    return f"{CLAIM_PREFIX}{file_name}{CLAIM_SUFFIX}"
+
+
+def is_taken(err: ClientError) -> bool:
+    """Returns whether a conditional write failed because the key was written first."""
+    return err.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict")
+
+
+def claim_body(run_id: str, attempts: int) -> str:
+    """Returns the contents of a claim marker: the run holding the batch
+    (None once released) and how many times loading it has failed."""
+    return json.dumps({"run_id": run_id, "attempts": attempts})
+
+
+def read_claim(s3_client: client, bucket_name: str, file_name: str) -> dict:
+    """Returns the batch's claim marker, with its ETag and LastModified,
+    or None if it has none."""
+    try:
+        claim = s3_client.get_object(Bucket=bucket_name, Key=claim_name(file_name))
+    except ClientError:
+        return None
+    return {**json.loads(claim["Body"].read()), "ETag": claim["ETag"],
+            "LastModified": claim["LastModified"]}
+
+
+def claim_object(s3_client: client, bucket_name: str, file_name: str, run_id: str) -> bool:
+    """Claims the batch for this run, returning whether it got it.
+    The marker is only written if it does not exist yet, so of two runs
+    listing the same batch only one claims it. A released claim, or one older
+    than CLAIM_TIMEOUT (left by a run that died), is taken over, keeping its
+    count of failed loads."""
+    claim_key = claim_name(file_name)
+    try:
+        s3_client.put_object(Bucket=bucket_name, Key=claim_key, Body=claim_body(run_id, 0),
+                             IfNoneMatch="*")
+    except ClientError as err:
+        if not is_taken(err):
+            raise
+        claim = read_claim(s3_client, bucket_name, file_name)
+        if claim is None or (claim["run_id"] is not None and claim["LastModified"]
+                             > datetime.now(timezone.utc) - CLAIM_TIMEOUT):
+            return False
+        try:
+            s3_client.put_object(Bucket=bucket_name, Key=claim_key,
+                                 Body=claim_body(run_id, claim["attempts"]),
+                                 IfMatch=claim["ETag"])
+        except ClientError as retake_err:
+            if not is_taken(retake_err):
+                raise
+            return False
+
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=file_name)
+    except ClientError:
+        # Another run loaded and deleted the batch after it was listed.
+        delete_object(s3_client, bucket_name, claim_key)
+        return False
+    return True
+
+
+def claim_objects(s3_client: client, bucket_name: str, file_names: list[str],
+                  max_workers: int = DOWNLOAD_WORKERS) -> list[str]:
+    """Claims the batches concurrently, returning those this run got, in order."""
+    run_id = uuid4().hex
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        claimed = list(executor.map(
+            lambda name: claim_object(s3_client, bucket_name, name, run_id), file_names))
+    return [name for name, got in zip(file_names, claimed) if got]
+
+
+def quarantine_object(s3_client: client, bucket_name: str, file_name: str) -> None:
+    """Moves a batch that cannot be read or loaded under FAILED_PREFIX, with a
+    suffix that does not match the upload event rule, and drops its claim."""
+    s3_client.copy_object(Bucket=bucket_name, Key=f"{FAILED_PREFIX}{file_name}{FAILED_SUFFIX}",
+                          CopySource={"Bucket": bucket_name, "Key": file_name})
+    delete_objects(s3_client, bucket_name, [file_name, claim_name(file_name)])
+    print(f"Moved {file_name} to {FAILED_PREFIX}")
+
+
+def release_claim(s3_client: client, bucket_name: str, file_name: str,
+                  failed_load: bool = False) -> None:
+    """Releases the claim on the batch so the next run can take it, keeping its
+    count of failed loads, plus one if failed_load. A batch whose load has
+    failed MAX_LOAD_ATTEMPTS times is quarantined instead."""
+    claim = read_claim(s3_client, bucket_name, file_name)
+    attempts = (claim["attempts"] if claim else 0) + failed_load
+    if attempts >= MAX_LOAD_ATTEMPTS:
+        quarantine_object(s3_client, bucket_name, file_name)
+        return
+    s3_client.put_object(Bucket=bucket_name, Key=claim_name(file_name),
+                         Body=claim_body(None, attempts))
+
+
+def release_claims(s3_client: client, bucket_name: str, file_names: list[str],
+                   failed_load: bool = False) -> None:
+    """Releases the claims on the batches concurrently."""
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        list(executor.map(lambda name: release_claim(s3_client, bucket_name, name, failed_load),
+                          file_names))
+
+
+def download_dataframes(s3_client: client, bucket_name: str, file_names: list[str],
+                        max_workers: int = DOWNLOAD_WORKERS) -> list[pd.DataFrame]:
+    """Downloads the files concurrently, returning their dataframes in the order
+    of file_names, with None for any that could not be read."""
+    all_dfs = [None] * len(file_names)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(create_dataframe, s3_client, bucket_name, name): i
+                   for i, name in enumerate(file_names)}
+        for future in as_completed(futures):
+            all_dfs[futures[future]] = future.result()
+
+    return all_dfs
+
+
+def extract() -> dict[str, pd.DataFrame]:
+    """Claims and extracts the most recent files, returning the dataframe of each
+    by its name. The files should be deleted once their articles are loaded (or
+    released if they are not). Files claimed by another run are skipped, and
+    files that cannot be read are quarantined."""
+    s3 = get_s3_client()
     bucket_name = ENV['BUCKET_NAME']
-    s3 = client(service_name="s3",
-                aws_access_key_id=ENV["AWS_ACCESS_KEY"],
-                aws_secret_access_key=ENV["AWS_SECRET_KEY"])
 
-    names = get_object_names(s3, bucket_name)
-    all_dfs = []
-    for name in names:
-        all_dfs.append(create_dataframe(s3, bucket_name, name))
-        delete_object(s3, bucket_name, name)
-    if len(all_dfs) == 0:
-        raise ValueError("No dataframes where found.")
-    final_df = pd.concat(all_dfs, ignore_index=True)
+    names = claim_objects(s3, bucket_name, get_object_names(s3, bucket_name))
+    if len(names) == 0:
+        raise ValueError("No dataframes where found, or all are claimed by another run.")
+    try:
+        all_dfs = download_dataframes(s3, bucket_name, names)
+    except Exception:
+        release_claims(s3, bucket_name, names)
+        raise
+
+    for name, df in zip(names, all_dfs):
+        if df is None:
+            quarantine_object(s3, bucket_name, name)
+    batches = {name: df for name, df in zip(names, all_dfs) if df is not None}
+    if len(batches) == 0:
+        raise ValueError("None of the claimed files could be read.")
+
+    return batches
+
+
+def delete_extracted(file_names: list[str]) -> None:
+    """Deletes the extracted files from the s3 bucket, then their claims."""
+    s3 = get_s3_client()
+    delete_objects(s3, ENV['BUCKET_NAME'], file_names)
+    delete_objects(s3, ENV['BUCKET_NAME'], [claim_name(name) for name in file_names])
+    print(f"Deleted {len(file_names)} extracted files.")
+
 
-    return final_df
+def release_extracted(file_names: list[str], failed_load: bool = False) -> None:
+    """Releases the claims on files that were not loaded, so the next run retries
+    them. With failed_load, the failure is counted against each file."""
+    release_claims(get_s3_client(), ENV['BUCKET_NAME'], file_names, failed_load)
+    print(f"Released {len(file_names)} claimed files.")
 
 
 if __name__ == "__main__":
-    print(extract())
+    print(pd.concat(extract().values(), ignore_index=True))
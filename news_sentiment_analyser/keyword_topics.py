@@ -0,0 +1,87 @@
+"""
+Assigns topics to titles that clearly name them, without asking the model.
+
+Each topic in the topic table matches its own name and, for the topics we
+know, a curated list of aliases. Aliases are kept to words that name the
+topic whatever else the title says, so surnames, place names and words like
+"election" or "flood" that other stories use are left to the model. Every
+alias is compiled into one case-insensitive, whole-word pattern, so a title
+is scanned once. Titles with no match are left for the model.
+"""
+
+import re
+
+TOPIC_ALIASES = {
+    "Donald Trump": ["trump"],
+    "Kamala Harris": ["kamala"],
+    "2024 Presidential Election": ["electoral college", "swing state", "swing states",
+                                   "presidential race", "presidential debate",
+                                   "presidential election", "early voting"],
+    "Climate Change": ["climate", "global warming", "greenhouse gas", "emissions",
+                       "fossil fuel", "fossil fuels", "net zero", "cop29"],
+    "Natural Disaster": ["hurricane", "hurricanes", "earthquake", "wildfire", "wildfires",
+                         "tornado", "tornadoes", "tsunami", "landslide"],
+    "Abortion": ["abortion", "abortions", "roe v. wade", "pro-life", "pro-choice",
+                 "reproductive rights", "planned parenthood"],
+    "Crime and Law Enforcement": ["police", "murder", "murdered", "homicide", "arrested",
+                                  "fbi", "crime", "crimes", "criminal", "sentenced",
+                                  "convicted", "indicted"],
+    "Guns": ["gun", "guns", "firearm", "firearms", "rifle", "second amendment", "nra",
+             "gunman", "mass shooting"],
+    "Israel-Palestine": ["gaza", "israel", "israeli", "israelis", "palestine",
+                         "palestinian", "palestinians", "hamas", "west bank", "netanyahu"]
+}
+
+
+def normalise_alias(alias: str) -> str:
+    """Returns the alias lower-cased with single spaces, as matches are looked up."""
+
+    return " ".join(alias.lower().split())
+
+
+def build_alias_topics(topics: list[str], aliases: dict = None) -> dict[str, list[str]]:
+    """Returns each alias of the given topics, and each topic name,
+    mapped to the topics it stands for."""
+
+    aliases = TOPIC_ALIASES if aliases is None else aliases
+    alias_topics = {}
+    for topic in topics:
+        for alias in [topic, *aliases.get(topic, [])]:
+            topic_list = alias_topics.setdefault(normalise_alias(alias), [])
+            if topic not in topic_list:
+                topic_list.append(topic)
+    return alias_topics
+
+
+def compile_aliases(aliases: list[str]) -> re.Pattern:
+    """Returns a case-insensitive pattern matching any alias as whole words,
+    preferring the longest alias at each position."""
+
+    alternatives = "|".join(r"\s+".join(map(re.escape, alias.split()))
+                            for alias in sorted(aliases, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)", re.IGNORECASE)
+
+
+class KeywordClassifier:
+    """Matches titles against the aliases of a topic list."""
+
+    def __init__(self, topics: list[str], aliases: dict = None):
+        self.alias_topics = build_alias_topics(topics, aliases)
+        self.pattern = compile_aliases(list(self.alias_topics))
+
+    def classify(self, title: str) -> list[str]:
+        """Returns the topics named in the title, in the order they first
+        appear, or an empty list if it names none."""
+
+        topics = []
+        for match in self.pattern.finditer(title):
+            for topic in self.alias_topics[normalise_alias(match.group())]:
+                if topic not in topics:
+                    topics.append(topic)
+        return topics
+
+    def classify_all(self, titles: list[str]) -> dict[str, list[str]]:
+        """Returns the topics of each title that names at least one."""
+
+        matches = ((title, self.classify(title)) for title in titles)
+        return {title: topics for title, topics in matches if topics}
@@ -1,61 +1,156 @@
 """A script to load the dataframe into the database."""
 
+import io
 from datetime import datetime
+from os import environ as ENV
 
 import pandas as pd
+from psycopg2.extensions import connection, cursor
 from psycopg2.extras import execute_values
 
-from database_functions import create_connection, get_topic_dict
-
-
-def load(articles: pd.DataFrame) -> None:
-    """Loads all the articles and article_topic_assignment into the RDS tables."""
+from database_functions import use_connection, get_topic_dict
+
+ARTICLE_COLUMNS = ['title', 'content', 'title_polarity_score', 'content_polarity_score',
+                   'source_id', 'published', 'link']
+COPY_MIN_ROWS = int(ENV.get("COPY_MIN_ROWS", 1000))
+COPY_CHUNK_ROWS = 500
+VALUES_PAGE_SIZE = 500
+
+UPSERT_ARTICLES_QUERY = """
+    WITH candidate AS ({candidates}),
+    inserted AS (
+        INSERT INTO article (
+            article_title, article_content, title_polarity_score, content_polarity_score,
+            source_id, date_published, article_url
+        )
+        SELECT article_title, article_content, title_polarity_score, content_polarity_score,
+            source_id, date_published, article_url
+        FROM candidate
+        ON CONFLICT (article_title, source_id, date_published) DO NOTHING
+        RETURNING article_id, article_title, source_id, date_published
+    )
+    SELECT candidate.position, COALESCE(inserted.article_id, article.article_id) AS article_id
+    FROM candidate
+    LEFT JOIN inserted
+        ON inserted.article_title = candidate.article_title
+        AND inserted.source_id = candidate.source_id
+        AND inserted.date_published = candidate.date_published
+    LEFT JOIN article
+        ON article.article_title = candidate.article_title
+        AND article.source_id = candidate.source_id
+        AND article.date_published = candidate.date_published;
+"""
+CANDIDATE_COLUMNS = """position, article_title, article_content, title_polarity_score,
+    content_polarity_score, source_id, date_published, article_url"""
+ARTICLE_INSERT_QUERY = UPSERT_ARTICLES_QUERY.format(
+    candidates=f"SELECT * FROM (VALUES %s) AS values_list({CANDIDATE_COLUMNS})")
+ARTICLE_INSERT_TEMPLATE = "(%s, %s, %s, %s::float, %s::float, %s::smallint, %s::date, %s)"
+CREATE_STAGING_QUERY = """
+    CREATE TEMP TABLE article_staging (
+        position INT,
+        article_title TEXT,
+        article_content TEXT,
+        title_polarity_score FLOAT,
+        content_polarity_score FLOAT,
+        source_id SMALLINT,
+        date_published DATE,
+        article_url TEXT
+    ) ON COMMIT DROP;
+"""
+COPY_STAGING_QUERY = """
+    COPY article_staging FROM STDIN
+    WITH (FORMAT csv, FORCE_NOT_NULL (article_title, article_content, article_url));
+"""
+MERGE_STAGING_QUERY = UPSERT_ARTICLES_QUERY.format(
+    candidates=f"SELECT {CANDIDATE_COLUMNS} FROM article_staging")
+
+
+def load(articles: pd.DataFrame, conn: connection = None) -> None:
+    """Loads all the articles and article_topic_assignment into the RDS tables
+    in one transaction, so articles are never committed without their topics."""
     if not articles.empty:
-        article_id_dict = insert_into_articles(articles)
-        processed_df = process_df_for_assignment_insert(
-            articles, article_id_dict)
-        insert_into_assignment(processed_df)
-
-
-def insert_into_articles(articles: pd.DataFrame) -> dict:
-    """Bulk inserts the articles into the article table 
-    and returns  dictionary of article title to id."""
-    article_df = articles[['title', 'content', 'title_polarity_score',
-                           'content_polarity_score',
-                           'source_id', 'published', 'link']]
-    params = [tuple(x) for x in article_df.values]
-    article_insert_query = """
-    INSERT INTO article (
-        article_title, article_content, title_polarity_score, content_polarity_score, 
-        source_id, date_published, article_url
-    ) VALUES %s
-    ON CONFLICT (article_title, source_id, date_published) DO NOTHING
-    RETURNING article_id, article_title;
-    """
-    with create_connection() as conn:
-        with conn.cursor() as cur:
-            execute_values(cur, article_insert_query, params)
-            inserted_ids = cur.fetchall()
-        conn.commit()
-    article_id_dict = {row['article_title']: row['article_id']
-                       for row in inserted_ids}
-
-    return article_id_dict
-
-
-def process_df_for_assignment_insert(articles: pd.DataFrame, article_id_dict: dict) -> pd.DataFrame:
-    """Processes the dataframe to be inserted into the article_topic_assignment table."""
-    topic_dict = get_topic_dict()
-    article_df = articles[['topics', 'title']]
+        with use_connection(conn) as db_conn:
+            with db_conn:
+                article_ids = insert_into_articles(articles, db_conn)
+                processed_df = process_df_for_assignment_insert(
+                    articles, article_ids, db_conn)
+                insert_into_assignment(processed_df, db_conn)
+
+
+def insert_into_articles(articles: pd.DataFrame, conn: connection = None) -> dict:
+    """Bulk inserts the articles into the article table and returns a dictionary
+    of each row's position to its article_id, whether it was inserted now or
+    already stored under the same (title, source_id, date_published).
+    Batches of COPY_MIN_ROWS or more are streamed in with COPY."""
+    article_df = articles[ARTICLE_COLUMNS]
+    with use_connection(conn) as db_conn:
+        with db_conn.cursor() as cur:
+            if len(article_df) >= COPY_MIN_ROWS:
+                resolved_ids = copy_into_articles(cur, article_df)
+            else:
+                params = [(position, *row) for position, row
+                          in enumerate(article_df.itertuples(index=False))]
+                resolved_ids = execute_values(cur, ARTICLE_INSERT_QUERY, params,
+                                              template=ARTICLE_INSERT_TEMPLATE,
+                                              page_size=VALUES_PAGE_SIZE, fetch=True)
+    article_ids = {row['position']: row['article_id']
+                   for row in resolved_ids if row['article_id'] is not None}
+
+    return article_ids
+
+
+class CsvStream(io.TextIOBase):
+    """A read-only file of a dataframe's rows as CSV, rendered a chunk of
+    rows at a time so COPY never needs the whole batch as one string."""
+
+    def __init__(self, df: pd.DataFrame, chunk_rows: int = COPY_CHUNK_ROWS):
+        super().__init__()
+        self.chunks = (df.iloc[start:start + chunk_rows].to_csv(header=False, index=False)
+                       for start in range(0, len(df), chunk_rows))
+        self.chunk = io.StringIO()
+
+    def read(self, size: int = -1) -> str:
+        """Returns up to size characters, or an empty string once every row is read."""
+        data = self.chunk.read(size)
+        while not data:
+            csv_rows = next(self.chunks, None)
+            if csv_rows is None:
+                return ""
+            self.chunk = io.StringIO(csv_rows)
+            data = self.chunk.read(size)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+
+def copy_into_articles(cur: cursor, article_df: pd.DataFrame) -> list[dict]:
+    """Streams the articles into a staging table with COPY, then merges them
+    into the article table. Returns the position and article_id of each row."""
+    cur.execute(CREATE_STAGING_QUERY)
+    rows = article_df.astype({'source_id': 'Int64'})
+    rows.insert(0, 'position', range(len(rows)))
+    cur.copy_expert(COPY_STAGING_QUERY, CsvStream(rows))
+    cur.execute(MERGE_STAGING_QUERY)
+    return cur.fetchall()
+
+
+def process_df_for_assignment_insert(articles: pd.DataFrame, article_ids: dict,
+                                     conn: connection = None) -> pd.DataFrame:
+    """Processes the dataframe to be inserted into the article_topic_assignment table,
+    taking each row's article_id from its position. Articles with no topics,
+    unknown topics or no article_id have no rows."""
+    topic_dict = get_topic_dict(conn)
+    article_df = articles[['topics']].reset_index(drop=True)
+    article_df['article_id'] = article_df.index.map(article_ids)
     article_df = article_df.explode('topics')
     article_df['topic_id'] = article_df['topics'].map(topic_dict)
-    article_df['article_id'] = article_df['title'].map(article_id_dict)
-    article_df = article_df[['topic_id', 'article_id']]
+    article_df = article_df[['topic_id', 'article_id']].dropna()
 
     return article_df
 
 
-def insert_into_assignment(articles: pd.DataFrame) -> None:
+def insert_into_assignment(articles: pd.DataFrame, conn: connection = None) -> None:
     """Bulk inserts the article-topic into the article_topic_assignment table."""
     params = articles.to_numpy().tolist()
     params = [(int(topic_id), int(article_id))
@@ -64,10 +159,9 @@ def insert_into_assignment(articles: pd.DataFrame) -> None:
     INSERT INTO article_topic_assignment (topic_id, article_id) VALUES %s
     ON CONFLICT (topic_id, article_id) DO NOTHING;
     """
-    with create_connection() as conn:
-        with conn.cursor() as cur:
+    with use_connection(conn) as db_conn:
+        with db_conn.cursor() as cur:
             execute_values(cur, assignment_insert_query, params)
-        conn.commit()
 
 
 if __name__ == "__main__":
@@ -1,93 +1,401 @@
 """Script to find the topics of an article using openai."""
 
 from os import environ as ENV
+import asyncio
+from collections import deque
+from collections.abc import Iterator
 import json
+import random
+import re
+import time
 
-from openai import OpenAI, OpenAIError
+from openai import AsyncOpenAI, OpenAIError, RateLimitError
 from dotenv import load_dotenv
 import pandas as pd
 
 from database_functions import get_topic_names
+from keyword_topics import KeywordClassifier
+from topic_cache import load_topic_cache, save_topic_cache
+
+TOPIC_MODEL = "gpt-4o-mini"
+KEYWORD_TOPICS = ENV.get("KEYWORD_TOPICS", "false").lower() == "true"
+TOPIC_CONCURRENCY = int(ENV.get("TOPIC_CONCURRENCY", 4))
+TOPIC_REQUESTS_PER_MINUTE = int(ENV.get("TOPIC_REQUESTS_PER_MINUTE", 300))
+INITIAL_BATCH_SIZE = 15
+MAX_BATCH_SIZE = 60
+TARGET_LATENCY = 20
+COMPLETION_TOKEN_BUDGET = 4000
+MAX_ATTEMPTS = 3
+RATE_LIMIT_BACKOFF = 2
+DECODER = json.JSONDecoder()
+ITEM_SEPARATORS = re.compile(r"[\s,]*")
+RESULTS_KEY = re.compile(r'"results"\s*:\s*\[')
+
+
+class TopicResponseError(ValueError):
+    """Raised when no topics could be read from a response."""
 
 
 def add_topics_to_dataframe(articles: pd.DataFrame) -> pd.DataFrame:
-    """Returns the dataframe with a topics column added.
-    Currently chuncking is set to 3 titles, but will be increased.
-    May change title to article_title - check with others."""
+    """Returns the dataframe with topics and topic_origin columns added.
+    With KEYWORD_TOPICS set to true, titles naming a topic are classified by
+    keyword, and only get the topics they name. The rest are classified in
+    concurrent batches by classify_titles.
+    With TOPIC_CACHE_KEY set, only titles missing from the topic cache in S3 are sent."""
     if 'title' not in articles.columns:
         raise ValueError("DataFrame must contain a 'title' column")
     if articles.empty:
         raise ValueError("DataFrame is empty")
     load_dotenv()
-    ai = OpenAI(api_key=ENV["OPENAI_API_KEY"])
-    titles = articles['title'].tolist()
+    titles = list(dict.fromkeys(articles['title']))
     topic_test = get_topic_names()
+    cache_key = ENV.get("TOPIC_CACHE_KEY")
+    cache = load_topic_cache(cache_key) if cache_key else None
+
     combined_topic_dict = {}
-    for batch in chunk_list(titles, 15):
-        batch_topic_dict = find_article_topics(batch, topic_test, ai)
-        combined_topic_dict.update(batch_topic_dict)
+    if KEYWORD_TOPICS:
+        combined_topic_dict = KeywordClassifier(topic_test).classify_all(titles)
+    topic_origins = {title: "keyword" for title in combined_topic_dict}
+
+    if cache is not None:
+        for title in titles:
+            cached_topics = (None if title in combined_topic_dict
+                             else cache.get(title, topic_test))
+            if cached_topics is not None:
+                combined_topic_dict[title] = cached_topics
+
+    missing_titles = [title for title in titles if title not in combined_topic_dict]
+    if missing_titles:
+        ai = AsyncOpenAI(api_key=ENV["OPENAI_API_KEY"], max_retries=0)
+        classified = asyncio.run(classify_titles(missing_titles, topic_test, ai))
+        for title in missing_titles:
+            if title in classified and cache is not None:
+                cache.put(title, classified[title], topic_test)
+            combined_topic_dict[title] = classified.get(title, [])
+
+    if cache is not None:
+        if cache.changed:
+            save_topic_cache(cache, cache_key)
+        print(f"Topic cache: {cache.stats()}")
+
+    print(f"Topics: {len(topic_origins)} titles by keyword, "
+          f"{len(titles) - len(topic_origins)} by the model "
+          f"({len(missing_titles)} sent, the rest cached)")
+    for title in titles:
+        topic_origins.setdefault(title, "llm")
+
     articles['topics'] = articles['title'].map(combined_topic_dict)
+    articles['topic_origin'] = articles['title'].map(topic_origins)
     df_filtered = articles[articles['topics'].apply(
         lambda x: isinstance(x, list) and len(x) > 0)]
 
     return df_filtered
 
 
-def chunk_list(lst: list, chunk_size: int):
-    """Chunks the list of titles into batches."""
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i + chunk_size]
+def build_messages(article_titles: list[str], topics: list[str]) -> list[dict]:
+    """Returns the chat messages asking for the topics of the titles,
+    numbered by their position in the batch."""
+    return [
+        {
+            "role": "system",
+            "content": create_message(topics)
+        },
+        {
+            "role": "user",
+            "content": "\n".join(f"{i}. {title}" for i, title in enumerate(article_titles)),
+        }]
 
 
-def find_article_topics(article_titles: list[str], topics: list[str],
-                        openai_client: OpenAI) -> dict:
-    """Returns a dictionary of article title to topics associated with each article title."""
-    titles = "\n".join(article_titles)
-    system_content = create_message(topics)
-    try:
-        response = openai_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_content
-                },
-                {
-                    "role": "user",
-                    "content": titles,
-                }],
-            model="gpt-4o-mini",
-        )
-    except OpenAIError as e:
-        print(f"OpenAI API error: {e}")
-        return {title: [] for title in article_titles}
-    except Exception as e:  # pylint: disable=W0718
-        print(f"Unexpected error: {e}")
-        return {title: [] for title in article_titles}
+def build_response_format(topics: list[str]) -> dict:
+    """Returns the structured output schema: a results array of
+    {"index", "topics"} items, with topics drawn from the topic list."""
+    topic_schema = {"type": "string", "enum": topics} if topics else {"type": "string"}
+    item_schema = {
+        "type": "object",
+        "properties": {"index": {"type": "integer"},
+                       "topics": {"type": "array", "items": topic_schema}},
+        "required": ["index", "topics"],
+        "additionalProperties": False
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "article_topics",
+            "strict": True,
+            "schema": {"type": "object",
+                       "properties": {"results": {"type": "array", "items": item_schema}},
+                       "required": ["results"],
+                       "additionalProperties": False}
+        }
+    }
+
+
+def iter_array_items(content: str, pos: int) -> Iterator:
+    """Yields each complete value of the JSON array whose items start at pos,
+    stopping at the end of the array or at the first incomplete value."""
+    while True:
+        pos = ITEM_SEPARATORS.match(content, pos).end()
+        if pos >= len(content) or content[pos] == "]":
+            return
+        try:
+            item, pos = DECODER.raw_decode(content, pos)
+        except json.JSONDecodeError:
+            return
+        yield item
+
+
+def iter_topic_items(content: str) -> Iterator:
+    """Yields the items of a topic response: a results object, a bare array
+    or a single item, with any text or code fence around it ignored. Items
+    before the cut are still yielded if the response was truncated."""
+    starts = [i for i in (content.find("["), content.find("{")) if i >= 0]
+    if not starts:
+        return
+    start = min(starts)
+    if content[start] == "[":
+        yield from iter_array_items(content, start + 1)
+        return
+
     try:
-        raw_response = response.choices[0].message.content
-        raw_response = raw_response.replace("'", '"')
-        if raw_response.startswith("```json"):
-            cleaned_response = raw_response.strip("```json").strip()
+        value, _ = DECODER.raw_decode(content, start)
+    except json.JSONDecodeError:
+        results = RESULTS_KEY.search(content, start)
+        if results:
+            yield from iter_array_items(content, results.end())
+        return
+
+    if isinstance(value.get("results"), list):
+        yield from value["results"]
+    else:
+        yield value
+
+
+def parse_topic_response(response, article_titles: list[str]) -> dict:
+    """Returns the title to topics dictionary in a chat completion, mapping
+    each item back to its title by index, or by exact title if it has none.
+    Raises if no item could be read."""
+    content = response.choices[0].message.content or ""
+    title_topics = {}
+    for item in iter_topic_items(content):
+        if not isinstance(item, dict) or not isinstance(item.get("topics"), list):
+            continue
+        index = item.get("index")
+        if type(index) is int and 0 <= index < len(article_titles):  # pylint: disable=C0123
+            title_topics[article_titles[index]] = item["topics"]
+        elif item.get("title") in article_titles:
+            title_topics[item["title"]] = item["topics"]
+
+    if not title_topics:
+        raise TopicResponseError(f"No topics in the response: {content[:100]!r}")
+    return title_topics
+
+
+def is_truncated(response) -> bool:
+    """Returns whether the model stopped at its token limit."""
+    return response.choices[0].finish_reason == "length"
+
+
+class BatchSizer:
+    """Chooses how many titles to send per request. The size grows while
+    full batches come back within the target latency, shrinks when they are
+    slow or fail, and is capped so the expected response fits the token budget."""
+
+    def __init__(self, size: int = INITIAL_BATCH_SIZE, max_size: int = MAX_BATCH_SIZE,
+                 target_latency: float = TARGET_LATENCY,
+                 token_budget: int = COMPLETION_TOKEN_BUDGET):
+        self.size = size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.token_budget = token_budget
+        self.tokens_per_title = None
+
+    def record_success(self, n_titles: int, latency: float, completion_tokens: int) -> None:
+        """Adapts the size to a batch that came back."""
+        if completion_tokens:
+            per_title = completion_tokens / n_titles
+            self.tokens_per_title = (per_title if self.tokens_per_title is None
+                                     else 0.8 * self.tokens_per_title + 0.2 * per_title)
+
+        if latency > self.target_latency:
+            self.size = max(1, self.size * 3 // 4)
+        elif n_titles >= self.size:
+            self.size = min(self.max_size, self.size + max(1, self.size // 4))
+
+        if self.tokens_per_title:
+            self.size = max(1, min(self.size, int(self.token_budget / self.tokens_per_title)))
+
+    def record_failure(self) -> None:
+        """Halves the size after a batch failed or was cut off."""
+        self.size = max(1, self.size // 2)
+
+
+class RateLimiter:
+    """Allows up to concurrency requests in flight, spaces out their starts to
+    stay under a rate per minute, and holds them back after a rate limit response."""
+
+    def __init__(self, per_minute: int = TOPIC_REQUESTS_PER_MINUTE,
+                 concurrency: int = TOPIC_CONCURRENCY):
+        self.interval = 60 / per_minute
+        self.concurrency = max(1, concurrency)
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        """Waits until the next request may start."""
+        async with self.lock:
+            delay = self.next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_start = max(time.monotonic(), self.next_start) + self.interval
+
+    def pause(self, seconds: float) -> None:
+        """Holds back every request for the given number of seconds."""
+        self.next_start = max(self.next_start, time.monotonic() + seconds)
+
+
+def retry_after(error: RateLimitError, attempt: int) -> float:
+    """Returns how long the API asked us to wait, or a jittered backoff."""
+    headers = error.response.headers
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after", "").isdigit():
+        return float(headers["retry-after"])
+    return random.uniform(0, RATE_LIMIT_BACKOFF * 2 ** attempt)
+
+
+class TitleQueue:
+    """Hands out batches of titles at the sizer's current size, retries first,
+    and takes back titles to retry. Idle workers wait while any request is in
+    flight, since a failed request gives its titles back."""
+
+    def __init__(self, titles: list[str], sizer: BatchSizer):
+        self.pending = deque(titles)
+        self.retries = deque()
+        self.sizer = sizer
+        self.in_flight = 0
+        self.changed = asyncio.Condition()
+
+    async def take(self) -> tuple[list[str], int]:
+        """Waits for titles to send, returning them with their attempt number,
+        or None once none are left and no request in flight could give any back."""
+        async with self.changed:
+            await self.changed.wait_for(
+                lambda: self.pending or self.retries or not self.in_flight)
+            if not (self.pending or self.retries):
+                return None
+            self.in_flight += 1
+            if self.retries:
+                return self.retries.popleft()
+            size = min(self.sizer.size, len(self.pending))
+            return [self.pending.popleft() for _ in range(size)], 0
+
+    async def done(self) -> None:
+        """Marks a request taken from the queue as finished."""
+        async with self.changed:
+            self.in_flight -= 1
+            self.changed.notify_all()
+
+    def retry(self, batch: list[str], attempt: int) -> None:
+        """Queues the batch to be sent again."""
+        self.retries.append((batch, attempt))
+
+    def retry_split(self, batch: list[str], attempt: int) -> None:
+        """Queues each half of the batch to be sent again, or a single title
+        for another attempt, until it has failed MAX_ATTEMPTS times."""
+        if len(batch) > 1:
+            middle = len(batch) // 2
+            self.retries.extend([(batch[:middle], attempt), (batch[middle:], attempt)])
+        elif attempt + 1 < MAX_ATTEMPTS:
+            self.retries.append((batch, attempt + 1))
         else:
-            cleaned_response = raw_response
-        list_response = json.loads(cleaned_response)
+            print(f"Giving up on the topics of: {batch[0]}")
+
 
-    except (json.JSONDecodeError, KeyError, IndexError) as e:
-        print(f"Error processing API response: {e}")
-        return {title: [] for title in article_titles}
+async def request_article_topics_async(article_titles: list[str], topics: list[str],
+                                       openai_client: AsyncOpenAI) -> tuple[dict, int, bool]:
+    """Returns the title to topics dictionary for a batch, the number of
+    completion tokens used and whether the response was cut off, raising
+    if the request fails or no topics could be read."""
+    response = await openai_client.chat.completions.create(
+        messages=build_messages(article_titles, topics),
+        model=TOPIC_MODEL,
+        response_format=build_response_format(topics),
+    )
+    usage = getattr(response, "usage", None)
+    return (parse_topic_response(response, article_titles),
+            getattr(usage, "completion_tokens", 0), is_truncated(response))
+
+
+async def classify_titles(titles: list[str], topics: list[str], openai_client: AsyncOpenAI,
+                          limiter: RateLimiter = None, sizer: BatchSizer = None) -> dict:
+    """
+    Returns the topics of each title that was classified, in the order of
+    titles, keeping up to the limiter's concurrency batch requests in flight.
+
+    Batches are cut from the remaining titles at the size the sizer currently
+    chooses. A batch rejected by the rate limit is sent again after a pause.
+    Any other failure, or a response missing some titles (such as one cut
+    off at the token limit), splits the titles left over in two and retries
+    each half, until a single title has failed MAX_ATTEMPTS times and is left out.
+    Idle workers wait on the TitleQueue while any request is in flight, so the
+    halves of a split batch are sent concurrently even once every title has been sent.
+    """
+    limiter = limiter or RateLimiter()
+    sizer = sizer or BatchSizer()
+    queue = TitleQueue(titles, sizer)
+    results = {}
+
+    async def send(batch: list[str], attempt: int) -> None:
+        await limiter.wait()
+        start = time.monotonic()
+        try:
+            title_topics, tokens, truncated = await request_article_topics_async(
+                batch, topics, openai_client)
+        except RateLimitError as e:
+            limiter.pause(retry_after(e, attempt))
+            sizer.record_failure()
+            if attempt + 1 < MAX_ATTEMPTS:
+                queue.retry(batch, attempt + 1)
+            else:
+                queue.retry_split(batch, attempt)
+            return
+        except (OpenAIError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"Topic request for {len(batch)} titles failed: {e}")
+            sizer.record_failure()
+            queue.retry_split(batch, attempt)
+            return
+
+        if truncated:
+            sizer.record_failure()
+        else:
+            sizer.record_success(len(batch), time.monotonic() - start, tokens)
+        returned = [title for title in batch if title in title_topics]
+        for title in returned:
+            results[title] = title_topics[title]
+        if len(returned) < len(batch):
+            queue.retry_split([title for title in batch if title not in title_topics], attempt)
 
-    if isinstance(list_response, list):
-        return {item['title']: item['topics'] for item in list_response}
+    async def worker() -> None:
+        while True:
+            taken = await queue.take()
+            if taken is None:
+                return
+            try:
+                await send(*taken)
+            finally:
+                await queue.done()
 
-    return {list_response['title']: list_response['topics']}
+    await asyncio.gather(*(worker() for _ in range(limiter.concurrency)))
+    return {title: results[title] for title in titles if title in results}
 
 
 def create_message(topics: list[str]) -> str:
     """Creates the message to be sent to the openAI, as the system content."""
     content_topics = ", ".join(topics)
-    message = f"""Your job is to return a object with the structure
-    'title': title, 'topics': list of topics (or empty list if none),
-    for each article title, in a list. The topics are: {content_topics}"""
+    message = f"""Each line of the user message is an article title, numbered
+    from 0. Return a JSON object {{"results": [...]}} with one item
+    {{"index": number of the title, "topics": list of topics (or empty list if none)}}
+    for each title, in order. The topics are: {content_topics}"""
 
     return message
 
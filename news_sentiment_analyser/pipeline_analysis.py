@@ -1,21 +1,67 @@
 """The full pipeline for extracting articles, analysing them and uploading them to s3."""
 
-from extract_s3 import extract
+import pandas as pd
+
+from database_functions import use_connection
+from db_pool import pool_metrics
+from extract_s3 import extract, delete_extracted, release_extracted
 from transform_articles import transform
 from load_rds import load
+from seen_urls import refresh_seen_urls
+
+
+def transform_and_load(articles: pd.DataFrame) -> None:
+    """Transforms and loads the articles on one database connection,
+    in one transaction."""
+    with use_connection() as conn:
+        articles = transform(articles, conn)
+        print("Articles transformed.")
+        load(articles, conn)
+        print("Articles inserted.")
+
+
+def load_one_at_a_time(batches: dict[str, pd.DataFrame]) -> None:
+    """Loads each batch on its own, so one that cannot be loaded does not hold
+    back the rest. Loaded batches are deleted. The others are released with
+    the failure counted against them, unless none loaded, which points to an
+    outage rather than bad batches."""
+    failed = []
+    for name, articles in batches.items():
+        try:
+            transform_and_load(articles)
+            delete_extracted([name])
+        except Exception as err:  # pylint: disable=W0718
+            print(f"Could not load {name}: {err}")
+            failed.append(name)
+
+    if failed:
+        release_extracted(failed, failed_load=len(failed) < len(batches))
 
 
 def pipeline() -> None:
-    """The full elt pipeline."""
+    """The full elt pipeline. The extracted files are claimed so a run started
+    by a parallel upload skips them, and only deleted once their articles are
+    loaded. The batches are loaded together, and if that fails, one at a time.
+    A run that fails before they are handled releases them for the next one."""
+    batches = {}
     try:
-        articles = extract()
+        batches = extract()
         print("Articles extracted!")
-        articles = transform(articles)
-        print("Articles transformed.")
-        load(articles)
-        print("Articles inserted.")
+        try:
+            transform_and_load(pd.concat(batches.values(), ignore_index=True))
+            delete_extracted(list(batches))
+        except Exception as err:  # pylint: disable=W0718
+            if len(batches) == 1:
+                raise
+            print(f"Loading the batches together failed ({err}), loading them one at a time")
+            load_one_at_a_time(batches)
+        batches = {}
+        print(f"Database pool: {pool_metrics()}")
+        refresh_seen_urls()
     except Exception as err:  # pylint: disable=W0718
         print(f"Error occurred: {err}")
+        if batches:
+            release_extracted(list(batches))
 
 
 if __name__ == "__main__":
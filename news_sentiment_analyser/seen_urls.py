@@ -0,0 +1,34 @@
+"""Publishes the ledger of stored article URLs that the scrapers check
+before fetching an article body.
+
+The scrapers only look at recent stories (Democracy Now! within 3 days, and
+the Fox feeds list recent items), so the ledger only holds the articles
+published in the last SEEN_URL_DAYS days."""
+
+import gzip
+from os import environ as ENV
+
+from extract_s3 import get_s3_client
+from database_functions import get_article_urls
+
+SEEN_URLS_KEY = "seen_article_urls.txt.gz"
+SEEN_URL_DAYS = int(ENV.get("SEEN_URL_DAYS", 14))
+
+
+def build_seen_urls_ledger(urls: list[str]) -> bytes:
+    """Returns the sorted, de-duplicated URLs as gzipped newline-separated text."""
+    return gzip.compress("\n".join(sorted(set(urls))).encode("utf-8"))
+
+
+def refresh_seen_urls() -> None:
+    """Rebuilds the ledger from the recent article.article_url values and
+    uploads it next to the CSVs."""
+    urls = get_article_urls(SEEN_URL_DAYS)
+    s3 = get_s3_client()
+    s3.put_object(Bucket=ENV['BUCKET_NAME'], Key=SEEN_URLS_KEY,
+                  Body=build_seen_urls_ledger(urls))
+    print(f"Seen-URL ledger refreshed with {len(urls)} URLs.")
+
+
+if __name__ == "__main__":
+    refresh_seen_urls()
@@ -1,36 +1,247 @@
 """Methods for analysing sentiment of content."""
 
+import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import environ as ENV
+
+import numpy as np
 import pandas as pd
 import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from nltk.sentiment.vader import SentimentIntensityAnalyzer, SentiText
 
-from clean_content import clean_content
+from clean_content import clean_series
+from sentiment_cache import SentimentCache, VADER_VERSION
 
 nltk.download('vader_lexicon')
 
+SENTIMENT_DTYPE = np.dtype([("pos", "f8"), ("neg", "f8"),
+                            ("neut", "f8"), ("compound", "f8")])
+SENTIMENT_WORKERS = int(ENV.get("SENTIMENT_WORKERS", 1))
+PARALLEL_MIN_CHARS = int(ENV.get("PARALLEL_MIN_CHARS", 1_000_000))
+SHARDS_PER_WORKER = 4
+LONG_TEXT_WORDS = int(ENV.get("LONG_TEXT_WORDS", 10_000))
+# Long texts get exactly VADER's scores, so the version is VADER's own
+SCORER_VERSION = VADER_VERSION
+VADER_ALPHA = 15
+BEFORE_BUT, AFTER_BUT = 0.5, 1.5
+EXCLAMATION_EMPHASIS, MAX_EXCLAMATIONS = 0.292, 4
+QUESTION_EMPHASIS, MAX_QUESTION_EMPHASIS = 0.18, 0.96
 
-def get_sentiments(sia, df: pd.DataFrame, text_col: str) -> pd.DataFrame:
-    """Get sentiment data for a given text column.
-    Returns a dataframe containing:
-    text column, topic column and sentiments (pos,neg,neut,compound)."""
+_worker_sia = None  # pylint: disable=C0103
+
+
+def count_words(text: str) -> int:
+    """Returns the number of words in a cleaned (single-spaced) text."""
+
+    return text.count(" ") + 1 if text else 0
+
+
+def to_compound(valence: float) -> float:
+    """Normalises a raw valence sum into a compound score, as VADER does."""
+
+    return valence / math.sqrt(valence * valence + VADER_ALPHA)
+
+
+def punctuation_emphasis(text: str) -> float:
+    """Returns the valence VADER adds for the exclamation and question marks of a text."""
+
+    questions = text.count("?")
+    question_emphasis = (0.0 if questions < 2 else questions * QUESTION_EMPHASIS
+                         if questions <= 3 else MAX_QUESTION_EMPHASIS)
+    return min(text.count("!"), MAX_EXCLAMATIONS) * EXCLAMATION_EMPHASIS + question_emphasis
+
+
+def weigh_words(words: list[str]) -> tuple[dict, dict, dict]:
+    """Returns where each word is first used, how often it is used, and its
+    total weight under VADER's "but" rule, which halves the words before the
+    first "but" of a text and adds half to the words after it."""
+
+    lowered = [word.lower() for word in words]
+    but = lowered.index("but") if "but" in lowered else None
+    first_use, uses, weights = {}, {}, {}
+    for i, word in enumerate(words):
+        first_use.setdefault(word, i)
+        uses[word] = uses.get(word, 0) + 1
+        weights[word] = weights.get(word, 0.0) + (
+            1.0 if but is None or i == but else BEFORE_BUT if i < but else AFTER_BUT)
+
+    return first_use, uses, weights
+
+
+def word_valence(sia, sentitext: SentiText, word: str, i: int) -> float:
+    """Returns VADER's valence for the word at position i of the text,
+    skipping boosters and "kind of" as VADER does."""
+
+    words = sentitext.words_and_emoticons
+    lowered = word.lower()
+    if lowered in sia.constants.BOOSTER_DICT or (
+            lowered == "kind" and i < len(words) - 1 and words[i + 1].lower() == "of"):
+        return 0.0
+    return sia.sentiment_valence(0, sentitext, word, i, [])[0]
+
+
+def score_long(sia, text: str) -> tuple:
+    """
+    Returns the (pos, neg, neut, compound) scores VADER gives a long text,
+    working out each distinct word's valence once rather than once per use.
+
+    VADER scores every use of a word in the context of its first use in the
+    text, so a word's valence is the same wherever it appears, and only the
+    "but" rule changes its weight. The valences are added up with those
+    weights, and the punctuation emphasis and proportions are then worked
+    out as VADER does, giving the same scores as sia.polarity_scores(text).
+    """
+
+    sentitext = SentiText(text, sia.constants.PUNC_LIST,
+                          sia.constants.REGEX_REMOVE_PUNCTUATION)
+    if not sentitext.words_and_emoticons:
+        return 0.0, 0.0, 0.0, 0.0
+
+    first_use, uses, weights = weigh_words(sentitext.words_and_emoticons)
+    valence, pos_sum, neg_sum, neutral = 0.0, 0.0, 0.0, 0
+    for word, i in first_use.items():
+        word_sum = word_valence(sia, sentitext, word, i) * weights[word]
+        valence += word_sum
+        if word_sum > 0:
+            pos_sum += word_sum + uses[word]
+        elif word_sum < 0:
+            neg_sum += word_sum - uses[word]
+        else:
+            neutral += uses[word]
+
+    emphasis = punctuation_emphasis(text)
+    valence += math.copysign(emphasis, valence) if valence else 0.0
+    if pos_sum > -neg_sum:
+        pos_sum += emphasis
+    elif pos_sum < -neg_sum:
+        neg_sum -= emphasis
+    total = pos_sum - neg_sum + neutral
+    return (round(pos_sum / total, 3), round(-neg_sum / total, 3),
+            round(neutral / total, 3), round(to_compound(valence), 4))
+
+
+def score_text(sia, text: str) -> tuple:
+    """Returns the (pos, neg, neut, compound) scores of a text, scoring
+    texts of more than LONG_TEXT_WORDS words with score_long."""
+
+    if count_words(text) > LONG_TEXT_WORDS:
+        return score_long(sia, text)
+
+    scores = sia.polarity_scores(text)
+    return scores["pos"], scores["neg"], scores["neu"], scores["compound"]
+
+
+def score_texts(sia, texts: list[str]) -> np.ndarray:
+    """Scores every text in one pass, returning a structured array
+    with a (pos, neg, neut, compound) row per text."""
+
+    return np.fromiter(map(partial(score_text, sia), texts),
+                       dtype=SENTIMENT_DTYPE, count=len(texts))
+
+
+def init_worker() -> None:
+    """Builds the analyser of a worker process once."""
+
+    global _worker_sia  # pylint: disable=W0603
+    _worker_sia = SentimentIntensityAnalyzer()
+
+
+def score_shard(texts: list[str]) -> np.ndarray:
+    """Scores a shard of texts with the worker's analyser."""
+
+    return score_texts(_worker_sia, texts)
+
+
+def score_texts_parallel(texts: list[str], workers: int) -> np.ndarray:
+    """Scores the texts across a pool of worker processes,
+    returning the scores in the order of the texts."""
+
+    shard_size = max(1, -(-len(texts) // (workers * SHARDS_PER_WORKER)))
+    shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        return np.concatenate(list(executor.map(score_shard, shards)))
+
+
+def should_score_in_parallel(texts: list[str], workers: int) -> bool:
+    """Returns whether the texts are enough work to be worth starting worker processes."""
+
+    return workers > 1 and sum(map(len, texts)) >= PARALLEL_MIN_CHARS
+
+
+def score_batch(sia, texts: list[str], workers: int) -> np.ndarray:
+    """Scores the texts serially, or across worker processes if it is worth it."""
+
+    if should_score_in_parallel(texts, workers):
+        return score_texts_parallel(texts, workers)
+    return score_texts(sia, texts)
+
+
+def score_with_cache(sia, texts: list[str], workers: int,
+                     cache: SentimentCache) -> np.ndarray:
+    """Scores the texts, only running the analyser on distinct texts
+    that are not already in the cache, and caches their scores."""
+
+    scores = np.empty(len(texts), dtype=SENTIMENT_DTYPE)
+    missing = {}
+    for i, text in enumerate(texts):
+        cached = cache.get(text)
+        if cached is None:
+            missing.setdefault(text, []).append(i)
+        else:
+            scores[i] = cached
+
+    new_texts = list(missing)
+    for text, text_scores in zip(new_texts, score_batch(sia, new_texts, workers)):
+        cache.put(text, text_scores.tolist())
+        scores[missing[text]] = text_scores
+
+    return scores
+
+
+def clean_text_column(df: pd.DataFrame, text_col: str) -> list[str]:
+    """Cleans a text column in place, returning the cleaned texts."""
 
     if not pd.api.types.is_string_dtype(df[text_col]):
         raise TypeError("The text column must contain strings.")
 
-    df[text_col] = df[text_col].apply(
-        lambda x: clean_content(x))  # pylint: disable=W0108
+    cleaned = clean_series(df[text_col])
+    df[text_col] = cleaned
+    return cleaned.tolist()
+
+
+def score_columns(sia, df: pd.DataFrame, text_cols: list[str],
+                  workers: int = None, cache: SentimentCache = None) -> dict[str, np.ndarray]:
+    """Cleans each text column in place and scores all of them as one batch.
+    Large batches are spread over worker processes when workers (by default
+    SENTIMENT_WORKERS) is more than one. Texts in the cache are not rescored.
+    Returns the structured array of scores for each column."""
+
+    texts = []
+    for text_col in text_cols:
+        texts.extend(clean_text_column(df, text_col))
 
-    sents = df[text_col].apply(
-        lambda x: sia.polarity_scores(x))  # pylint: disable=W0108
+    workers = SENTIMENT_WORKERS if workers is None else workers
+    if cache is None:
+        scores = score_batch(sia, texts, workers)
+    else:
+        scores = score_with_cache(sia, texts, workers, cache)
+    n_rows = len(df)
+    return {text_col: scores[i * n_rows:(i + 1) * n_rows]
+            for i, text_col in enumerate(text_cols)}
 
-    sentiments = df.copy()
 
-    sentiments["pos"] = sents.apply(lambda x: x['pos'])
-    sentiments["neg"] = sents.apply(lambda x: x['neg'])
-    sentiments["neut"] = sents.apply(lambda x: x['neu'])
-    sentiments["compound"] = sents.apply(lambda x: x['compound'])
+def get_sentiments(sia, df: pd.DataFrame, text_col: str) -> pd.DataFrame:
+    """Get sentiment data for a given text column.
+    Returns the dataframe with the text column cleaned and
+    sentiments (pos,neg,neut,compound) added, without copying it."""
+
+    scores = score_columns(sia, df, [text_col])[text_col]
+    for name in SENTIMENT_DTYPE.names:
+        df[name] = scores[name]
 
-    return sentiments
+    return df
 
 
 def get_avg_sentiment(sentiments: pd.DataFrame, topic_col: str, source_col: str) -> pd.DataFrame:
@@ -0,0 +1,112 @@
+"""
+A least-recently-used cache of sentiment scores, so text that was already
+scored (repeated headlines, boilerplate paragraphs, re-processed backlogs)
+is not scored again.
+
+Entries are keyed by a hash of the cleaned text and the scorer version, so
+changing the scorer never returns stale scores. The cache is saved to S3 as
+gzipped JSON, so it outlives the task.
+"""
+
+import gzip
+import json
+from collections import OrderedDict
+from hashlib import sha256
+from os import environ as ENV
+
+import nltk
+from botocore.exceptions import ClientError
+
+from extract_s3 import get_s3_client
+
+VADER_VERSION = f"vader/nltk-{nltk.__version__}"
+SENTIMENT_CACHE_SIZE = int(ENV.get("SENTIMENT_CACHE_SIZE", 100_000))
+
+
+class SentimentCache:
+    """Scores of up to max_size texts, evicting the least recently used."""
+
+    def __init__(self, max_size: int = SENTIMENT_CACHE_SIZE,
+                 version: str = VADER_VERSION):
+        self.max_size = max_size
+        self.version = version
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def key(self, text: str) -> str:
+        """Returns the cache key of a text."""
+
+        return sha256(f"{self.version}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> tuple:
+        """Returns the cached scores of a text, or None."""
+
+        key = self.key(text)
+        scores = self.entries.get(key)
+        if scores is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return scores
+
+    def put(self, text: str, scores: tuple) -> None:
+        """Caches the scores of a text, evicting the least recently used if full."""
+
+        key = self.key(text)
+        self.entries[key] = tuple(scores)
+        self.entries.move_to_end(key)
+        self.changed = True
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> str:
+        """Returns the hit and miss counts."""
+
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0
+        return (f"{self.hits} hits, {self.misses} misses ({hit_rate:.0%}), "
+                f"{len(self)} entries")
+
+    def to_bytes(self) -> bytes:
+        """Returns the entries, least recently used first, as gzipped JSON."""
+
+        return gzip.compress(json.dumps({"version": self.version,
+                                         "entries": list(self.entries.items())}).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, body: bytes, max_size: int = SENTIMENT_CACHE_SIZE,
+                   version: str = VADER_VERSION) -> "SentimentCache":
+        """Returns the cache saved by to_bytes, or an empty cache if it was
+        made by another scorer version."""
+
+        cache = cls(max_size, version)
+        saved = json.loads(gzip.decompress(body))
+        if saved.get("version") == version:
+            for key, scores in saved["entries"][-max_size:]:
+                cache.entries[key] = tuple(scores)
+        return cache
+
+
+def load_sentiment_cache(key: str, version: str = VADER_VERSION) -> SentimentCache:
+    """Returns the cache saved at key in the bucket, or an empty cache if there is none."""
+
+    try:
+        response = get_s3_client().get_object(Bucket=ENV['BUCKET_NAME'], Key=key)
+        return SentimentCache.from_bytes(response["Body"].read(), version=version)
+
+    except (ClientError, OSError, json.JSONDecodeError, KeyError) as e:
+        print(f"No sentiment cache at {key}, starting empty: {e}")
+        return SentimentCache(version=version)
+
+
+def save_sentiment_cache(cache: SentimentCache, key: str) -> None:
+    """Saves the cache at key in the bucket."""
+
+    get_s3_client().put_object(Bucket=ENV['BUCKET_NAME'], Key=key, Body=cache.to_bytes())
@@ -2,8 +2,12 @@
 
 """Tests the content cleaning methods"""
 
+import random
+
+import pandas as pd
 import pytest
-from clean_content import clean_html_tags, clean_multiple_spaces, clean_content, remove_stop_phrases
+from clean_content import (clean_html_tags, clean_multiple_spaces, clean_content,
+                           remove_stop_phrases, clean_series, STOP_PHRASES)
 
 
 def test_clean_content():
@@ -48,3 +52,40 @@ def test_clean_multiple_spaces(html, expected):
 ])
 def test_case_insensitivity(text, phrases, expected):
     assert remove_stop_phrases(text, phrases) == expected
+
+
+def reference_clean_content(content: str) -> str:
+    """The previous clean_content: collapse whitespace, then remove stop phrases"""
+    return remove_stop_phrases(clean_multiple_spaces(content), STOP_PHRASES)
+
+
+@pytest.mark.parametrize("text", [
+    "", " ", "   ", "\n", "\t \n", "a\nb", "a  \t b",
+    "Fox News", "FOX\n\nnews reports", "fox  news", "foxnews", "fox news news",
+    "Democracy Now!", "democracy now!!", "DEMOCRACY   NOW! and Fox News.",
+    "  democracy \t now  ", "fox democracy now news", "a fox news b",
+    "démocratie  fox news", "fox news "
+])
+def test_clean_content_matches_previous_functions(text):
+    '''Tests that the one-scan cleaner gives the same text as the two passes'''
+    assert clean_content(text) == reference_clean_content(text)
+
+
+def test_clean_content_matches_previous_functions_on_random_text():
+    rng = random.Random(0)
+    pieces = ["fox", "Fox", "NEWS", "news", "democracy", "Democracy", "now",
+              "now!", "NOW!", "a", "b.", "!", " ", "  ", "\n", "\t", " "]
+
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) + rng.choice(["", " ", "  ", "\n"])
+                       for _ in range(rng.randint(0, 20)))
+        assert clean_content(text) == reference_clean_content(text), repr(text)
+
+
+def test_clean_series_matches_clean_content():
+    texts = pd.Series(["Fox News  says", "", "democracy\nnow! today", "plain"])
+
+    cleaned = clean_series(texts)
+
+    assert cleaned.tolist() == [clean_content(text) for text in texts]
+    assert cleaned.index.equals(texts.index)
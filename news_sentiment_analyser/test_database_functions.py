@@ -4,42 +4,25 @@
 
 from unittest.mock import patch, MagicMock
 
-from psycopg2.extensions import connection
-
-from database_functions import create_connection, get_topic_names, RealDictCursor, get_topic_dict, get_source_dict, get_article_titles
-
-
-@patch('database_functions.connect')
-@patch('database_functions.ENV', {
-    "DB_NAME": "test_db",
-    "DB_USER": "test_user",
-    "DB_HOST": "test_host",
-    "DB_PASSWORD": "test_password",
-    "DB_PORT": "5432"
-})
-def test_create_connection(fake_connect):
-    """Tests the create_connection function."""
-    fake_conn = MagicMock(spec=connection)
-    fake_connect.return_value = fake_conn
-    conn = create_connection()
-
-    fake_connect.assert_called_once_with(
-        dbname="test_db",
-        user="test_user",
-        host="test_host",
-        password="test_password",
-        port="5432",
-        cursor_factory=RealDictCursor
-    )
-    assert conn == fake_conn
-
-
-@patch('database_functions.create_connection')
-def test_get_topic_names(fake_create_connection):
+import pytest
+
+from database_functions import REFERENCE_CACHE, ReferenceCache, add_topic, get_topic_names, get_topic_dict, get_source_dict, get_article_titles, get_article_urls, get_present_article_positions, PRESENT_ARTICLES_QUERY, use_connection
+
+
+@pytest.fixture(autouse=True)
+def empty_reference_cache():
+    """Starts every test without cached topics or sources."""
+    REFERENCE_CACHE.invalidate()
+    yield
+    REFERENCE_CACHE.invalidate()
+
+
+@patch('database_functions.get_connection')
+def test_get_topic_names(fake_get_connection):
     """Tests the get_topic_names function."""
     fake_conn = MagicMock()
     fake_cursor = MagicMock()
-    fake_create_connection.return_value.__enter__.return_value = fake_conn
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
     fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
     fake_cursor.fetchall.return_value = [
         {"topic_name": "Dogs"},
@@ -48,17 +31,17 @@ def test_get_topic_names(fake_create_connection):
     result = get_topic_names()
 
     fake_cursor.execute.assert_called_once_with(
-        "SELECT topic_name FROM topic;")
+        "SELECT topic_id, topic_name FROM topic;")
 
     assert result == ["Dogs", "Cats"]
 
 
-@patch('database_functions.create_connection')
-def test_get_topic_dict(fake_create_connection):
+@patch('database_functions.get_connection')
+def test_get_topic_dict(fake_get_connection):
     """Tests the get_topic_dict function."""
     fake_conn = MagicMock()
     fake_cursor = MagicMock()
-    fake_create_connection.return_value.__enter__.return_value = fake_conn
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
     fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
     fake_cursor.fetchall.return_value = [
         {"topic_name": "Dogs", "topic_id": 1},
@@ -67,17 +50,17 @@ def test_get_topic_dict(fake_create_connection):
     result = get_topic_dict()
 
     fake_cursor.execute.assert_called_once_with(
-        "SELECT * FROM topic;")
+        "SELECT topic_id, topic_name FROM topic;")
 
     assert result == {"Dogs": 1, "Cats": 2}
 
 
-@patch('database_functions.create_connection')
-def test_get_source_dict(fake_create_connection):
+@patch('database_functions.get_connection')
+def test_get_source_dict(fake_get_connection):
     """Tests the get_source_dict function."""
     fake_conn = MagicMock()
     fake_cursor = MagicMock()
-    fake_create_connection.return_value.__enter__.return_value = fake_conn
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
     fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
     fake_cursor.fetchall.return_value = [
         {"source_name": "The Sun", "source_id": 77},
@@ -91,12 +74,12 @@ def test_get_source_dict(fake_create_connection):
     assert result == {"The Sun": 77, "The Moon": 22}
 
 
-@patch('database_functions.create_connection')
-def test_get_article_titles(fake_create_connection):
+@patch('database_functions.get_connection')
+def test_get_article_titles(fake_get_connection):
     """Tests the get_article_titles function."""
     fake_conn = MagicMock()
     fake_cursor = MagicMock()
-    fake_create_connection.return_value.__enter__.return_value = fake_conn
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
     fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
     fake_cursor.fetchall.return_value = [
         {"article_title": "Dogs"},
@@ -108,3 +91,164 @@ def test_get_article_titles(fake_create_connection):
         "SELECT article_title FROM article;")
 
     assert result == ["Dogs", "Cats"]
+
+
+@patch('database_functions.get_connection')
+def test_get_article_urls(fake_get_connection):
+    """Tests the get_article_urls function."""
+    fake_conn = MagicMock()
+    fake_cursor = MagicMock()
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
+    fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
+    fake_cursor.fetchall.return_value = [
+        {"article_url": "http://dogs.com"},
+        {"article_url": "http://cats.com"}
+    ]
+    result = get_article_urls(14)
+
+    query, params = fake_cursor.execute.call_args.args
+    assert "WHERE date_published >= CURRENT_DATE - %s" in query
+    assert params == (14,)
+
+    assert result == ["http://dogs.com", "http://cats.com"]
+
+
+@patch('database_functions.get_connection')
+def test_get_present_article_positions(fake_get_connection):
+    """Tests that only the candidate keys are sent, as one array per column."""
+    fake_conn = MagicMock()
+    fake_cursor = MagicMock()
+    fake_get_connection.return_value.__enter__.return_value = fake_conn
+    fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
+    fake_cursor.fetchall.return_value = [{"position": 1}]
+    result = get_present_article_positions([
+        ("Dogs", 1, "2024-01-01", "https://a.com/dogs"),
+        ("Cats", None, "2024-01-02", "https://b.com/cats")
+    ])
+
+    fake_cursor.execute.assert_called_once_with(
+        PRESENT_ARTICLES_QUERY,
+        (["Dogs", "Cats"], [1, None], ["2024-01-01", "2024-01-02"],
+         ["https://a.com/dogs", "https://b.com/cats"]))
+
+    assert result == {1}
+
+
+@patch('database_functions.get_connection')
+def test_get_present_article_positions_no_keys(fake_get_connection):
+    """Tests that no query is made without candidates."""
+    assert get_present_article_positions([]) == set()
+    fake_get_connection.assert_not_called()
+
+
+@patch('database_functions.get_connection')
+def test_use_connection_borrows_pooled_connection(fake_get_connection):
+    """Tests that without a connection, one is borrowed from the pool for the block."""
+    fake_conn = fake_get_connection.return_value.__enter__.return_value
+    with use_connection() as conn:
+        assert conn is fake_conn
+
+    fake_get_connection.assert_called_once_with()
+    fake_get_connection.return_value.__exit__.assert_called_once_with(None, None, None)
+
+
+@patch('database_functions.get_connection')
+def test_use_connection_passes_errors_to_pool(fake_get_connection):
+    """Tests that a failing block reaches the pool, so it can roll back."""
+    fake_get_connection.return_value.__exit__.return_value = False
+    try:
+        with use_connection():
+            raise ValueError("failed")
+    except ValueError:
+        pass
+
+    assert fake_get_connection.return_value.__exit__.call_args.args[0] is ValueError
+
+
+@patch('database_functions.get_connection')
+def test_use_connection_shares_given_connection(fake_get_connection):
+    """Tests that a given connection is yielded as it is, and left open."""
+    fake_conn = MagicMock()
+    with use_connection(fake_conn) as conn:
+        assert conn is fake_conn
+
+    fake_get_connection.assert_not_called()
+    fake_conn.__exit__.assert_not_called()
+    fake_conn.close.assert_not_called()
+
+
+@patch('database_functions.get_connection')
+def test_lookups_share_a_given_connection(fake_get_connection):
+    """Tests that lookups given a connection use it instead of opening one."""
+    fake_conn = MagicMock()
+    fake_cursor = fake_conn.cursor.return_value.__enter__.return_value
+    fake_cursor.fetchall.return_value = [{"source_name": "The Sun", "source_id": 77}]
+
+    assert get_source_dict(fake_conn) == {"The Sun": 77}
+    fake_get_connection.assert_not_called()
+
+
+@patch('database_functions.get_connection')
+def test_topic_and_source_lookups_are_cached(fake_get_connection):
+    """Tests that the topic and source tables are each read once, whichever lookups use them."""
+    fake_cursor = fake_get_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+    fake_cursor.fetchall.side_effect = [
+        [{"topic_name": "Dogs", "topic_id": 1}],
+        [{"source_name": "The Sun", "source_id": 77}]
+    ]
+
+    assert get_topic_names() == ["Dogs"]
+    assert get_topic_dict() == {"Dogs": 1}
+    assert get_source_dict() == {"The Sun": 77}
+    assert get_source_dict() == {"The Sun": 77}
+    assert fake_cursor.execute.call_count == 2
+
+
+@patch('database_functions.get_connection')
+def test_add_topic_invalidates_cached_topics(fake_get_connection):
+    """Tests that adding a topic makes the next lookup read the topic table again."""
+    fake_cursor = fake_get_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+    fake_cursor.fetchall.side_effect = [
+        [{"topic_name": "Dogs", "topic_id": 1}],
+        [{"topic_name": "Dogs", "topic_id": 1}, {"topic_name": "Cats", "topic_id": 2}]
+    ]
+    fake_cursor.fetchone.return_value = {"topic_id": 2}
+
+    assert get_topic_dict() == {"Dogs": 1}
+    assert add_topic("Cats") == 2
+    assert get_topic_dict() == {"Dogs": 1, "Cats": 2}
+    assert fake_cursor.execute.call_args_list[1].args[1] == ("Cats",)
+
+
+def test_reference_cache_ttl():
+    """Tests that rows are read again once they are older than the ttl, and never without one."""
+    now = [0]
+    reads = []
+
+    def read_rows():
+        reads.append(now[0])
+        return [{"now": now[0]}]
+
+    cache = ReferenceCache(ttl=60, clock=lambda: now[0])
+    forever = ReferenceCache(ttl=0, clock=lambda: now[0])
+    for now[0] in [0, 30, 60, 61, 100]:
+        cache.get("topic", read_rows)
+    assert reads == [0, 61]
+
+    reads.clear()
+    for now[0] in [0, 10_000]:
+        forever.get("topic", read_rows)
+    assert reads == [0]
+
+
+def test_reference_cache_invalidate():
+    """Tests that invalidating one table keeps the others."""
+    cache = ReferenceCache()
+    cache.get("topic", lambda: [1])
+    cache.get("source", lambda: [2])
+    cache.invalidate("topic")
+
+    assert cache.get("topic", lambda: [3]) == [3]
+    assert cache.get("source", lambda: [4]) == [2]
+    cache.invalidate()
+    assert cache.get("source", lambda: [5]) == [5]
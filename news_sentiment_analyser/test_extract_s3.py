@@ -1,11 +1,25 @@
 """Tests for the extract_s3.py file."""
+import json
 from datetime import datetime, timedelta, timezone
 import unittest
 from unittest.mock import patch
 
 import pandas as pd
 
-from extract_s3 import get_object_names, create_dataframe, delete_object, extract
+import boto3
+from moto import mock_aws
+
+from extract_s3 import (get_object_names, create_dataframe, delete_object, extract,
+                        delete_objects, delete_extracted, get_day_prefixes, list_objects,
+                        claim_object, release_extracted)
+from handoff import serialise_articles
+
+
+def set_root_listing(fake_s3_client, page: dict) -> None:
+    """Makes the paginated listing return page for the top level of the bucket
+    and nothing for the day partitions."""
+    fake_s3_client.get_paginator.return_value.paginate.side_effect = lambda **kwargs: (
+        [page] if kwargs["Prefix"] == "" else [{}])
 
 
 class TestGetObjectNames(unittest.TestCase):
@@ -14,7 +28,7 @@ class TestGetObjectNames(unittest.TestCase):
     @patch('extract_s3.client')
     def test_get_object_names_one_correct_time(self, fake_s3_client):
         """Testing only within the last hour."""
-        fake_s3_client.list_objects.return_value = {
+        set_root_listing(fake_s3_client, {
             "Contents": [
                 {
                     "Key": "correct_article_data.csv",
@@ -29,7 +43,7 @@ class TestGetObjectNames(unittest.TestCase):
                     "LastModified": datetime.now(timezone.utc) - timedelta(hours=80)
                 }
             ]
-        }
+        })
         bucket_name = "test-bucket"
         result = get_object_names(fake_s3_client, bucket_name)
 
@@ -38,7 +52,7 @@ class TestGetObjectNames(unittest.TestCase):
     @patch('extract_s3.client')
     def test_get_object_names_one_correct_name(self, fake_s3_client):
         """Testing only the correct name format."""
-        fake_s3_client.list_objects.return_value = {
+        set_root_listing(fake_s3_client, {
             "Contents": [
                 {
                     "Key": "correct_article_data.csv",
@@ -53,7 +67,7 @@ class TestGetObjectNames(unittest.TestCase):
                     "LastModified": datetime.now(timezone.utc) - timedelta(minutes=20)
                 }
             ]
-        }
+        })
         bucket_name = "test-bucket"
         result = get_object_names(fake_s3_client, bucket_name)
 
@@ -62,7 +76,7 @@ class TestGetObjectNames(unittest.TestCase):
     @patch('extract_s3.client')
     def test_get_object_names_multiple_correct(self, fake_s3_client):
         """Testing multiple correct filenames are returned."""
-        fake_s3_client.list_objects.return_value = {
+        set_root_listing(fake_s3_client, {
             "Contents": [
                 {
                     "Key": "correct_article_data.csv",
@@ -77,30 +91,95 @@ class TestGetObjectNames(unittest.TestCase):
                     "LastModified": datetime.now(timezone.utc) - timedelta(hours=50)
                 }
             ]
-        }
+        })
         bucket_name = "test-bucket"
         result = get_object_names(fake_s3_client, bucket_name)
 
         self.assertEqual(
             result, ["correct_article_data.csv", "another_correct_article_data.csv"])
 
+    @patch('extract_s3.client')
+    def test_get_object_names_parquet(self, fake_s3_client):
+        """Testing Parquet batches are returned alongside CSV ones."""
+        set_root_listing(fake_s3_client, {
+            "Contents": [
+                {
+                    "Key": "correct_article_data.parquet",
+                    "LastModified": datetime.now(timezone.utc) - timedelta(minutes=30)
+                },
+                {
+                    "Key": "correct_article_data.csv",
+                    "LastModified": datetime.now(timezone.utc) - timedelta(minutes=40)
+                },
+                {
+                    "Key": "not_correct_article_data.feather",
+                    "LastModified": datetime.now(timezone.utc) - timedelta(minutes=30)
+                }
+            ]
+        })
+        bucket_name = "test-bucket"
+        result = get_object_names(fake_s3_client, bucket_name)
+
+        self.assertEqual(
+            result, ["correct_article_data.parquet", "correct_article_data.csv"])
+
     @patch('extract_s3.client')
     def test_get_object_names_none_raises_error(self, fake_s3_client):
         """Testing if no file names are returned, a value error is raised."""
-        fake_s3_client.list_objects.return_value = {
+        set_root_listing(fake_s3_client, {
             "Contents": [
                 {
                     "Key": "not_correct_article_data.csv",
                     "LastModified": datetime.now(timezone.utc) - timedelta(hours=50)
                 }
             ]
-        }
+        })
         bucket_name = "test-bucket"
 
         with self.assertRaises(ValueError):
             get_object_names(fake_s3_client, bucket_name)
 
 
+class TestGetDayPrefixes(unittest.TestCase):
+    """Tests for get_day_prefixes function."""
+
+    def test_window_across_month_end(self):
+        """Every day touched by the window is listed once."""
+        self.assertEqual(
+            get_day_prefixes(datetime(2024, 10, 30, 22), datetime(2024, 11, 1, 1)),
+            ["2024/10/30/", "2024/10/31/", "2024/11/01/"])
+
+
+@mock_aws
+class TestListObjectsFromS3(unittest.TestCase):
+    """Tests the paginated, partitioned listing against a local S3 stand-in."""
+
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="test-bucket")
+
+    def test_list_objects_follows_pages(self):
+        """Objects past the first 1000 keys are listed."""
+        for i in range(1005):
+            self.s3.put_object(Bucket="test-bucket", Key=f"{i:04}_article_data.csv",
+                               Body=b"")
+
+        self.assertEqual(len(list(list_objects(self.s3, "test-bucket"))), 1005)
+
+    def test_get_object_names_lists_recent_partitions_and_top_level(self):
+        """Batches in recent partitions and legacy top-level batches are found,
+        but not those in partitions outside the window."""
+        now = datetime.now(timezone.utc)
+        recent = now.strftime("%Y/%m/%d/%H/") + "recent_article_data.csv"
+        old = (now - timedelta(days=5)).strftime("%Y/%m/%d/%H/") + \
+            "old_article_data.csv"
+        for key in [recent, old, "legacy_article_data.csv", "seen_article_urls.txt.gz"]:
+            self.s3.put_object(Bucket="test-bucket", Key=key, Body=b"")
+
+        self.assertEqual(sorted(get_object_names(self.s3, "test-bucket")),
+                         sorted([recent, "legacy_article_data.csv"]))
+
+
 class TestCreateDataFrame(unittest.TestCase):
     """Tests for create_dataframe function."""
 
@@ -121,6 +200,20 @@ class TestCreateDataFrame(unittest.TestCase):
 
         pd.testing.assert_frame_equal(result_df, expected_df)
 
+    @patch('extract_s3.client')
+    def test_create_dataframe_parquet(self, fake_s3_client):
+        """Tests that a Parquet batch is read by its schema."""
+        expected_df = pd.DataFrame({
+            "title": ["Title"], "content": ["123"], "link": ["https://a.org"],
+            "published": ["2024-10-07"], "source_name": ["Fox News"]})
+        body = serialise_articles(expected_df, "parquet")
+        fake_s3_client.download_fileobj.side_effect = lambda Bucket, Key, Fileobj: Fileobj.write(
+            body)
+        result_df = create_dataframe(
+            fake_s3_client, "test-bucket", "test_article_data.parquet")
+
+        pd.testing.assert_frame_equal(result_df[expected_df.columns], expected_df)
+
 
 class TestDeleteObject(unittest.TestCase):
     """Tests for delete_object function."""
@@ -141,13 +234,11 @@ class TestExtract(unittest.TestCase):
 
     @patch('extract_s3.get_object_names')
     @patch('extract_s3.create_dataframe')
-    @patch('extract_s3.delete_object')
     @patch('extract_s3.client')
     @patch('extract_s3.ENV', {"BUCKET_NAME": "test-bucket",
                               "AWS_ACCESS_KEY": "test-access-key",
                               "AWS_SECRET_KEY": "test-secret-key"})
-    def test_extract(self, fake_client, fake_delete_object,
-                     fake_create_dataframe, fake_get_object_names):
+    def test_extract(self, fake_client, fake_create_dataframe, fake_get_object_names):
         """Tests that extract returns a dataframe made from the create dataframe functions."""
         fake_get_object_names.return_value = [
             "test_file1.csv", "test_file2.csv"]
@@ -155,16 +246,15 @@ class TestExtract(unittest.TestCase):
             {"col1": ["val1", "val3"], "col2": ["val2", "val4"]})
         df2 = pd.DataFrame(
             {"col1": ["val5", "val7"], "col2": ["val6", "val8"]})
-        fake_create_dataframe.side_effect = [df1, df2]
-        result_df = extract()
-        expected_df = pd.concat([df1, df2], ignore_index=True)
+        fake_create_dataframe.side_effect = lambda s3, bucket, name: {
+            "test_file1.csv": df1, "test_file2.csv": df2}[name]
+        batches = extract()
 
-        pd.testing.assert_frame_equal(result_df, expected_df)
-        fake_delete_object.assert_any_call(
-            fake_client.return_value, "test-bucket", "test_file1.csv")
-        fake_delete_object.assert_any_call(
-            fake_client.return_value, "test-bucket", "test_file2.csv")
-        self.assertEqual(fake_delete_object.call_count, 2)
+        self.assertEqual(list(batches), ["test_file1.csv", "test_file2.csv"])
+        pd.testing.assert_frame_equal(batches["test_file1.csv"], df1)
+        pd.testing.assert_frame_equal(batches["test_file2.csv"], df2)
+        fake_client.return_value.delete_object.assert_not_called()
+        fake_client.return_value.delete_objects.assert_not_called()
 
     @patch('extract_s3.get_object_names')
     @patch('extract_s3.ENV', {"BUCKET_NAME": "test-bucket",
@@ -176,3 +266,133 @@ class TestExtract(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             extract()
+
+
+class TestDeleteObjects(unittest.TestCase):
+    """Tests for delete_objects function."""
+
+    @patch('extract_s3.DELETE_BATCH_SIZE', 2)
+    @patch('extract_s3.client')
+    def test_delete_objects_batches(self, fake_s3_client):
+        """Tests that the keys are deleted in batches."""
+        fake_s3_client.delete_objects.return_value = {}
+        delete_objects(fake_s3_client, "test-bucket", ["a", "b", "c"])
+
+        self.assertEqual(fake_s3_client.delete_objects.call_count, 2)
+        fake_s3_client.delete_objects.assert_called_with(
+            Bucket="test-bucket", Delete={"Objects": [{"Key": "c"}], "Quiet": True})
+
+
+@mock_aws
+@patch('extract_s3.ENV', {"BUCKET_NAME": "test-bucket",
+                          "AWS_ACCESS_KEY": "test-access-key",
+                          "AWS_SECRET_KEY": "test-secret-key"})
+class TestExtractFromS3(unittest.TestCase):
+    """Tests extract and delete_extracted against a local S3 stand-in."""
+
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket="test-bucket")
+        for i in range(60):
+            self.s3.put_object(Bucket="test-bucket", Key=f"{i:02}_article_data.csv",
+                               Body=f"title,content\nTitle {i},Content {i}\n")
+        self.s3.put_object(Bucket="test-bucket", Key="seen_article_urls.txt.gz",
+                           Body=b"")
+
+    def keys(self, prefix: str = ""):
+        """Returns the keys in the bucket under the prefix."""
+        listing = self.s3.list_objects(Bucket="test-bucket", Prefix=prefix)
+        return [o["Key"] for o in listing.get("Contents", [])]
+
+    def test_extract_downloads_every_object_without_deleting(self):
+        """Every batch is read, in key order, claimed and left in the bucket."""
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            batches = extract()
+        articles, names = pd.concat(batches.values()), list(batches)
+
+        self.assertEqual(articles["title"].tolist(),
+                         [f"Title {i}" for i in range(60)])
+        self.assertEqual(len(names), 60)
+        self.assertEqual(len(self.keys()), 121)
+        self.assertEqual(self.keys("claims/")[0], "claims/00_article_data.csv.claim")
+
+    def test_second_run_skips_claimed_batches(self):
+        """A run started while the batches are claimed extracts nothing."""
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            extract()
+            with self.assertRaises(ValueError):
+                extract()
+
+    def test_released_batches_are_extracted_again(self):
+        """Batches released after a failed load are claimed by the next run."""
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            names = list(extract())
+            release_extracted(names)
+            names_again = list(extract())
+
+        self.assertEqual(names_again, names)
+
+    def test_stale_claim_is_taken_over(self):
+        """A claim older than the timeout, left by a run that died, is taken over."""
+        self.assertTrue(claim_object(self.s3, "test-bucket", "00_article_data.csv", "dead"))
+        self.assertFalse(claim_object(self.s3, "test-bucket", "00_article_data.csv", "new"))
+
+        with patch('extract_s3.CLAIM_TIMEOUT', timedelta(0)):
+            self.assertTrue(claim_object(self.s3, "test-bucket", "00_article_data.csv", "new"))
+        claim = self.s3.get_object(Bucket="test-bucket",
+                                   Key="claims/00_article_data.csv.claim")
+        self.assertEqual(json.loads(claim["Body"].read())["run_id"], "new")
+
+    def test_claim_on_deleted_batch_is_dropped(self):
+        """A batch loaded and deleted by another run after listing is not claimed."""
+        self.assertFalse(claim_object(self.s3, "test-bucket", "gone_article_data.csv", "run"))
+        self.assertEqual(self.keys("claims/"), [])
+
+    def test_delete_extracted_only_removes_batches(self):
+        """Deleting the extracted batches leaves the other objects."""
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            delete_extracted(list(extract()))
+
+        self.assertEqual(self.keys(), ["seen_article_urls.txt.gz"])
+
+    def attempts(self, name: str) -> int:
+        """Returns the count of failed loads in the batch's claim marker."""
+        claim = self.s3.get_object(Bucket="test-bucket", Key=f"claims/{name}.claim")
+        return json.loads(claim["Body"].read())["attempts"]
+
+    def test_unreadable_batch_is_quarantined(self):
+        """A batch that cannot be read is moved to failed/ and the rest are extracted."""
+        self.s3.put_object(Bucket="test-bucket", Key="bad_article_data.parquet",
+                           Body=b"not parquet")
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            batches = extract()
+
+        self.assertEqual(len(batches), 60)
+        self.assertNotIn("bad_article_data.parquet", batches)
+        self.assertEqual(self.keys("failed/"), ["failed/bad_article_data.parquet.failed"])
+        self.assertNotIn("bad_article_data.parquet", self.keys())
+        self.assertNotIn("claims/bad_article_data.parquet.claim", self.keys("claims/"))
+
+    def test_failed_loads_are_counted_then_quarantined(self):
+        """A batch is retried until its load has failed MAX_LOAD_ATTEMPTS times."""
+        with patch('extract_s3.get_s3_client', return_value=self.s3):
+            for attempt in range(1, 3):
+                names = list(extract())
+                release_extracted(names[:1], failed_load=True)
+                release_extracted(names[1:])
+                self.assertEqual(self.attempts(names[0]), attempt)
+                self.assertEqual(self.attempts(names[1]), 0)
+            names = list(extract())
+            release_extracted(names[:1], failed_load=True)
+            release_extracted(names[1:])
+            names_again = list(extract())
+
+        self.assertEqual(names_again, names[1:])
+        self.assertEqual(self.keys("failed/"), [f"failed/{names[0]}.failed"])
+
+    def test_create_dataframe_unreadable_returns_none(self):
+        """An object that downloads but cannot be parsed gives None."""
+        self.s3.put_object(Bucket="test-bucket", Key="bad_article_data.parquet",
+                           Body=b"not parquet")
+
+        self.assertIsNone(create_dataframe(self.s3, "test-bucket", "bad_article_data.parquet"))
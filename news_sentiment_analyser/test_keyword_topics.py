@@ -0,0 +1,69 @@
+# pylint: skip-file
+
+"""Tests for the keyword_topics.py file."""
+
+import pytest
+
+from keyword_topics import KeywordClassifier, build_alias_topics, compile_aliases
+
+TOPICS = ["Donald Trump", "Kamala Harris", "2024 Presidential Election", "Natural Disaster",
+          "Guns", "Israel-Palestine", "Abortion"]
+
+
+@pytest.fixture
+def classifier():
+    return KeywordClassifier(TOPICS)
+
+
+@pytest.mark.parametrize("title, expected", [
+    ("Trump rallies supporters in Pennsylvania", ["Donald Trump"]),
+    ("KAMALA and Trump trade barbs over abortion",
+     ["Kamala Harris", "Donald Trump", "Abortion"]),
+    ("Kamala Harris campaigns in Michigan", ["Kamala Harris"]),
+    ("Hurricane Milton makes landfall", ["Natural Disaster"]),
+    ("Strikes on Gaza continue", ["Israel-Palestine"]),
+    ("Israel-Palestine talks stall", ["Israel-Palestine"]),
+    ("Gunman opens fire at school", ["Guns"]),
+    ("Stock markets rally on rate cut", []),
+])
+def test_classify_titles(classifier, title, expected):
+    assert classifier.classify(title) == expected
+
+
+@pytest.mark.parametrize("title", [
+    "Georgia election officials certify local results",
+    "Ed Harris stars in new thriller",
+    "Flood of migrants reaches the border",
+    "Polling station workers strike in UK",
+])
+def test_ambiguous_words_are_left_to_the_model(classifier, title):
+    assert classifier.classify(title) == []
+
+
+def test_matches_whole_words_only(classifier):
+    assert classifier.classify("Trumpet player wins award") == []
+    assert classifier.classify("Begun at dawn, the guns fell silent") == ["Guns"]
+
+
+def test_aliases_of_other_topics_are_ignored():
+    classifier = KeywordClassifier(["Donald Trump"])
+
+    assert classifier.classify("Wildfire spreads near Trump golf course") == ["Donald Trump"]
+
+
+def test_unknown_topic_matches_its_name():
+    classifier = KeywordClassifier(["Immigration"])
+
+    assert classifier.classify("Immigration bill passes the House") == ["Immigration"]
+
+
+def test_alias_shared_by_topics_assigns_both():
+    alias_topics = build_alias_topics(["A", "B"], {"A": ["shared"], "B": ["Shared"]})
+
+    assert alias_topics["shared"] == ["A", "B"]
+
+
+def test_longest_alias_wins():
+    pattern = compile_aliases(["swing state", "swing state voters"])
+
+    assert pattern.search("Swing  state voters undecided").group() == "Swing  state voters"
@@ -7,16 +7,19 @@ from unittest.mock import patch, MagicMock
 
 import pandas as pd
 
-from load_rds import load, insert_into_articles, process_df_for_assignment_insert, insert_into_assignment
+from load_rds import (load, insert_into_articles, process_df_for_assignment_insert, insert_into_assignment,
+                      CsvStream, ARTICLE_INSERT_QUERY, CREATE_STAGING_QUERY, COPY_STAGING_QUERY,
+                      MERGE_STAGING_QUERY)
 
 
 class TestLoad(unittest.TestCase):
     """Tests for the load function."""
 
+    @patch('load_rds.use_connection')
     @patch('load_rds.insert_into_articles')
     @patch('load_rds.process_df_for_assignment_insert')
     @patch('load_rds.insert_into_assignment')
-    def test_load(self, fake_insert_into_assignment, fake_process_df_for_assignment_insert, fake_insert_into_articles):
+    def test_load(self, fake_insert_into_assignment, fake_process_df_for_assignment_insert, fake_insert_into_articles, fake_use_connection):
         """Test that the load function calls all the necessary methods."""
         articles = pd.DataFrame({
             "title": ["Article 1", "Article 2"],
@@ -27,21 +30,41 @@ class TestLoad(unittest.TestCase):
             "article_url": ["http://article1.com", "http://article2.com"],
             "topics": [["Technology"], ["Health"]]
         })
-        fake_insert_into_articles.return_value = {
-            "Article 1": 101,
-            "Article 2": 102
-        }
+        fake_insert_into_articles.return_value = {0: 101, 1: 102}
         processed_df = pd.DataFrame({
             "topic_id": [1, 2],
             "article_id": [101, 102]
         })
         fake_process_df_for_assignment_insert.return_value = processed_df
+        fake_conn = fake_use_connection.return_value.__enter__.return_value
         load(articles)
 
-        fake_insert_into_articles.assert_called_once_with(articles)
+        fake_use_connection.assert_called_once_with(None)
+        fake_insert_into_articles.assert_called_once_with(articles, fake_conn)
         fake_process_df_for_assignment_insert.assert_called_once_with(
-            articles, {"Article 1": 101, "Article 2": 102})
-        fake_insert_into_assignment.assert_called_once_with(processed_df)
+            articles, {0: 101, 1: 102}, fake_conn)
+        fake_insert_into_assignment.assert_called_once_with(processed_df, fake_conn)
+        fake_conn.__enter__.assert_called_once()
+        fake_conn.__exit__.assert_called_once_with(None, None, None)
+
+    @patch('load_rds.insert_into_articles')
+    @patch('load_rds.process_df_for_assignment_insert')
+    @patch('load_rds.insert_into_assignment')
+    def test_load_rolls_back_articles_when_assignment_fails(self, fake_insert_into_assignment, fake_process_df_for_assignment_insert, fake_insert_into_articles):
+        """Test that a failed assignment insert ends the shared transaction with the error,
+        so the articles are rolled back with it."""
+        fake_conn = MagicMock()
+        fake_conn.__exit__.return_value = False
+        fake_insert_into_articles.return_value = {0: 101}
+        fake_insert_into_assignment.side_effect = ValueError("bad topic")
+        articles = pd.DataFrame({"title": ["Article 1"], "topics": [["Technology"]]})
+
+        with self.assertRaises(ValueError):
+            load(articles, fake_conn)
+
+        fake_insert_into_articles.assert_called_once_with(articles, fake_conn)
+        self.assertIs(fake_conn.__exit__.call_args.args[0], ValueError)
+        fake_conn.close.assert_not_called()
 
     @patch('load_rds.insert_into_articles')
     @patch('load_rds.process_df_for_assignment_insert')
@@ -59,9 +82,8 @@ class TestLoad(unittest.TestCase):
 class TestInsertIntoArticles(unittest.TestCase):
     """Tests for the insert_into_articles function."""
 
-    @patch('load_rds.create_connection')
     @patch('load_rds.execute_values')
-    def test_insert_into_articles(self, fake_execute_values, fake_create_connection):
+    def test_insert_into_articles(self, fake_execute_values):
         """Test inserting articles into the database and returning the article_id dictionary."""
         articles = pd.DataFrame({
             "title": ["Article 1", "Article 2"],
@@ -73,23 +95,77 @@ class TestInsertIntoArticles(unittest.TestCase):
             "link": ["http://article1.com", "http://article2.com"]
         })
         fake_cursor = MagicMock()
-        fake_cursor.fetchall.return_value = [
-            {"article_id": 101, "article_title": "Article 1"},
-            {"article_id": 102, "article_title": "Article 2"}
+        fake_execute_values.return_value = [
+            {"position": 0, "article_id": 101},
+            {"position": 1, "article_id": 102}
         ]
         fake_conn = MagicMock()
         fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
-        fake_create_connection.return_value.__enter__.return_value = fake_conn
-        result = insert_into_articles(articles)
+        result = insert_into_articles(articles, fake_conn)
 
-        expected_result = {
-            "Article 1": 101,
-            "Article 2": 102
-        }
+        expected_result = {0: 101, 1: 102}
         self.assertEqual(result, expected_result)
         fake_execute_values.assert_called_once()
-        fake_cursor.fetchall.assert_called_once()
-        fake_conn.commit.assert_called_once()
+        self.assertEqual(fake_execute_values.call_args.args[2], [
+            (0, "Article 1", "Content 1", 0.1, 0.2, 1, pd.Timestamp('2023-01-01'), "http://article1.com"),
+            (1, "Article 2", "Content 2", -0.3, -0.5, 2, pd.Timestamp('2023-01-02'), "http://article2.com")
+        ])
+        self.assertTrue(fake_execute_values.call_args.kwargs["fetch"])
+        fake_cursor.copy_expert.assert_not_called()
+        fake_conn.commit.assert_not_called()
+
+    @patch('load_rds.COPY_MIN_ROWS', 2)
+    @patch('load_rds.execute_values')
+    def test_large_batches_are_copied_through_staging(self, fake_execute_values):
+        """Test that batches of COPY_MIN_ROWS or more go through COPY and the staging merge."""
+        articles = pd.DataFrame({
+            "title": ["Article 1", "Article 2"],
+            "content": ["Content, with a comma", "Content\nover two lines"],
+            "title_polarity_score": [0.1, -0.3],
+            "content_polarity_score": [0.2, -0.5],
+            "source_id": [1.0, 2.0],
+            "published": ["2023-01-01", "2023-01-02"],
+            "link": ["http://article1.com", "http://article2.com"]
+        })
+        copied = []
+        fake_cursor = MagicMock()
+        fake_cursor.copy_expert.side_effect = lambda query, file: copied.append(file.read(10_000))
+        fake_cursor.fetchall.return_value = [
+            {"position": 0, "article_id": 101},
+            {"position": 1, "article_id": 102}
+        ]
+        fake_conn = MagicMock()
+        fake_conn.cursor.return_value.__enter__.return_value = fake_cursor
+        result = insert_into_articles(articles, fake_conn)
+
+        self.assertEqual(result, {0: 101, 1: 102})
+        fake_execute_values.assert_not_called()
+        self.assertEqual([call.args[0] for call in fake_cursor.execute.call_args_list],
+                         [CREATE_STAGING_QUERY, MERGE_STAGING_QUERY])
+        self.assertEqual(fake_cursor.copy_expert.call_args.args[0], COPY_STAGING_QUERY)
+        self.assertEqual(copied[0], '0,Article 1,"Content, with a comma",0.1,0.2,1,2023-01-01,http://article1.com\n'
+                                    '1,Article 2,"Content\nover two lines",-0.3,-0.5,2,2023-01-02,http://article2.com\n')
+
+
+class TestCsvStream(unittest.TestCase):
+    """Tests for the CsvStream class."""
+
+    def test_reads_every_row_across_chunks(self):
+        """Test that small reads across chunk boundaries give the whole CSV once."""
+        df = pd.DataFrame({"title": [f"Article {i}" for i in range(25)],
+                           "content": [f"Content, {i}" for i in range(25)]})
+        stream = CsvStream(df, chunk_rows=4)
+        parts = []
+        while part := stream.read(7):
+            self.assertLessEqual(len(part), 7)
+            parts.append(part)
+
+        self.assertEqual("".join(parts), df.to_csv(header=False, index=False))
+        self.assertEqual(stream.read(7), "")
+
+    def test_empty_dataframe(self):
+        """Test that an empty dataframe reads as empty."""
+        self.assertEqual(CsvStream(pd.DataFrame({"title": []})).read(100), "")
 
 
 class TestProcessDfForAssignmentInsert(unittest.TestCase):
@@ -106,36 +182,70 @@ class TestProcessDfForAssignmentInsert(unittest.TestCase):
             "title": ["Article 1", "Article 2"],
             "topics": [["Technology"], ["Health"]]
         })
-        article_id_dict = {
-            "Article 1": 101,
-            "Article 2": 102
-        }
-        result_df = process_df_for_assignment_insert(articles, article_id_dict)
+        result_df = process_df_for_assignment_insert(articles, {0: 101, 1: 102})
 
         expected_df = pd.DataFrame({
             "topic_id": [1, 2],
             "article_id": [101, 102]
         })
         pd.testing.assert_frame_equal(result_df, expected_df)
+        fake_get_topic_dict.assert_called_once_with(None)
+
+    @patch('load_rds.get_topic_dict')
+    def test_rows_without_ids_are_dropped(self, fake_get_topic_dict):
+        """Test that articles with no topics, unknown topics or no new id get no rows."""
+        fake_get_topic_dict.return_value = {"Technology": 1}
+        articles = pd.DataFrame({
+            "title": ["Article 1", "Article 2", "Article 3", "Article 4"],
+            "topics": [["Technology", "Unknown"], [], ["Technology"], ["Technology"]]
+        })
+        result_df = process_df_for_assignment_insert(articles, {0: 101, 1: 102, 2: 103})
+
+        self.assertEqual(result_df.astype(int).values.tolist(), [[1, 101], [1, 103]])
+
+
+    @patch('load_rds.get_topic_dict')
+    def test_articles_sharing_a_title_keep_their_own_ids(self, fake_get_topic_dict):
+        """Test that ids are matched by position, so articles with the same title
+        from different sources, or a non-default index, get their own ids."""
+        fake_get_topic_dict.return_value = {"Technology": 1, "Health": 2}
+        articles = pd.DataFrame({
+            "title": ["Same title", "Same title"],
+            "topics": [["Technology"], ["Health"]]
+        }, index=[7, 3])
+        result_df = process_df_for_assignment_insert(articles, {0: 101, 1: 202})
+
+        self.assertEqual(result_df.values.tolist(), [[1, 101], [2, 202]])
+
+
+class TestArticleUpsertQuery(unittest.TestCase):
+    """Tests for the queries that insert articles and resolve their ids."""
+
+    def test_queries_resolve_existing_articles(self):
+        """Test that both load paths return ids for new and already stored articles."""
+        for query in [ARTICLE_INSERT_QUERY, MERGE_STAGING_QUERY]:
+            self.assertIn("ON CONFLICT (article_title, source_id, date_published) DO NOTHING", query)
+            self.assertIn("COALESCE(inserted.article_id, article.article_id)", query)
+            self.assertNotIn("{", query)
+        self.assertEqual(ARTICLE_INSERT_QUERY.count("%s"), 1)
+        self.assertIn("FROM article_staging", MERGE_STAGING_QUERY)
 
 
 class TestInsertIntoAssignment(unittest.TestCase):
     """Tests for the insert_into_assignment function."""
 
-    @patch('load_rds.create_connection')
     @patch('load_rds.execute_values')
-    def test_insert_into_assignment(self, fake_execute_values, fake_create_connection):
+    def test_insert_into_assignment(self, fake_execute_values):
         """Test bulk insert of article-topic assignments into the database."""
         articles = pd.DataFrame({
             "topic_id": [1, 2],
             "article_id": [101, 102]
         })
         fake_conn = MagicMock()
-        fake_create_connection.return_value.__enter__.return_value = fake_conn
-        insert_into_assignment(articles)
+        insert_into_assignment(articles, fake_conn)
 
         params = [(1, 101), (2, 102)]
         fake_execute_values.assert_called_once()
         call_args = fake_execute_values.call_args[0]
         self.assertEqual(call_args[2], params)
-        fake_conn.commit.assert_called_once()
+        fake_conn.commit.assert_not_called()
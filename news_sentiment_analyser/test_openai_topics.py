@@ -2,22 +2,57 @@
 
 """Tests for the openai_topics.py file."""
 
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import json
 
 import pandas as pd
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
-from openai_topics import (add_topics_to_dataframe, find_article_topics,
-                           chunk_list, create_message, OpenAIError)
+from openai_topics import (add_topics_to_dataframe, create_message, classify_titles, parse_topic_response, BatchSizer,
+                           RateLimiter, OpenAIError, TopicResponseError, MAX_ATTEMPTS)
+from topic_cache import TopicCache
+
+
+def numbered_titles(messages: list[dict]) -> list[str]:
+    """Returns the titles in a request, without their numbers."""
+    return [line.split(". ", 1)[1] for line in messages[1]["content"].split("\n")]
+
+
+class FakeAsyncOpenAI:
+    """Stands in for the async OpenAI client, classifying titles with a
+    lookup and recording the titles of each request."""
+
+    def __init__(self, title_topics: dict, fail: bool = False):
+        self.title_topics = title_topics
+        self.fail = fail
+        self.requests = []
+        self.chat = MagicMock()
+        self.chat.completions.create = self.create
+
+    async def create(self, messages, model, response_format):
+        titles = numbered_titles(messages)
+        self.requests.append(titles)
+        if self.fail:
+            raise OpenAIError("API error")
+        response = MagicMock()
+        response.choices[0].finish_reason = "stop"
+        response.choices[0].message.content = json.dumps({"results": [
+            {"index": i, "topics": self.title_topics.get(title, [])}
+            for i, title in enumerate(titles)]})
+        response.usage.completion_tokens = 20 * len(titles)
+        return response
 
 
 class TestAddTopicsToDataFrame(unittest.TestCase):
     """Tests for add_topics_to_dataframe function."""
 
     @patch('openai_topics.get_topic_names')
-    @patch('openai_topics.OpenAI')
+    @patch('openai_topics.AsyncOpenAI')
     @patch('openai_topics.ENV', {"OPENAI_API_KEY": "fake_api_key"})
     def test_add_topics_to_dataframe(self, fake_OpenAI, fake_get_topic_names):
         """Tests works with valid input al all rows with topics."""
@@ -25,6 +60,7 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         fake_ai_client = MagicMock(spec=OpenAI)
         fake_OpenAI.return_value = fake_ai_client
         fake_chat = MagicMock()
+        fake_chat.completions.create = AsyncMock()
         fake_ai_client.chat = fake_chat
         fake_response = MagicMock()
         fake_response.choices = [MagicMock()]
@@ -42,7 +78,7 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         self.assertTrue(len(result_df) == 2)
 
     @patch('openai_topics.get_topic_names')
-    @patch('openai_topics.OpenAI')
+    @patch('openai_topics.AsyncOpenAI')
     @patch('openai_topics.ENV', {"OPENAI_API_KEY": "fake_api_key"})
     def test_empty_topics_rows_are_dropped(self, fake_OpenAI, fake_get_topic_names):
         """Test that rows with empty topics are dropped from the DataFrame."""
@@ -50,6 +86,7 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         fake_ai_client = MagicMock(spec=OpenAI)
         fake_OpenAI.return_value = fake_ai_client
         fake_chat = MagicMock()
+        fake_chat.completions.create = AsyncMock()
         fake_ai_client.chat = fake_chat
         fake_response = MagicMock()
         fake_response.choices = [MagicMock()]
@@ -65,7 +102,7 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         self.assertEqual(result_df['title'].iloc[0], "Article 1")
 
     @patch('openai_topics.get_topic_names')
-    @patch('openai_topics.OpenAI')
+    @patch('openai_topics.AsyncOpenAI')
     @patch('openai_topics.ENV', {"OPENAI_API_KEY": "fake_api_key"})
     def test_no_topics_returned(self, fake_OpenAI, fake_get_topic_names):
         """Test behavior when no topics are returned by the API."""
@@ -73,6 +110,7 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         fake_ai_client = MagicMock(spec=OpenAI)
         fake_OpenAI.return_value = fake_ai_client
         fake_chat = MagicMock()
+        fake_chat.completions.create = AsyncMock()
         fake_ai_client.chat = fake_chat
         fake_response = MagicMock()
         fake_response.choices = [MagicMock()]
@@ -104,120 +142,298 @@ class TestAddTopicsToDataFrame(unittest.TestCase):
         self.assertEqual(str(context.exception), "DataFrame is empty")
 
 
-class TestFindArticleTopics(unittest.TestCase):
-    """Tests for find_article_topics function."""
+class TestCreateMessage(unittest.TestCase):
+    """Tests create_message function."""
 
-    @patch('openai_topics.OpenAI')
-    def test_find_article_topics(self, fake_OpenAI):
-        """Test valid calls are processed correctly."""
-        fake_ai_client = MagicMock(spec=OpenAI)
-        fake_OpenAI.return_value = fake_ai_client
-        fake_chat = MagicMock()
-        fake_ai_client.chat = fake_chat
-        fake_response = MagicMock()
-        fake_response.choices = [MagicMock()]
-        fake_response.choices[0].message.content = json.dumps([
-            {"title": "Article 1", "topics": ["Technology"]},
-            {"title": "Article 2", "topics": ["Health"]}
-        ])
-        fake_chat.completions.create.return_value = fake_response
-        article_titles = ["Article 1", "Article 2"]
+    def test_create_message(self):
+        """Tests topics are in message."""
         topics = ["Technology", "Health", "Sports"]
-        result = find_article_topics(
-            article_titles, topics, fake_ai_client)
 
-        fake_chat.completions.create.assert_called_once()
-        expected_result = {
-            "Article 1": ["Technology"],
-            "Article 2": ["Health"]
-        }
-        self.assertEqual(result, expected_result)
-
-    @patch('openai_topics.OpenAI')
-    def test_openai_api_error(self, fake_OpenAI):
-        """Test handling of OpenAI API errors."""
-        fake_ai_client = MagicMock(spec=OpenAI)
-        fake_OpenAI.return_value = fake_ai_client
-        fake_chat = MagicMock()
-        fake_ai_client.chat = fake_chat
-        fake_chat.completions.create.side_effect = OpenAIError(
-            "API error")
-        article_titles = ["Article 1", "Article 2"]
-        topics = ["Technology", "Health", "Sports"]
-        result = find_article_topics(article_titles, topics, fake_ai_client)
+        result_message = create_message(topics)
+        for topic in topics:
+            self.assertIn(topic, result_message)
 
-        expected_result = {
-            "Article 1": [],
-            "Article 2": []
-        }
-        self.assertEqual(result, expected_result)
 
-    @patch('openai_topics.OpenAI')
-    def test_json_parsing_error(self, fake_OpenAI):
-        """Test handling of JSON parsing errors in OpenAI response."""
-        fake_ai_client = MagicMock(spec=OpenAI)
-        fake_OpenAI.return_value = fake_ai_client
-        fake_chat = MagicMock()
-        fake_ai_client.chat = fake_chat
-        fake_response = MagicMock()
-        fake_response.choices = [MagicMock()]
-        fake_response.choices[0].message.content = "Invalid JSON"
-        fake_chat.completions.create.return_value = fake_response
-        article_titles = ["Article 1", "Article 2"]
-        topics = ["Technology", "Health", "Sports"]
-        result = find_article_topics(article_titles, topics, fake_ai_client)
+@patch('openai_topics.get_topic_names', return_value=["Economy", "Sports"])
+@patch('openai_topics.save_topic_cache')
+@patch('openai_topics.load_topic_cache')
+@patch('openai_topics.ENV', {"OPENAI_API_KEY": "fake_api_key",
+                             "TOPIC_CACHE_KEY": "topic_cache.json.gz"})
+class TestAddTopicsWithCache(unittest.TestCase):
+    """Tests add_topics_to_dataframe with a topic cache and a fake client."""
+
+    def setUp(self):
+        self.client = FakeAsyncOpenAI({"Markets fall": ["Economy"], "Cup final": ["Sports"]})
+        self.cache = TopicCache()
+
+    def add_topics(self, titles):
+        with patch('openai_topics.AsyncOpenAI', return_value=self.client):
+            return add_topics_to_dataframe(pd.DataFrame({"title": titles}))
+
+    def test_only_misses_are_sent(self, fake_load, fake_save, fake_topic_names):
+        """Titles classified in an earlier run are not sent again."""
+        fake_load.return_value = self.cache
+        self.add_topics(["Markets fall"])
+
+        result = self.add_topics(["Markets fall", "Cup final", "Cup final"])
+
+        self.assertEqual(self.client.requests, [["Markets fall"], ["Cup final"]])
+        self.assertEqual(result['topics'].tolist(), [["Economy"], ["Sports"], ["Sports"]])
+        fake_save.assert_called_with(self.cache, "topic_cache.json.gz")
+
+    def test_all_cached_skips_the_client(self, fake_load, fake_save, fake_topic_names):
+        """No client is created when every title is cached."""
+        self.cache.put("Markets fall", ["Economy"], ["Economy", "Sports"])
+        self.cache.changed = False
+        fake_load.return_value = self.cache
+
+        with patch('openai_topics.AsyncOpenAI') as fake_OpenAI:
+            result = add_topics_to_dataframe(pd.DataFrame({"title": ["Markets fall"]}))
+
+        fake_OpenAI.assert_not_called()
+        fake_save.assert_not_called()
+        self.assertEqual(result['topics'].tolist(), [["Economy"]])
+
+    def test_failed_titles_are_not_cached(self, fake_load, fake_save, fake_topic_names):
+        """Titles of a failed request are sent again on the next run."""
+        fake_load.return_value = self.cache
+        self.client.fail = True
+        self.add_topics(["Markets fall"])
+        self.client.fail = False
+
+        self.add_topics(["Markets fall"])
+
+        self.assertEqual(self.client.requests, [["Markets fall"]] * (MAX_ATTEMPTS + 1))
+        self.assertEqual(len(self.cache), 1)
+
+
+@patch('openai_topics.get_topic_names', return_value=["Donald Trump", "Economy"])
+@patch('openai_topics.ENV', {"OPENAI_API_KEY": "fake_api_key"})
+class TestAddTopicsWithKeywords(unittest.TestCase):
+    """Tests the keyword fast path of add_topics_to_dataframe."""
+
+    @patch('openai_topics.KEYWORD_TOPICS', True)
+    def test_only_titles_without_keywords_are_sent(self, fake_topic_names):
+        """Titles naming a topic are classified without the model."""
+        client = FakeAsyncOpenAI({"Markets fall": ["Economy"]})
+        articles = pd.DataFrame({"title": ["Trump visits Ohio", "Markets fall"]})
+
+        with patch('openai_topics.AsyncOpenAI', return_value=client):
+            result = add_topics_to_dataframe(articles)
+
+        self.assertEqual(client.requests, [["Markets fall"]])
+        self.assertEqual(result['topics'].tolist(), [["Donald Trump"], ["Economy"]])
+        self.assertEqual(result['topic_origin'].tolist(), ["keyword", "llm"])
+
+    def test_keywords_are_off_by_default(self, fake_topic_names):
+        """Every title goes to the model unless KEYWORD_TOPICS is set."""
+        client = FakeAsyncOpenAI({"Trump visits Ohio": ["Donald Trump"]})
+
+        with patch('openai_topics.AsyncOpenAI', return_value=client):
+            result = add_topics_to_dataframe(pd.DataFrame({"title": ["Trump visits Ohio"]}))
+
+        self.assertEqual(client.requests, [["Trump visits Ohio"]])
+        self.assertEqual(result['topic_origin'].tolist(), ["llm"])
+
+
+class StubCompletionsHandler(BaseHTTPRequestHandler):
+    """Answers chat completions after a delay, classifying every title as
+    "Topic <first word>". The server decides which requests to refuse."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        titles = numbered_titles(body["messages"])
+        with server.lock:
+            server.requests.append(titles)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            rate_limited = len(server.requests) <= server.rate_limited_requests
+        time.sleep(server.latency)
+        with server.lock:
+            server.active -= 1
+
+        if rate_limited:
+            return self.reply(429, {"error": {"message": "Rate limit reached"}},
+                              {"retry-after-ms": "20"})
+        if server.failing_title in titles:
+            return self.reply(500, {"error": {"message": "Server error"}})
+
+        truncated = len(titles) > server.max_titles
+        content = json.dumps({"results": [{"index": i, "topics": [f"Topic {title.split()[0]}"]}
+                                          for i, title in enumerate(titles)]})
+        self.reply(200, {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "length" if truncated else "stop",
+                         "message": {"role": "assistant",
+                                     "content": content[:len(content) // 2]
+                                     if truncated else content}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 25 * len(titles),
+                      "total_tokens": 100 + 25 * len(titles)}})
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestClassifyTitlesAgainstStubServer(unittest.TestCase):
+    """Tests classify_titles with the async client talking to a local stub server."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletionsHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.active = 0
+        self.server.max_active = 0
+        self.server.latency = 0.05
+        self.server.rate_limited_requests = 0
+        self.server.failing_title = None
+        self.server.max_titles = 1000
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = AsyncOpenAI(api_key="test",
+                                  base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+                                  max_retries=0)
+        self.titles = [f"T{i} headline" for i in range(60)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def classify(self, **sizer_options):
+        return asyncio.run(classify_titles(
+            self.titles, ["Topic"], self.client,
+            RateLimiter(per_minute=60_000, concurrency=4), BatchSizer(**sizer_options)))
+
+    def test_keeps_several_requests_in_flight(self):
+        """Batches run concurrently and come back in the order of the titles."""
+        result = self.classify()
+
+        self.assertEqual(list(result), self.titles)
+        self.assertEqual(result["T7 headline"], ["Topic T7"])
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+
+    def test_rate_limited_batches_are_sent_again(self):
+        """Batches refused with a 429 are retried after the pause."""
+        self.server.rate_limited_requests = 2
+
+        result = self.classify()
+
+        self.assertEqual(list(result), self.titles)
+        self.assertEqual(sum(map(len, self.server.requests)), len(self.titles) + sum(
+            map(len, self.server.requests[:2])))
+
+    def test_failed_batches_are_split(self):
+        """A failing batch is split so only the failing title is left out."""
+        self.server.failing_title = "T20 headline"
+
+        result = self.classify()
+
+        self.assertEqual(list(result), [t for t in self.titles if t != "T20 headline"])
+        self.assertIn(["T20 headline"], self.server.requests)
+
+    def test_split_batches_are_sent_concurrently(self):
+        """The halves of a failed batch are in flight together, even though
+        every title had already been taken when it failed."""
+        self.titles = self.titles[:8]
+        self.server.failing_title = "T0 headline"
+
+        result = self.classify(size=8)
+
+        self.assertEqual(list(result), self.titles[1:])
+        self.assertEqual(self.server.requests[0], self.titles)
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_batches_shrink_to_fit_truncated_responses(self):
+        """Responses cut off at the token limit shrink the batches until they fit."""
+        self.server.max_titles = 6
 
-        expected_result = {
-            "Article 1": [],
-            "Article 2": []
-        }
-        self.assertEqual(result, expected_result)
+        result = self.classify()
 
-    @patch('openai_topics.OpenAI')
-    def test_json_with_code_block(self, fake_OpenAI):
-        """Test handling of OpenAI response wrapped in ```json code block."""
-        fake_ai_client = MagicMock(spec=OpenAI)
-        fake_OpenAI.return_value = fake_ai_client
-        fake_chat = MagicMock()
-        fake_ai_client.chat = fake_chat
-        fake_response = MagicMock()
-        fake_response.choices = [MagicMock()]
-        fake_response.choices[0].message.content = "```json\n" + json.dumps([
-            {"title": "Article 1", "topics": ["Technology"]},
-            {"title": "Article 2", "topics": ["Health"]}
-        ]) + "\n```"
-        fake_chat.completions.create.return_value = fake_response
-        article_titles = ["Article 1", "Article 2"]
-        topics = ["Technology", "Health", "Sports"]
-        result = find_article_topics(article_titles, topics, fake_ai_client)
+        self.assertEqual(list(result), self.titles)
+        self.assertLessEqual(max(map(len, self.server.requests[-5:])), 6)
 
-        expected_result = {
-            "Article 1": ["Technology"],
-            "Article 2": ["Health"]
-        }
-        fake_chat.completions.create.assert_called_once()
-        self.assertEqual(result, expected_result)
 
+class TestBatchSizer(unittest.TestCase):
+    """Tests for the BatchSizer class."""
 
-class TestChunkList(unittest.TestCase):
-    """Tests chuck_list function."""
+    def test_grows_after_fast_full_batches(self):
+        sizer = BatchSizer(size=8, target_latency=10)
+        sizer.record_success(8, latency=1, completion_tokens=0)
+        self.assertEqual(sizer.size, 10)
 
-    def test_chunk_list(self):
-        """Tests the expected outcome."""
-        lst = ["A", "B", "C", "D", "E"]
-        chunks = list(chunk_list(lst, 2))
+    def test_shrinks_after_slow_batches_and_failures(self):
+        sizer = BatchSizer(size=8, target_latency=10)
+        sizer.record_success(8, latency=20, completion_tokens=0)
+        self.assertEqual(sizer.size, 6)
+        sizer.record_failure()
+        self.assertEqual(sizer.size, 3)
 
-        expected_chunks = [["A", "B"], ["C", "D"], ["E"]]
-        self.assertEqual(chunks, expected_chunks)
+    def test_capped_by_token_budget(self):
+        sizer = BatchSizer(size=40, token_budget=1000)
+        sizer.record_success(40, latency=1, completion_tokens=40 * 50)
+        self.assertEqual(sizer.size, 20)
 
 
-class TestCreateMessage(unittest.TestCase):
-    """Tests create_message function."""
+def completion(content: str, finish_reason: str = "stop") -> MagicMock:
+    response = MagicMock()
+    response.choices[0].message.content = content
+    response.choices[0].finish_reason = finish_reason
+    return response
 
-    def test_create_message(self):
-        """Tests topics are in message."""
-        topics = ["Technology", "Health", "Sports"]
 
-        result_message = create_message(topics)
-        for topic in topics:
-            self.assertIn(topic, result_message)
+class TestParseTopicResponse(unittest.TestCase):
+    """Tests for parse_topic_response and the incremental item parser."""
+
+    titles = ["Trump's rally draws crowds", "Gaza aid talks", "Fed holds rates"]
+
+    def parse(self, content):
+        return parse_topic_response(completion(content), self.titles)
+
+    def test_maps_items_by_index(self):
+        """Titles with apostrophes or reworded by the model are not dropped."""
+        result = self.parse(json.dumps({"results": [
+            {"index": 0, "topics": ["Donald Trump"]},
+            {"index": 1, "title": "Gaza Aid Talks", "topics": ["Israel-Palestine"]}]}))
+
+        self.assertEqual(result, {"Trump's rally draws crowds": ["Donald Trump"],
+                                  "Gaza aid talks": ["Israel-Palestine"]})
+
+    def test_recovers_items_before_truncation(self):
+        """Complete items are kept when the response was cut off."""
+        content = '{"results": [{"index": 2, "topics": []}, {"index": 0, "topics": ["Don'
+
+        self.assertEqual(self.parse(content), {"Fed holds rates": []})
+
+    def test_ignores_code_fences_and_bare_arrays(self):
+        result = self.parse('```json\n[{"index": 1, "topics": ["Israel-Palestine"]}]\n```')
+
+        self.assertEqual(result, {"Gaza aid talks": ["Israel-Palestine"]})
+
+    def test_accepts_a_single_item(self):
+        result = self.parse('{"title": "Fed holds rates", "topics": ["Economy"]}')
+
+        self.assertEqual(result, {"Fed holds rates": ["Economy"]})
+
+    def test_skips_invalid_items(self):
+        """Out of range or non-integer indexes and malformed items are skipped."""
+        result = self.parse(json.dumps({"results": [
+            {"index": 7, "topics": ["A"]}, {"index": True, "topics": ["B"]},
+            {"index": 0, "topics": "C"}, "text", {"index": 2, "topics": ["D"]}]}))
+
+        self.assertEqual(result, {"Fed holds rates": ["D"]})
+
+    def test_raises_when_nothing_can_be_read(self):
+        with self.assertRaises(TopicResponseError):
+            self.parse('{"results": [{"ind')
+
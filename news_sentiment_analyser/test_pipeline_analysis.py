@@ -0,0 +1,71 @@
+# pylint: skip-file
+
+"""Tests for the pipeline_analysis.py file."""
+
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from pipeline_analysis import pipeline
+
+BATCHES = {"a_article_data.csv": pd.DataFrame({"title": ["A"]}),
+           "b_article_data.csv": pd.DataFrame({"title": ["B"]}),
+           "c_article_data.csv": pd.DataFrame({"title": ["C"]})}
+
+
+@patch('pipeline_analysis.refresh_seen_urls')
+@patch('pipeline_analysis.release_extracted')
+@patch('pipeline_analysis.delete_extracted')
+@patch('pipeline_analysis.transform_and_load')
+@patch('pipeline_analysis.extract', return_value=BATCHES)
+class TestPipeline(unittest.TestCase):
+    """Tests for the pipeline function."""
+
+    def test_batches_are_loaded_together(self, fake_extract, fake_load, fake_delete,
+                                         fake_release, fake_refresh):
+        """Tests that the batches are loaded in one go, then deleted."""
+        pipeline()
+
+        fake_load.assert_called_once()
+        self.assertEqual(fake_load.call_args.args[0]["title"].tolist(), ["A", "B", "C"])
+        fake_delete.assert_called_once_with(list(BATCHES))
+        fake_release.assert_not_called()
+        fake_refresh.assert_called_once()
+
+    def test_bad_batch_does_not_hold_back_the_rest(self, fake_extract, fake_load,
+                                                   fake_delete, fake_release, fake_refresh):
+        """Tests that when the batches fail together, each is loaded on its own
+        and only the failing one is released, with the failure counted."""
+        def load(articles):
+            if "B" in articles["title"].tolist():
+                raise ValueError("duplicate key value violates unique constraint")
+        fake_load.side_effect = load
+
+        pipeline()
+
+        self.assertEqual(fake_delete.call_args_list,
+                         [unittest.mock.call(["a_article_data.csv"]),
+                          unittest.mock.call(["c_article_data.csv"])])
+        fake_release.assert_called_once_with(["b_article_data.csv"], failed_load=True)
+        fake_refresh.assert_called_once()
+
+    def test_outage_is_not_counted_against_batches(self, fake_extract, fake_load,
+                                                   fake_delete, fake_release, fake_refresh):
+        """Tests that when no batch loads on its own, none has the failure counted."""
+        fake_load.side_effect = ConnectionError("database unreachable")
+
+        pipeline()
+
+        fake_delete.assert_not_called()
+        fake_release.assert_called_once_with(list(BATCHES), failed_load=False)
+
+    def test_failed_extract_releases_nothing(self, fake_extract, fake_load, fake_delete,
+                                             fake_release, fake_refresh):
+        """Tests that a run with nothing extracted has nothing to release."""
+        fake_extract.side_effect = ValueError("No dataframes where found")
+
+        pipeline()
+
+        fake_load.assert_not_called()
+        fake_release.assert_not_called()
@@ -0,0 +1,45 @@
+# pylint: skip-file
+
+"""Tests for the seen_urls.py file."""
+
+import gzip
+import unittest
+from unittest.mock import patch
+
+from seen_urls import build_seen_urls_ledger, refresh_seen_urls, SEEN_URLS_KEY, SEEN_URL_DAYS
+
+
+class TestBuildSeenUrlsLedger(unittest.TestCase):
+    """Tests for the build_seen_urls_ledger function."""
+
+    def test_ledger_is_sorted_and_unique(self):
+        """The ledger holds each URL once, in sorted order."""
+        ledger = build_seen_urls_ledger(["http://b.com", "http://a.com",
+                                         "http://b.com"])
+
+        self.assertEqual(gzip.decompress(ledger).decode(),
+                         "http://a.com\nhttp://b.com")
+
+    def test_empty_ledger(self):
+        """An empty table gives an empty ledger."""
+        self.assertEqual(gzip.decompress(build_seen_urls_ledger([])), b"")
+
+
+class TestRefreshSeenUrls(unittest.TestCase):
+    """Tests for the refresh_seen_urls function."""
+
+    @patch('seen_urls.get_s3_client')
+    @patch('seen_urls.get_article_urls')
+    @patch('seen_urls.ENV', {"BUCKET_NAME": "test-bucket"})
+    def test_refresh_seen_urls(self, fake_get_article_urls, fake_get_s3_client):
+        """The ledger is built from the stored URLs and uploaded to the bucket."""
+        fake_get_article_urls.return_value = ["http://a.com"]
+        refresh_seen_urls()
+
+        fake_get_article_urls.assert_called_once_with(SEEN_URL_DAYS)
+        fake_s3 = fake_get_s3_client.return_value
+        fake_s3.put_object.assert_called_once()
+        kwargs = fake_s3.put_object.call_args.kwargs
+        self.assertEqual(kwargs["Bucket"], "test-bucket")
+        self.assertEqual(kwargs["Key"], SEEN_URLS_KEY)
+        self.assertEqual(gzip.decompress(kwargs["Body"]), b"http://a.com")
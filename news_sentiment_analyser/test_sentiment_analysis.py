@@ -2,11 +2,20 @@
 
 """Tests sentiment analysis script"""
 
+import random
+
+import numpy as np
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
 
-from sentiment_analysis import get_sentiments, get_avg_sentiment
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+from sentiment_analysis import (get_sentiments, get_avg_sentiment, score_texts,
+                                score_columns, score_texts_parallel,
+                                should_score_in_parallel, score_long, score_text,
+                                SENTIMENT_DTYPE, LONG_TEXT_WORDS)
+from sentiment_cache import SentimentCache
 
 
 @pytest.fixture
@@ -103,3 +112,164 @@ def test_get_avg_sentiment_correct_values(mock_sia, sample_df):
 
     assert pytest.approx(avg_sentiments['pos'][0], rel=1e-4) == 0.6369
     assert pytest.approx(avg_sentiments['neg'][1], rel=1e-4) == 0.4939
+
+
+def test_score_texts_matches_polarity_scores():
+    """Asserts that score_texts gives the same scores as polarity_scores"""
+
+    sia = SentimentIntensityAnalyzer()
+    texts = ["What a great day!", "This is terrible news.", "", "The vote is on Tuesday."]
+
+    scores = score_texts(sia, texts)
+
+    assert scores.dtype == SENTIMENT_DTYPE
+    for text, score in zip(texts, scores):
+        expected = sia.polarity_scores(text)
+        assert tuple(score) == (expected['pos'], expected['neg'],
+                                expected['neu'], expected['compound'])
+
+
+def test_score_columns_scores_each_column(mock_sia):
+    """Asserts that score_columns cleans the columns in place
+    and splits one batch of scores back into columns"""
+
+    mock_sia.polarity_scores.side_effect = lambda text: {
+        'pos': 0.0, 'neg': 0.0, 'neu': 1.0, 'compound': len(text) / 100}
+    df = pd.DataFrame({'title': ['a  b', 'c'], 'content': ['Fox News ab', 'abcd']})
+
+    scores = score_columns(mock_sia, df, ['title', 'content'])
+
+    assert df['title'].tolist() == ['a b', 'c']
+    assert df['content'].tolist() == [' ab', 'abcd']
+    assert scores['title']['compound'].tolist() == [0.03, 0.01]
+    assert scores['content']['compound'].tolist() == [0.03, 0.04]
+    assert mock_sia.polarity_scores.call_count == 4
+
+
+def test_get_sentiments_does_not_copy(mock_sia, sample_df):
+    """Asserts that get_sentiments adds the scores to the frame it is given"""
+
+    sentiments = get_sentiments(mock_sia, sample_df, 'text')
+
+    assert sentiments is sample_df
+
+
+def test_score_texts_parallel_keeps_row_order():
+    """Asserts that the worker processes' scores come back in row order"""
+
+    texts = [f"{'good ' * (i % 5)}{'bad ' * (i % 3)}news {i}" for i in range(101)]
+
+    parallel = score_texts_parallel(texts, workers=2)
+
+    np.testing.assert_array_equal(parallel, score_texts(SentimentIntensityAnalyzer(), texts))
+
+
+@pytest.mark.parametrize("texts, workers, expected", [
+    (["a" * 600_000, "b" * 600_000], 2, True),
+    (["a" * 600_000, "b" * 600_000], 1, False),
+    (["short"] * 1000, 4, False)])
+def test_should_score_in_parallel(texts, workers, expected):
+    """Asserts that small batches and single workers are scored serially"""
+
+    assert should_score_in_parallel(texts, workers) == expected
+
+
+@patch('sentiment_analysis.score_texts_parallel')
+def test_score_columns_small_batch_stays_serial(mock_parallel, mock_sia):
+    """Asserts that a small batch never starts worker processes"""
+
+    mock_sia.polarity_scores.side_effect = None
+    mock_sia.polarity_scores.return_value = {
+        'pos': 0.0, 'neg': 0.0, 'neu': 1.0, 'compound': 0.0}
+    df = pd.DataFrame({'title': ['a', 'b'], 'content': ['c', 'd']})
+
+    score_columns(mock_sia, df, ['title', 'content'], workers=4)
+
+    mock_parallel.assert_not_called()
+
+
+def test_score_columns_with_cache_scores_each_new_text_once(mock_sia):
+    """Asserts that repeated and cached texts are not rescored"""
+
+    mock_sia.polarity_scores.side_effect = lambda text: {
+        'pos': 0.0, 'neg': 0.0, 'neu': 1.0, 'compound': len(text) / 100}
+    cache = SentimentCache()
+    cache.put("cached", (0.0, 0.0, 1.0, 0.9))
+    df = pd.DataFrame({'title': ['same', 'cached'], 'content': ['same', 'other']})
+
+    scores = score_columns(mock_sia, df, ['title', 'content'], cache=cache)
+
+    assert scores['title']['compound'].tolist() == [0.04, 0.9]
+    assert scores['content']['compound'].tolist() == [0.04, 0.05]
+    assert sorted(c.args[0] for c in mock_sia.polarity_scores.call_args_list) == ['other', 'same']
+    assert cache.hits == 1
+    assert cache.get('other') == (0.0, 0.0, 1.0, 0.05)
+
+
+TRANSCRIPT_LEXICON = ["good", "bad", "great", "terrible", "hope", "crisis", "win",
+                      "lose", "peace", "war", "happy", "angry", "not", "very"]
+
+
+def make_transcript(n_words: int, seed: int = 0, lexicon: list[str] = TRANSCRIPT_LEXICON,
+                    but_rate: float = 0.0) -> str:
+    """Returns sentences of filler words with some sentiment-laden words,
+    and "but" as about but_rate of the words."""
+
+    rng = random.Random(seed)
+    filler = [f"word{i}" for i in range(500)]
+    sentences, words = [], 0
+    while words < n_words:
+        sentence = ["but" if rng.random() < but_rate else
+                    rng.choice(lexicon) if rng.random() < 0.1 else rng.choice(filler)
+                    for _ in range(rng.randint(6, 25))]
+        sentences.append(" ".join(sentence) + rng.choice([".", ".", ".", "?", "!"]))
+        words += len(sentence)
+    return " ".join(sentences)
+
+
+def vader_scores(sia, text: str) -> tuple:
+    """Returns VADER's whole-document scores in score_long's order."""
+
+    scores = sia.polarity_scores(text)
+    return scores["pos"], scores["neg"], scores["neu"], scores["compound"]
+
+
+@pytest.mark.parametrize("but_rate", [0.0, 0.002, 0.01])
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("n_words", [12_000, 25_000])
+def test_score_long_matches_whole_document(n_words, seed, but_rate):
+    """Asserts that long texts with negations, boosters and "but"
+    get exactly the scores VADER gives them whole"""
+
+    sia = SentimentIntensityAnalyzer()
+    text = make_transcript(n_words, seed, but_rate=but_rate)
+
+    assert score_long(sia, text) == vader_scores(sia, text)
+
+
+@pytest.mark.parametrize("text", [
+    "", "word", "good", "good!!!", "bad??", "bad?????", "not good, but very bad?!",
+    "It was kind of good. At least it was not the worst. Never so GOOD!!",
+    "The deal was GREAT but the talks were cut short. The BEST part: no war.",
+    "They were kind of bad at the end of the day, but you will win, no doubt."])
+def test_score_long_matches_whole_document_rules(text):
+    """Asserts that capitals, idioms, "kind of", "least", "never"
+    and punctuation are scored as VADER scores them"""
+
+    sia = SentimentIntensityAnalyzer()
+
+    assert score_long(sia, text) == vader_scores(sia, text)
+
+
+@patch('sentiment_analysis.score_long', return_value=(0.0, 0.0, 1.0, 0.5))
+def test_score_text_uses_score_long_for_long_texts(mock_score_long, mock_sia):
+    """Asserts that only texts of more than LONG_TEXT_WORDS words use score_long"""
+
+    mock_sia.polarity_scores.side_effect = None
+    mock_sia.polarity_scores.return_value = {
+        'pos': 0.0, 'neg': 0.0, 'neu': 1.0, 'compound': 0.1}
+
+    assert score_text(mock_sia, "short text") == (0.0, 0.0, 1.0, 0.1)
+    assert score_text(mock_sia, " ".join(["word"] * LONG_TEXT_WORDS))[3] == 0.1
+    assert score_text(mock_sia, " ".join(["word"] * (LONG_TEXT_WORDS + 1)))[3] == 0.5
+    mock_score_long.assert_called_once()
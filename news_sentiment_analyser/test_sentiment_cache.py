@@ -0,0 +1,95 @@
+# pylint: skip-file
+
+"""Tests for the sentiment_cache.py file."""
+
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+from sentiment_cache import SentimentCache, load_sentiment_cache, save_sentiment_cache
+
+
+class TestSentimentCache(unittest.TestCase):
+    """Tests for the SentimentCache class."""
+
+    def test_counts_hits_and_misses(self):
+        """Lookups are counted as hits or misses."""
+        cache = SentimentCache()
+        self.assertIsNone(cache.get("text"))
+        cache.put("text", [0.1, 0.2, 0.7, 0.5])
+
+        self.assertEqual(cache.get("text"), (0.1, 0.2, 0.7, 0.5))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        """A full cache drops the entry that was used longest ago."""
+        cache = SentimentCache(max_size=2)
+        cache.put("a", [0, 0, 1, 0])
+        cache.put("b", [0, 0, 1, 0])
+        cache.get("a")
+        cache.put("c", [0, 0, 1, 0])
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_keys_depend_on_version(self):
+        """The same text has a different key under another scorer version."""
+        self.assertNotEqual(SentimentCache(version="v1").key("text"),
+                            SentimentCache(version="v2").key("text"))
+
+    def test_put_marks_changed(self):
+        """Only a cache with new scores needs saving."""
+        cache = SentimentCache()
+        cache.get("a")
+        self.assertFalse(cache.changed)
+
+        cache.put("a", [0.1, 0.2, 0.7, 0.5])
+        self.assertTrue(cache.changed)
+
+    def test_to_and_from_bytes(self):
+        """A saved cache loads with its entries and recency order."""
+        cache = SentimentCache()
+        cache.put("a", [0.1, 0.2, 0.7, 0.5])
+        cache.put("b", [0.0, 0.0, 1.0, 0.0])
+
+        loaded = SentimentCache.from_bytes(cache.to_bytes(), max_size=1)
+
+        self.assertEqual(loaded.get("b"), (0.0, 0.0, 1.0, 0.0))
+        self.assertIsNone(loaded.get("a"))
+        self.assertFalse(loaded.changed)
+
+    def test_load_other_version_is_empty(self):
+        """Scores from another scorer version are not loaded."""
+        cache = SentimentCache(version="v1")
+        cache.put("a", [0.1, 0.2, 0.7, 0.5])
+
+        self.assertEqual(len(SentimentCache.from_bytes(cache.to_bytes(), version="v2")), 0)
+
+
+@mock_aws
+@patch('sentiment_cache.ENV', {"BUCKET_NAME": "test-bucket"})
+@patch('extract_s3.ENV', {"AWS_ACCESS_KEY": "test-access-key",
+                          "AWS_SECRET_KEY": "test-secret-key"})
+class TestSentimentCacheInS3(unittest.TestCase):
+    """Tests loading and saving the cache against a local S3 stand-in."""
+
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+
+    def test_missing_cache_is_empty(self):
+        """A bucket without a cache gives an empty one."""
+        self.assertEqual(len(load_sentiment_cache("sentiment_cache.json.gz")), 0)
+
+    def test_saved_cache_loads(self):
+        """A saved cache is loaded on the next run, with its scorer version."""
+        cache = SentimentCache(version="v1")
+        cache.put("a", [0.1, 0.2, 0.7, 0.5])
+        save_sentiment_cache(cache, "sentiment_cache.json.gz")
+
+        loaded = load_sentiment_cache("sentiment_cache.json.gz", version="v1")
+
+        self.assertEqual(loaded.get("a"), (0.1, 0.2, 0.7, 0.5))
+        self.assertEqual(loaded.version, "v1")
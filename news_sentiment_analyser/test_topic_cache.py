@@ -0,0 +1,90 @@
+# pylint: skip-file
+
+"""Tests for the topic_cache.py file."""
+
+import unittest
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+from topic_cache import (TopicCache, normalise_title, hash_topic_list,
+                         load_topic_cache, save_topic_cache)
+
+TOPICS = ["Economy", "Health", "Sports"]
+
+
+class TestNormaliseTitle(unittest.TestCase):
+    """Tests for the normalise_title function."""
+
+    def test_ignores_case_and_whitespace(self):
+        """Titles differing only in case and spacing share a key."""
+        self.assertEqual(normalise_title("  Big  Win\nFor TEAM "), "big win for team")
+
+
+class TestHashTopicList(unittest.TestCase):
+    """Tests for the hash_topic_list function."""
+
+    def test_ignores_order(self):
+        """The same topics in another order have the same hash."""
+        self.assertEqual(hash_topic_list(TOPICS), hash_topic_list(TOPICS[::-1]))
+        self.assertNotEqual(hash_topic_list(TOPICS), hash_topic_list(TOPICS[:2]))
+
+
+class TestTopicCache(unittest.TestCase):
+    """Tests for the TopicCache class."""
+
+    def setUp(self):
+        self.cache = TopicCache()
+        self.cache.put("Markets fall", ["Economy"], TOPICS)
+        self.cache.put("Cup final", ["Sports"], TOPICS)
+
+    def test_hit_for_normalised_title(self):
+        """A cached title is found whatever its case and spacing."""
+        self.assertEqual(self.cache.get("markets  FALL", TOPICS), ["Economy"])
+        self.assertIsNone(self.cache.get("Unseen title", TOPICS))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_removed_topic_only_invalidates_its_titles(self):
+        """Removing a topic only invalidates the titles that had it."""
+        topics = ["Economy", "Health"]
+
+        self.assertEqual(self.cache.get("Markets fall", topics), ["Economy"])
+        self.assertIsNone(self.cache.get("Cup final", topics))
+
+    def test_added_topic_invalidates_titles(self):
+        """An added topic may apply to any title classified without it."""
+        self.assertIsNone(self.cache.get("Markets fall", TOPICS + ["Climate"]))
+
+    def test_round_trips_through_bytes(self):
+        """A saved cache loads with the same entries and topic lists."""
+        loaded = TopicCache.from_bytes(self.cache.to_bytes())
+
+        self.assertEqual(loaded.get("Cup final", TOPICS), ["Sports"])
+        self.assertEqual(loaded.get("Markets fall", ["Economy"]), ["Economy"])
+        self.assertFalse(loaded.changed)
+
+
+@mock_aws
+@patch('topic_cache.ENV', {"BUCKET_NAME": "test-bucket"})
+@patch('extract_s3.ENV', {"AWS_ACCESS_KEY": "test-access-key",
+                          "AWS_SECRET_KEY": "test-secret-key"})
+class TestTopicCacheInS3(unittest.TestCase):
+    """Tests loading and saving the cache against a local S3 stand-in."""
+
+    def setUp(self):
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+
+    def test_missing_cache_is_empty(self):
+        """A bucket without a cache gives an empty one."""
+        self.assertEqual(len(load_topic_cache("topic_cache.json.gz")), 0)
+
+    def test_saved_cache_loads(self):
+        """A saved cache is loaded on the next run."""
+        cache = TopicCache()
+        cache.put("Markets fall", ["Economy"], TOPICS)
+        save_topic_cache(cache, "topic_cache.json.gz")
+
+        loaded = load_topic_cache("topic_cache.json.gz")
+
+        self.assertEqual(loaded.get("Markets fall", TOPICS), ["Economy"])
@@ -5,32 +5,41 @@
 import unittest
 from unittest.mock import patch, MagicMock
 
+import boto3
+import numpy as np
 import pandas as pd
+from moto import mock_aws
 
+from sentiment_analysis import SENTIMENT_DTYPE
 from transform_articles import (
     transform,
     change_source_name_to_id,
     drop_duplicate_titles,
+    drop_duplicate_links,
     drop_already_present_articles,
     get_polarity_scores
 )
 
 
+def fake_score_columns(sia, df, text_cols, cache=None):
+    """Scores every row of every column (0.1, 0.2, 0.7, 0.5)."""
+    return {col: np.array([(0.1, 0.2, 0.7, 0.5)] * len(df), dtype=SENTIMENT_DTYPE)
+            for col in text_cols}
+
+
 class TestTransformFunction(unittest.TestCase):
     """Tests for the transform function."""
 
+    @patch('transform_articles.use_connection')
     @patch('transform_articles.get_source_dict')
-    @patch('transform_articles.get_article_titles')
+    @patch('transform_articles.get_present_article_positions')
     @patch('transform_articles.add_topics_to_dataframe')
-    @patch('transform_articles.get_sentiments')
-    def test_transform(self, fake_get_sentiments, fake_add_topics, fake_get_article_titles, fake_get_source_dict):
+    @patch('transform_articles.score_columns')
+    def test_transform(self, fake_score_columns_mock, fake_add_topics, fake_get_present, fake_get_source_dict, fake_use_connection):
         """Test the main transform function with valid input."""
         fake_get_source_dict.return_value = {'Source A': 1, 'Source B': 2}
-        fake_get_article_titles.return_value = ['Article 1']
-
-        def fake_get_sentiments_func(sia, df, *args):
-            return df.assign(compound=0.5, pos=0.1, neg=0.2, neut=0.7)
-        fake_get_sentiments.side_effect = fake_get_sentiments_func
+        fake_get_present.return_value = {0}
+        fake_score_columns_mock.side_effect = fake_score_columns
 
         def fake_add_topics_func(df):
             return df
@@ -39,13 +48,15 @@ class TestTransformFunction(unittest.TestCase):
             'title': ['Article 1', 'Article 2', 'Article 3'],
             'content': ['Content 1', 'Content 2', 'Content 3'],
             'source_name': ['Source A', 'Source B', 'Source A'],
-            'date_published': [pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-02'), pd.Timestamp('2023-01-03')]
+            'published': [pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-02'), pd.Timestamp('2023-01-03')],
+            'link': ['https://a.com/1', 'https://b.com/2', 'https://a.com/3']
         })
         transformed_articles = transform(articles)
         expected_df = pd.DataFrame({
             'title': ['Article 2', 'Article 3'],
             'content': ['Content 2', 'Content 3'],
-            'date_published': [pd.Timestamp('2023-01-02'), pd.Timestamp('2023-01-03')],
+            'published': [pd.Timestamp('2023-01-02'), pd.Timestamp('2023-01-03')],
+            'link': ['https://b.com/2', 'https://a.com/3'],
             'source_id': [2, 1],
             'title_polarity_score': [0.5, 0.5],
             'content_polarity_score': [0.5, 0.5]
@@ -54,10 +65,43 @@ class TestTransformFunction(unittest.TestCase):
         expected_df.reset_index(drop=True, inplace=True)
 
         pd.testing.assert_frame_equal(transformed_articles, expected_df)
-        fake_get_source_dict.assert_called_once()
-        fake_get_article_titles.assert_called_once()
+        fake_conn = fake_use_connection.return_value.__enter__.return_value
+        fake_get_source_dict.assert_called_once_with(fake_conn)
+        fake_get_present.assert_called_once_with([
+            ('Article 1', 1, '2023-01-01', 'https://a.com/1'),
+            ('Article 2', 2, '2023-01-02', 'https://b.com/2'),
+            ('Article 3', 1, '2023-01-03', 'https://a.com/3')
+        ], fake_conn)
+        fake_conn.__exit__.assert_called_once()
         fake_add_topics.assert_called_once()
 
+    @patch('transform_articles.use_connection')
+    @patch('transform_articles.get_source_dict')
+    @patch('transform_articles.get_present_article_positions')
+    @patch('transform_articles.add_topics_to_dataframe')
+    @patch('transform_articles.score_columns')
+    def test_transform_batch_with_shared_link(self, fake_score_columns_mock, fake_add_topics,
+                                              fake_get_present, fake_get_source_dict,
+                                              fake_use_connection):
+        """Test that a headline edited between two uploads in one run is loaded once."""
+        fake_get_source_dict.return_value = {'Source A': 1}
+        fake_get_present.return_value = set()
+        fake_score_columns_mock.side_effect = fake_score_columns
+        fake_add_topics.side_effect = lambda df: df
+        articles = pd.DataFrame({
+            'title': ['Old headline', 'New headline'],
+            'content': ['Content', 'Content'],
+            'source_name': ['Source A', 'Source A'],
+            'published': ['2023-01-01', '2023-01-01'],
+            'link': ['https://a.com/1', 'https://a.com/1']
+        })
+        transformed_articles = transform(articles)
+
+        self.assertEqual(transformed_articles['title'].tolist(), ['New headline'])
+        fake_get_present.assert_called_once_with(
+            [('New headline', 1, '2023-01-01', 'https://a.com/1')],
+            fake_use_connection.return_value.__enter__.return_value)
+
 
 class TestDropDuplicateTitles(unittest.TestCase):
     """Tests for the drop_duplicate_titles function."""
@@ -87,38 +131,63 @@ class TestDropDuplicateTitles(unittest.TestCase):
         pd.testing.assert_frame_equal(result, articles)
 
 
-class TestDropAlreadyPresentArticles(unittest.TestCase):
-    """Tests for the drop_already_present_articles function."""
+class TestDropDuplicateLinks(unittest.TestCase):
+    """Tests for the drop_duplicate_links function."""
 
-    @patch('transform_articles.get_article_titles')
-    def test_drop_already_present_articles(self, fake_get_article_titles):
-        """Test dropping articles that are already present in the database."""
-        fake_get_article_titles.return_value = ['Article 1']
+    def test_edited_headline_keeps_later_row(self):
+        """Test that two rows sharing a link keep only the later one."""
         articles = pd.DataFrame({
-            'title': ['Article 1', 'Article 2', 'Article 3'],
-            'content': ['Content 1', 'Content 2', 'Content 3']
+            'title': ['Old headline', 'Article 2', 'New headline'],
+            'link': ['https://a.com/1', 'https://a.com/2', 'https://a.com/1']
         })
-        result = drop_already_present_articles(articles)
+        result = drop_duplicate_links(articles)
 
-        expected_df = pd.DataFrame({
-            'title': ['Article 2', 'Article 3'],
-            'content': ['Content 2', 'Content 3']
+        pd.testing.assert_frame_equal(result, articles.iloc[[1, 2]])
+
+
+class TestDropAlreadyPresentArticles(unittest.TestCase):
+    """Tests for the drop_already_present_articles function."""
+
+    def setUp(self):
+        self.articles = pd.DataFrame({
+            'title': ['Article 1', 'Article 2', 'Article 3'],
+            'content': ['Content 1', 'Content 2', 'Content 3'],
+            'source_id': [1, 2, 1],
+            'published': ['2023-01-01', '2023-01-02', '2023-01-03'],
+            'link': ['https://a.com/1', 'https://b.com/2', 'https://a.com/3']
         })
-        result.reset_index(drop=True, inplace=True)
-        expected_df.reset_index(drop=True, inplace=True)
-        pd.testing.assert_frame_equal(result, expected_df)
 
-    @patch('transform_articles.get_article_titles')
-    def test_no_articles_to_drop(self, fake_get_article_titles):
+    @patch('transform_articles.get_present_article_positions')
+    def test_drop_already_present_articles(self, fake_get_present):
+        """Test dropping articles that are already present in the database."""
+        fake_get_present.return_value = {0, 2}
+        result = drop_already_present_articles(self.articles)
+
+        pd.testing.assert_frame_equal(result, self.articles.iloc[[1]])
+        fake_get_present.assert_called_once_with([
+            ('Article 1', 1, '2023-01-01', 'https://a.com/1'),
+            ('Article 2', 2, '2023-01-02', 'https://b.com/2'),
+            ('Article 3', 1, '2023-01-03', 'https://a.com/3')
+        ], None)
+
+    @patch('transform_articles.get_present_article_positions')
+    def test_no_articles_to_drop(self, fake_get_present):
         """Test that no articles are dropped if none are already present."""
-        fake_get_article_titles.return_value = []
-        articles = pd.DataFrame({
-            'title': ['Article 1', 'Article 2'],
-            'content': ['Content 1', 'Content 2']
-        })
-        result = drop_already_present_articles(articles)
+        fake_get_present.return_value = set()
+        result = drop_already_present_articles(self.articles)
 
-        pd.testing.assert_frame_equal(result, articles)
+        pd.testing.assert_frame_equal(result, self.articles)
+
+    @patch('transform_articles.get_present_article_positions')
+    def test_unknown_source_sent_as_null(self, fake_get_present):
+        """Test that an unmapped source is sent as NULL rather than NaN."""
+        fake_get_present.return_value = set()
+        self.articles['source_id'] = [1, np.nan, 2]
+        drop_already_present_articles(self.articles)
+
+        keys = fake_get_present.call_args.args[0]
+        self.assertEqual([key[1] for key in keys], [1, None, 2])
+        self.assertIsInstance(keys[0][1], int)
 
 
 class TestChangeSourceNameToID(unittest.TestCase):
@@ -144,13 +213,12 @@ class TestChangeSourceNameToID(unittest.TestCase):
 class TestGetPolarityScores(unittest.TestCase):
     """Tests for the get_polarity_scores function."""
 
-    @patch('transform_articles.get_sentiments')
+    @patch('transform_articles.score_columns')
     @patch('transform_articles.SentimentIntensityAnalyzer')
-    def test_get_polarity_scores(self, fake_sia, fake_get_sentiments):
+    def test_get_polarity_scores(self, fake_sia, fake_score_columns_mock):
         """Test adding polarity scores for title and content."""
         fake_sia.return_value = MagicMock()
-        fake_get_sentiments.side_effect = lambda sia, df, * \
-            args: df.assign(compound=0.5, pos=0.1, neg=0.2, neut=0.7)
+        fake_score_columns_mock.side_effect = fake_score_columns
         articles = pd.DataFrame({
             'title': ['Article 1', 'Article 2'],
             'content': ['Content 1', 'Content 2']
@@ -164,3 +232,23 @@ class TestGetPolarityScores(unittest.TestCase):
             'content_polarity_score': [0.5, 0.5]
         })
         pd.testing.assert_frame_equal(result, expected_df)
+
+    @mock_aws
+    @patch('sentiment_cache.ENV', {"BUCKET_NAME": "test-bucket"})
+    @patch('extract_s3.ENV', {"AWS_ACCESS_KEY": "test-access-key",
+                              "AWS_SECRET_KEY": "test-secret-key"})
+    @patch('transform_articles.ENV', {"SENTIMENT_CACHE_KEY": "sentiment_cache.json.gz"})
+    @patch('transform_articles.SentimentIntensityAnalyzer')
+    def test_get_polarity_scores_uses_cache(self, fake_sia):
+        """Test that a second run reads the cache in S3 instead of rescoring."""
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="test-bucket")
+        fake_sia.return_value.polarity_scores.return_value = {
+            'pos': 0.1, 'neg': 0.2, 'neu': 0.7, 'compound': 0.5}
+        get_polarity_scores(pd.DataFrame({'title': ['Article 1'],
+                                          'content': ['Content 1']}))
+        fake_sia.return_value.polarity_scores.reset_mock()
+        result = get_polarity_scores(pd.DataFrame({'title': ['Article 1'],
+                                                   'content': ['Content 1']}))
+
+        fake_sia.return_value.polarity_scores.assert_not_called()
+        self.assertEqual(result['content_polarity_score'].tolist(), [0.5])
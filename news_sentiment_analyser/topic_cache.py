@@ -0,0 +1,121 @@
+"""
+A persistent cache of the topics the model gave each article title, so
+titles classified in an earlier run are not sent to the model again.
+
+Entries are keyed by the normalised title and remember the topic list they
+were classified against. When the topic list changes, an entry stays valid
+if topics were only removed and none of its own topics were among them;
+any added topic could apply to any title, so it invalidates every entry
+classified without it. The cache is saved to S3 as gzipped JSON.
+"""
+
+import gzip
+import json
+import re
+import unicodedata
+from hashlib import sha256
+from os import environ as ENV
+
+from botocore.exceptions import ClientError
+
+from extract_s3 import get_s3_client
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalise_title(title: str) -> str:
+    """Returns the title case-folded, with its whitespace collapsed."""
+
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", title)).strip().casefold()
+
+
+def hash_topic_list(topics: list[str]) -> str:
+    """Returns a short hash identifying a topic list, whatever its order."""
+
+    return sha256("\n".join(sorted(set(topics))).encode("utf-8")).hexdigest()[:16]
+
+
+class TopicCache:
+    """The topics of each classified title and the topic lists they were chosen from."""
+
+    def __init__(self, entries: dict = None, topic_lists: dict = None):
+        self.entries = entries or {}
+        self.topic_lists = topic_lists or {}
+        self.hits = 0
+        self.misses = 0
+        self.changed = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, title: str, topics: list[str]) -> list[str]:
+        """Returns the cached topics of a title if they are still valid
+        for the current topic list, or None."""
+
+        entry = self.entries.get(normalise_title(title))
+        if entry is None or not self.is_valid(entry, topics):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return list(entry["topics"])
+
+    def is_valid(self, entry: dict, topics: list[str]) -> bool:
+        """Returns whether an entry is unaffected by the change from its
+        topic list to the current one."""
+
+        if entry["topic_list"] == hash_topic_list(topics):
+            return True
+
+        previous = self.topic_lists.get(entry["topic_list"])
+        if previous is None:
+            return False
+
+        current = set(topics)
+        added = current.difference(previous)
+        return not added and current.issuperset(entry["topics"])
+
+    def put(self, title: str, title_topics: list[str], topics: list[str]) -> None:
+        """Caches the topics the model gave a title from the current topic list."""
+
+        topic_list = hash_topic_list(topics)
+        self.topic_lists[topic_list] = sorted(set(topics))
+        self.entries[normalise_title(title)] = {"topics": list(title_topics),
+                                                "topic_list": topic_list}
+        self.changed = True
+
+    def stats(self) -> str:
+        """Returns the hit and miss counts."""
+
+        return f"{self.hits} hits, {self.misses} misses, {len(self)} entries"
+
+    def to_bytes(self) -> bytes:
+        """Returns the cache as gzipped JSON."""
+
+        return gzip.compress(json.dumps({"topic_lists": self.topic_lists,
+                                         "entries": self.entries}).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> "TopicCache":
+        """Returns the cache saved by to_bytes."""
+
+        saved = json.loads(gzip.decompress(body))
+        return cls(saved["entries"], saved["topic_lists"])
+
+
+def load_topic_cache(key: str) -> TopicCache:
+    """Returns the cache saved at key in the bucket, or an empty cache if there is none."""
+
+    try:
+        response = get_s3_client().get_object(Bucket=ENV['BUCKET_NAME'], Key=key)
+        return TopicCache.from_bytes(response["Body"].read())
+
+    except (ClientError, OSError, json.JSONDecodeError, KeyError) as e:
+        print(f"No topic cache at {key}, classifying every title: {e}")
+        return TopicCache()
+
+
+def save_topic_cache(cache: TopicCache, key: str) -> None:
+    """Saves the cache at key in the bucket."""
+
+    get_s3_client().put_object(Bucket=ENV['BUCKET_NAME'], Key=key, Body=cache.to_bytes())
@@ -1,33 +1,40 @@
 """Script to transform the dataframe for inserting into RDS, adding topics, adding scores."""
 
+from os import environ as ENV
+
 import pandas as pd
+from psycopg2.extensions import connection
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
 from openai_topics import add_topics_to_dataframe
-from database_functions import get_source_dict, get_article_titles
-from sentiment_analysis import get_sentiments
+from database_functions import use_connection, get_source_dict, get_present_article_positions
+from sentiment_analysis import get_sentiments, score_columns, SCORER_VERSION
+from sentiment_cache import load_sentiment_cache, save_sentiment_cache
 
 
-def transform(articles: pd.DataFrame) -> pd.DataFrame:
-    """Returns the transformed dataframe."""
+def transform(articles: pd.DataFrame, conn: connection = None) -> pd.DataFrame:
+    """Returns the transformed dataframe. The database lookups share one
+    connection, and their transaction ends before scoring and topics."""
     if articles.empty:
         return articles
-    articles = drop_duplicate_titles(articles)
+    articles = drop_duplicate_links(drop_duplicate_titles(articles))
     if articles.empty:
         return articles
-    articles = drop_already_present_articles(articles)
+    with use_connection(conn) as db_conn:
+        with db_conn:
+            articles = change_source_name_to_id(articles, db_conn)
+            articles = drop_already_present_articles(articles, db_conn)
     if articles.empty:
         return articles
-    articles = change_source_name_to_id(articles)
     articles = get_polarity_scores(articles)
     articles = add_topics_to_dataframe(articles)
 
     return articles
 
 
-def change_source_name_to_id(articles: pd.DataFrame) -> pd.DataFrame:
+def change_source_name_to_id(articles: pd.DataFrame, conn: connection = None) -> pd.DataFrame:
     """Changes the source name to source_id for insertion into RDS."""
-    source_id_dict = get_source_dict()
+    source_id_dict = get_source_dict(conn)
     articles['source_id'] = articles['source_name'].map(source_id_dict)
     articles = articles.drop(columns=['source_name'])
 
@@ -35,10 +42,22 @@ def change_source_name_to_id(articles: pd.DataFrame) -> pd.DataFrame:
 
 
 def get_polarity_scores(articles: pd.DataFrame) -> pd.DataFrame:
-    """Adds both title_polarity_score and content_polarity_score."""
+    """Adds both title_polarity_score and content_polarity_score,
+    scoring the titles and content together in one batch. With
+    SENTIMENT_CACHE_KEY set, scores are cached in that object in S3."""
     sentiment_analyser = SentimentIntensityAnalyzer()
-    articles = get_title_polarity_score(articles, sentiment_analyser)
-    articles = get_content_polarity_score(articles, sentiment_analyser)
+    cache_key = ENV.get("SENTIMENT_CACHE_KEY")
+    cache = load_sentiment_cache(cache_key, SCORER_VERSION) if cache_key else None
+
+    scores = score_columns(sentiment_analyser, articles, ['title', 'content'],
+                           cache=cache)
+    articles['title_polarity_score'] = scores['title']['compound']
+    articles['content_polarity_score'] = scores['content']['compound']
+
+    if cache is not None:
+        if cache.changed:
+            save_sentiment_cache(cache, cache_key)
+        print(f"Sentiment cache: {cache.stats()}")
 
     return articles
 
@@ -59,10 +78,15 @@ def get_content_polarity_score(articles: pd.DataFrame, sia) -> pd.DataFrame:
     return articles
 
 
-def drop_already_present_articles(articles: pd.DataFrame) -> pd.DataFrame:
-    """Drops rows with titles already in the RDS."""
-    article_titles = get_article_titles()
-    articles = articles[~articles['title'].isin(article_titles)]
+def drop_already_present_articles(articles: pd.DataFrame,
+                                  conn: connection = None) -> pd.DataFrame:
+    """Drops rows already in the RDS, by (title, source, date) or URL."""
+    source_ids = [None if pd.isna(source_id) else int(source_id)
+                  for source_id in articles['source_id']]
+    keys = list(zip(articles['title'], source_ids,
+                    articles['published'].astype(str), articles['link']))
+    present = get_present_article_positions(keys, conn)
+    articles = articles[[i not in present for i in range(len(articles))]]
 
     return articles
 
@@ -74,5 +98,13 @@ def drop_duplicate_titles(articles: pd.DataFrame) -> pd.DataFrame:
     return articles
 
 
+def drop_duplicate_links(articles: pd.DataFrame) -> pd.DataFrame:
+    """Drops rows sharing a 'link', as article_url is unique. A headline edited
+    between two uploads keeps the later row, from the later batch."""
+    articles = articles.drop_duplicates(subset='link', keep='last')
+
+    return articles
+
+
 if __name__ == "__main__":
     pass
@@ -332,7 +332,7 @@ resource "aws_cloudwatch_event_rule" "csv_upload_to_s3_event_rule" {
   event_pattern = jsonencode({
     detail = {
       bucket = {name = ["${data.aws_s3_bucket.article_s3_bucket.id}"]},
-      object = {key = [{wildcard = "*_article_data.csv"}]}
+      object = {key = [{wildcard = "*_article_data.csv"}, {wildcard = "*_article_data.parquet"}]}
     },
     "detail-type" = ["Object Created"],
     source = ["aws.s3"]
@@ -0,0 +1,228 @@
+# pylint: skip-file
+
+"""Tests for the db_pool.py file."""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from psycopg2 import OperationalError
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError
+
+import db_pool
+from db_pool import ConnectionPool, create_connection, get_connection, get_pool, pool_metrics, close_pool
+
+FAKE_ENV = {
+    "DB_NAME": "test_db",
+    "DB_USER": "test_user",
+    "DB_HOST": "test_host",
+    "DB_PASSWORD": "test_password",
+    "DB_PORT": "5432"
+}
+
+
+@patch('db_pool.connect')
+@patch('db_pool.ENV', FAKE_ENV)
+def test_create_connection(fake_connect):
+    """Tests the create_connection function."""
+    conn = create_connection()
+
+    fake_connect.assert_called_once_with(
+        dbname="test_db",
+        user="test_user",
+        host="test_host",
+        password="test_password",
+        port="5432",
+        cursor_factory=RealDictCursor,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=3
+    )
+    assert conn == fake_connect.return_value
+
+
+@patch('db_pool.ThreadedConnectionPool')
+class TestConnectionPool(unittest.TestCase):
+    """Tests for the ConnectionPool class."""
+
+    def make_pool(self, fake_threaded_pool, max_connections=2, timeout=1, ping_after=60):
+        fake_conn = MagicMock(closed=0)
+        fake_threaded_pool.return_value.getconn.return_value = fake_conn
+        return ConnectionPool(1, max_connections, timeout, ping_after,
+                              dbname="test_db"), fake_conn
+
+    def test_commits_and_returns_connection(self, fake_threaded_pool):
+        """Test that a successful block is committed and the connection returned."""
+        pool, fake_conn = self.make_pool(fake_threaded_pool)
+        with pool.connection() as conn:
+            self.assertIs(conn, fake_conn)
+            self.assertEqual(pool.stats()["in_use"], 1)
+
+        fake_threaded_pool.assert_called_once_with(1, 2, dbname="test_db")
+        fake_conn.commit.assert_called_once()
+        fake_conn.rollback.assert_not_called()
+        fake_threaded_pool.return_value.putconn.assert_called_once_with(fake_conn, close=False)
+        stats = pool.stats()
+        self.assertEqual((stats["checkouts"], stats["in_use"], stats["peak_in_use"]), (1, 0, 1))
+
+    def test_rolls_back_failed_block(self, fake_threaded_pool):
+        """Test that a failing block is rolled back and the connection still returned."""
+        pool, fake_conn = self.make_pool(fake_threaded_pool)
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("failed")
+
+        fake_conn.rollback.assert_called_once()
+        fake_conn.commit.assert_not_called()
+        fake_threaded_pool.return_value.putconn.assert_called_once_with(fake_conn, close=False)
+        self.assertEqual(pool.stats()["in_use"], 0)
+
+    def test_discards_broken_connection(self, fake_threaded_pool):
+        """Test that a connection that was lost is closed rather than pooled."""
+        pool, fake_conn = self.make_pool(fake_threaded_pool)
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                fake_conn.closed = 2
+                raise ValueError("server closed the connection")
+
+        fake_conn.rollback.assert_not_called()
+        fake_threaded_pool.return_value.putconn.assert_called_once_with(fake_conn, close=True)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+    def test_times_out_when_every_connection_is_lent(self, fake_threaded_pool):
+        """Test that a checkout gives up after the timeout when the pool is exhausted."""
+        pool, _ = self.make_pool(fake_threaded_pool, max_connections=1, timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolError):
+                with pool.connection():
+                    pass
+
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        self.assertEqual(pool.stats()["checkouts"], 1)
+
+    def test_waits_for_a_connection_to_be_returned(self, fake_threaded_pool):
+        """Test that a checkout waits for a busy connection instead of failing."""
+        pool, _ = self.make_pool(fake_threaded_pool, max_connections=1, timeout=5)
+        borrowed = threading.Event()
+
+        def hold_connection():
+            with pool.connection():
+                borrowed.set()
+                time.sleep(0.1)
+
+        holder = threading.Thread(target=hold_connection)
+        holder.start()
+        borrowed.wait()
+        with pool.connection():
+            pass
+        holder.join()
+
+        stats = pool.stats()
+        self.assertEqual((stats["checkouts"], stats["peak_in_use"]), (2, 1))
+        self.assertGreater(stats["wait_seconds"], 0.05)
+
+    def test_failed_checkout_frees_its_slot(self, fake_threaded_pool):
+        """Test that a connection error does not use up a slot."""
+        pool, _ = self.make_pool(fake_threaded_pool, max_connections=1, timeout=0.05)
+        fake_threaded_pool.return_value.getconn.side_effect = [PoolError("down"), MagicMock(closed=0)]
+        with self.assertRaises(PoolError):
+            with pool.connection():
+                pass
+        with pool.connection():
+            pass
+
+        self.assertEqual(pool.stats()["timeouts"], 0)
+
+    def test_recently_used_connection_is_not_pinged(self, fake_threaded_pool):
+        """Test that a connection returned within ping_after is lent out as it is."""
+        pool, fake_conn = self.make_pool(fake_threaded_pool)
+        with pool.connection():
+            pass
+        with pool.connection():
+            pass
+
+        fake_conn.cursor.assert_not_called()
+
+    def test_idle_connection_is_pinged(self, fake_threaded_pool):
+        """Test that a connection idle past ping_after is checked before it is lent."""
+        pool, fake_conn = self.make_pool(fake_threaded_pool, ping_after=0)
+        with pool.connection():
+            pass
+        with pool.connection() as conn:
+            self.assertIs(conn, fake_conn)
+
+        fake_conn.cursor.return_value.__enter__.return_value.execute.assert_called_once_with(
+            "SELECT 1;")
+        self.assertEqual(pool.stats()["discarded"], 0)
+
+    def test_dead_idle_connection_is_replaced_once(self, fake_threaded_pool):
+        """Test that a connection the server dropped is closed and replaced."""
+        pool, dead_conn = self.make_pool(fake_threaded_pool, ping_after=0)
+        with pool.connection():
+            pass
+        dead_conn.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            OperationalError("server closed the connection unexpectedly"))
+        fresh_conn = MagicMock(closed=0)
+        fake_threaded_pool.return_value.getconn.side_effect = [dead_conn, fresh_conn]
+
+        with pool.connection() as conn:
+            self.assertIs(conn, fresh_conn)
+
+        fake_threaded_pool.return_value.putconn.assert_any_call(dead_conn, close=True)
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+
+@patch('db_pool.load_dotenv')
+@patch('db_pool.ENV', FAKE_ENV)
+@patch('db_pool.ConnectionPool')
+class TestProcessPool(unittest.TestCase):
+    """Tests for the process-wide pool."""
+
+    def setUp(self):
+        db_pool._pool = None
+
+    def tearDown(self):
+        db_pool._pool = None
+
+    def test_pool_is_created_once_on_first_use(self, fake_connection_pool, fake_load_dotenv):
+        """Test that every call shares the pool created by the first."""
+        self.assertEqual(pool_metrics(), {})
+        fake_connection_pool.assert_not_called()
+
+        self.assertIs(get_pool(), get_pool())
+        fake_connection_pool.assert_called_once()
+        self.assertEqual(fake_connection_pool.call_args.kwargs["dbname"], "test_db")
+
+    def test_pool_settings_are_read_after_loading_the_env(self, fake_connection_pool,
+                                                          fake_load_dotenv):
+        """Test that the pool's settings come from the env as loaded at first use."""
+        fake_load_dotenv.side_effect = lambda: FAKE_ENV.update(
+            {"DB_POOL_MAX": "8", "DB_POOL_TIMEOUT": "2.5"})
+        try:
+            get_pool()
+        finally:
+            for name in ("DB_POOL_MAX", "DB_POOL_TIMEOUT"):
+                FAKE_ENV.pop(name, None)
+
+        options = fake_connection_pool.call_args.kwargs
+        self.assertEqual((options["min_connections"], options["max_connections"],
+                          options["timeout"]), (1, 8, 2.5))
+
+    def test_get_connection_borrows_from_the_pool(self, fake_connection_pool, fake_load_dotenv):
+        """Test that get_connection lends out the pool's connection."""
+        fake_conn = fake_connection_pool.return_value.connection.return_value.__enter__.return_value
+        with get_connection() as conn:
+            self.assertIs(conn, fake_conn)
+
+        self.assertEqual(pool_metrics(), fake_connection_pool.return_value.stats.return_value)
+
+    def test_close_pool(self, fake_connection_pool, fake_load_dotenv):
+        """Test that closing the pool closes its connections and forgets it."""
+        get_pool()
+        close_pool()
+
+        fake_connection_pool.return_value.close.assert_called_once()
+        self.assertEqual(pool_metrics(), {})
@@ -11,15 +11,15 @@ from w_db_funcs import get_avg_polarity_last_week, get_weekly_subscribers
 class TestGetAvgPolarityLastWeek:
 
     @patch('w_db_funcs.get_cursor')
-    @patch('w_db_funcs.create_connection')
-    def test_correct_cursor_call_and_empty_dataframe(self, mock_create_conn, mock_get_cursor):
+    @patch('w_db_funcs.get_connection')
+    def test_correct_cursor_call_and_empty_dataframe(self, mock_get_conn, mock_get_cursor):
 
         last_week = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
         today = datetime.now().strftime('%Y-%m-%d')
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -43,12 +43,12 @@ class TestGetAvgPolarityLastWeek:
         assert result_df.empty
 
     @patch('w_db_funcs.get_cursor')
-    @patch('w_db_funcs.create_connection')
-    def test_output(self, mock_create_conn, mock_get_cursor):
+    @patch('w_db_funcs.get_connection')
+    def test_output(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         sample_data = [('Politics', 'Source A', 0.5),
@@ -64,12 +64,12 @@ class TestGetAvgPolarityLastWeek:
 class TestGetWeeklySubscribers:
 
     @patch('w_db_funcs.get_cursor')
-    @patch('w_db_funcs.create_connection')
-    def test_correct_cursor_call_and_empty_data(self, mock_create_conn, mock_get_cursor):
+    @patch('w_db_funcs.get_connection')
+    def test_correct_cursor_call_and_empty_data(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
@@ -86,12 +86,12 @@ class TestGetWeeklySubscribers:
         assert len(result) == 0
 
     @patch('w_db_funcs.get_cursor')
-    @patch('w_db_funcs.create_connection')
-    def test_with_data(self, mock_create_conn, mock_get_cursor):
+    @patch('w_db_funcs.get_connection')
+    def test_with_data(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         sample_data = [{'subscriber_email': 'user1@example.com'},
@@ -104,12 +104,12 @@ class TestGetWeeklySubscribers:
         assert result == expected_result
 
     @patch('w_db_funcs.get_cursor')
-    @patch('w_db_funcs.create_connection')
-    def test_no_data(self, mock_create_conn, mock_get_cursor):
+    @patch('w_db_funcs.get_connection')
+    def test_no_data(self, mock_get_conn, mock_get_cursor):
 
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
-        mock_create_conn.return_value.__enter__.return_value = mock_conn
+        mock_get_conn.return_value.__enter__.return_value = mock_conn
         mock_get_cursor.return_value.__enter__.return_value = mock_cursor
 
         mock_cursor.fetchall.return_value = []
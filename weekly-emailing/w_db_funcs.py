@@ -1,26 +1,12 @@
 """Some functions for interacting with the RDS."""
 
-from os import environ as ENV
 from datetime import datetime, timedelta
 
 
 from psycopg2.extensions import connection, cursor
-from psycopg2.extras import RealDictCursor
-from psycopg2 import connect
-from dotenv import load_dotenv
 import pandas as pd
 
-
-def create_connection() -> connection:
-    """Creates a connection to the RDS with postgres."""
-
-    load_dotenv()
-    conn = connect(dbname=ENV["DB_NAME"], user=ENV["DB_USER"],
-                   host=ENV["DB_HOST"], password=ENV["DB_PASSWORD"],
-                   port=ENV["DB_PORT"],
-                   cursor_factory=RealDictCursor)
-
-    return conn
+from db_pool import get_connection
 
 
 def get_cursor(conn: connection) -> cursor:
@@ -51,7 +37,7 @@ def get_avg_polarity_last_week():
         ORDER BY t.topic_name, s.source_name;
     """
 
-    with create_connection() as conn:
+    with get_connection() as conn:
         with get_cursor(conn) as cur:
             cur.execute(query, (last_week, today))
             data = cur.fetchall()
@@ -67,7 +53,7 @@ def get_weekly_subscribers() -> list[str]:
         FROM subscriber
         WHERE weekly = TRUE
         """
-    with create_connection() as conn:
+    with get_connection() as conn:
         with get_cursor(conn) as cur:
             cur.execute(query)
             data = cur.fetchall()